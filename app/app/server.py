@@ -0,0 +1,201 @@
+"""Production entry point, a pre-fork gunicorn server.
+
+    python -m app.server
+
+Configured by environment variables:
+
+    SERVER_BIND                  address to listen on, 0.0.0.0:8000
+    SERVER_WORKERS               worker processes, 2 x cores + 1 for WSGI
+                                 and one per core for ASGI
+    SERVER_THREADS               threads per WSGI worker, 1
+    SERVER_ASGI                  1 serves app.asgi with uvicorn workers
+    SERVER_MAX_REQUESTS          requests after which a worker is
+                                 replaced, 0 never, default 2000
+    SERVER_MAX_REQUESTS_JITTER   random extra requests, so that workers
+                                 aren't replaced all at once, 200
+    SERVER_TIMEOUT               seconds before a stuck worker is killed
+    SERVER_GRACEFUL_TIMEOUT      seconds workers get to finish requests
+    SERVER_KEEPALIVE             seconds idle connections are kept open
+    PASSWORD_HASH_WORKERS        password hashing threads per worker,
+                                 the cores divided by the workers
+
+Cores are the ones the process may run on, e.g. a container's cpuset.
+The app, the url conf and every view are imported once in the master
+and the heap frozen before forking, so workers share these pages copy
+on write. Database connections and pools of the master are closed
+first, children never inherit its sockets.
+
+Signals to the master: HUP gracefully replaces every worker, TTIN and
+TTOU add or remove a worker, TERM stops once the running requests
+finish. Since the code is preloaded, a deploy starts a new master with
+USR2, which re-executes ``python -m app.server`` from the same
+directory, and then stops the old one with QUIT.
+
+Each worker has its own connection pool, so the database sees up to
+workers x threads (or DB_POOL_SIZE) connections. With more than one
+worker, metrics are aggregated through METRICS_MULTIPROCESS_DIR, a
+fresh directory is created unless one is given, and the default cache
+and the token cache's SHARED_CACHE must be shared by the workers
+(REDIS_URL), the server refuses to start with local memory ones.
+"""
+import gc
+import glob
+import importlib.util
+import os
+import sys
+import tempfile
+
+WSGI_APPLICATION = 'app.wsgi:application'
+ASGI_APPLICATION = 'app.asgi:application'
+ASGI_WORKER = 'uvicorn.workers.UvicornWorker'
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def options(environ=os.environ, cores=None):
+    """gunicorn settings from the SERVER_* environment variables"""
+    cores = cores or available_cores()
+    asgi = environ.get('SERVER_ASGI', '0') == '1'
+    threads = int(environ.get('SERVER_THREADS', 1))
+    max_requests = int(environ.get('SERVER_MAX_REQUESTS', 2000))
+    if asgi:
+        worker_class = ASGI_WORKER
+    elif threads > 1:
+        worker_class = 'gthread'
+    else:
+        worker_class = 'sync'
+    return {
+        'bind': environ.get('SERVER_BIND', '0.0.0.0:8000'),
+        'workers': int(environ.get('SERVER_WORKERS', 0)) or (
+            cores if asgi else 2 * cores + 1),
+        'threads': 1 if asgi else threads,
+        'worker_class': worker_class,
+        'preload_app': True,
+        'max_requests': max_requests,
+        'max_requests_jitter': int(environ.get(
+            'SERVER_MAX_REQUESTS_JITTER', max_requests // 10)),
+        'timeout': int(environ.get('SERVER_TIMEOUT', 30)),
+        'graceful_timeout': int(environ.get('SERVER_GRACEFUL_TIMEOUT', 30)),
+        'keepalive': int(environ.get('SERVER_KEEPALIVE', 5)),
+        'accesslog': '-',
+        'on_starting': on_starting,
+        'when_ready': when_ready,
+    }
+
+
+def prepare_metrics_dir(environ, workers):
+    """the directory workers share metrics through, emptied of old runs"""
+    directory = environ.get('METRICS_MULTIPROCESS_DIR')
+    if not directory:
+        if workers < 2:
+            return None
+        directory = environ['METRICS_MULTIPROCESS_DIR'] = tempfile.mkdtemp(
+            prefix='metrics-')
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        os.remove(path)
+    return directory
+
+
+def prepare_password_hashing(environ, workers, cores=None):
+    """split the cores between the hashing pools of the workers"""
+    cores = cores or available_cores()
+    return int(environ.setdefault('PASSWORD_HASH_WORKERS',
+                                  str(max(1, cores // workers))))
+
+
+def shared_cache_error(workers):
+    """why the caches can't serve several workers, or None
+
+    Response caching, token evictions and read-your-writes stickiness
+    only work across workers through caches they share.
+    """
+    from django.conf import settings
+    from django.core.cache.backends.locmem import LocMemCache
+    from django.utils.module_loading import import_string
+
+    def local(alias):
+        backend = import_string(settings.CACHES[alias]['BACKEND'])
+        return issubclass(backend, LocMemCache)
+
+    if workers < 2:
+        return None
+    if local('default'):
+        return (f'{workers} workers need a shared default cache, set '
+                f'REDIS_URL or SERVER_WORKERS=1')
+    token_cache = settings.TOKEN_AUTH_CACHE['SHARED_CACHE']
+    if not token_cache or local(token_cache):
+        return (f'{workers} workers need a shared token cache, set '
+                f'TOKEN_AUTH_SHARED_CACHE=default or SERVER_WORKERS=1')
+    return None
+
+
+def preload():
+    """import the app and every view, so forked workers share them"""
+    from django.urls import get_resolver
+    from django.utils.module_loading import import_string
+
+    path = ASGI_APPLICATION if os.environ.get('SERVER_ASGI') == '1' \
+        else WSGI_APPLICATION
+    application = import_string(path.replace(':', '.'))
+    get_resolver().url_patterns
+    return application
+
+
+def on_starting(server):
+    """re-execute as a module on USR2, sys.argv holds the file path
+    which can't import the app package"""
+    server.START_CTX['args'] = [sys.executable, '-m', 'app.server',
+                                *sys.argv[1:]]
+
+
+def when_ready(server):
+    """runs in the master after preloading, right before forking"""
+    from django.db import connections
+
+    from core.db.pool import close_pools
+
+    connections.close_all()
+    close_pools()
+    gc.collect()
+    # objects alive now are never collected, so the collector doesn't
+    # write to the shared pages
+    gc.freeze()
+
+
+def run(settings):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+
+        def load_config(self):
+            for name, value in settings.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return preload()
+
+    Server().run()
+
+
+def main():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    settings = options()
+    if settings['worker_class'] == ASGI_WORKER and \
+            not importlib.util.find_spec('uvicorn'):
+        sys.exit('SERVER_ASGI=1 needs uvicorn to be installed')
+    # read by app.settings, so it must be set before the app is loaded
+    prepare_metrics_dir(os.environ, settings['workers'])
+    prepare_password_hashing(os.environ, settings['workers'])
+    error = shared_cache_error(settings['workers'])
+    if error:
+        sys.exit(error)
+    run(settings)
+
+
+if __name__ == '__main__':
+    main()
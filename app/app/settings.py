@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,18 +40,23 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'core',
     'users',
+    'recipe',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,16 +85,54 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# DB_POOL_SIZE > 0 shares a bounded pool of connections between the
+# threads of a process, see core.db.pool. Connections go back to the pool
+# after every request. Otherwise each request opens its own connection,
+# unless DB_CONN_MAX_AGE keeps it open for that many seconds, health
+# checked before reuse. That connection belongs to the thread that opened
+# it and is only closed by a later request of the same thread, so only
+# set DB_CONN_MAX_AGE for WSGI servers: under ASGI the sync code of a
+# request runs on an executor thread that may never serve another one,
+# and its connection leaks. Use DB_POOL_SIZE there instead.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': ('core.db.backends.postgresql_pool' if DB_POOL_SIZE
+                   else 'django.db.backends.postgresql'),
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': (0 if DB_POOL_SIZE
+                         else int(os.environ.get('DB_CONN_MAX_AGE', 0))),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            'CHECK_AFTER': int(os.environ.get('DB_POOL_CHECK_AFTER', 30)),
+        },
     }
 }
 
+# read replicas of the default database, DB_REPLICA_HOSTS is a comma
+# separated list of hosts sharing its name and credentials, see
+# core.db.routers
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica{index + 1}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host.strip(),
+                        'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+
+# reads of a client stay on the primary this long after its writes
+DATABASE_PRIMARY_STICKY_SECONDS = int(
+    os.environ.get('DB_PRIMARY_STICKY_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -109,6 +153,43 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# password hashing, PASSWORD_HASHER picks the hasher of new passwords
+# (argon2 needs argon2-cffi). The others verify older hashes, which are
+# upgraded at the next login, see users.hashers. WORKERS bounds the
+# hashing threads of each process, 0 uses one per core, which
+# oversubscribes the CPU when several server processes run, app.server
+# splits the cores between its workers.
+PASSWORD_HASHING = {
+    'HASHER': os.environ.get(
+        'PASSWORD_HASHER',
+        'argon2' if importlib.util.find_spec('argon2') else 'scrypt'),
+    'WORKERS': int(os.environ.get('PASSWORD_HASH_WORKERS', 0)),
+    'SCRYPT_WORK_FACTOR': 2 ** int(
+        os.environ.get('PASSWORD_SCRYPT_LOG_N', 14)),
+    'SCRYPT_BLOCK_SIZE': 8,
+    'SCRYPT_PARALLELISM': 1,
+    'ARGON2_TIME_COST': int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2)),
+    'ARGON2_MEMORY_COST': int(
+        os.environ.get('PASSWORD_ARGON2_MEMORY_KIB', 19456)),
+    'ARGON2_PARALLELISM': 1,
+}
+
+_PASSWORD_HASHERS = {
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHING['HASHER']]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items()
+    if name != PASSWORD_HASHING['HASHER']
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+AUTHENTICATION_BACKENDS = ['users.backends.PooledModelBackend']
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -136,3 +217,101 @@ STATIC_ROOT = '/vol/web/static'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
+
+# orjson backed json (de)serialization when installed, see core.renderers
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+}
+
+# REDIS_URL, e.g. redis://redis:6379/0, is a cache shared by every server
+# process. Without it each process has a local memory cache of its own
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# token -> user lookups cached by
+# users.authentication.CachedTokenAuthentication. SHARED_CACHE is a CACHES
+# alias shared between processes, needed for evictions to reach every
+# process, default with REDIS_URL and none without
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60)),
+    'SHARED_CACHE': os.environ.get(
+        'TOKEN_AUTH_SHARED_CACHE', 'default' if REDIS_URL else '') or None,
+}
+
+# per-user list response cache of the recipe api, see recipe.cache
+# a local memory ALIAS disables it unless ALLOW_LOCAL declares the
+# server single process, e.g. runserver
+RECIPE_RESPONSE_CACHE = {
+    'ALIAS': os.environ.get('RECIPE_RESPONSE_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('RECIPE_RESPONSE_CACHE_TIMEOUT', 300)),
+    'ALLOW_LOCAL': os.environ.get(
+        'RECIPE_RESPONSE_CACHE_ALLOW_LOCAL', '0') == '1',
+}
+
+# maximum number of items accepted by the recipe api bulk endpoints
+RECIPE_BULK_MAX_BATCH = int(os.environ.get('RECIPE_BULK_MAX_BATCH', 500))
+
+# build recipe list responses from .values() rows, see recipe.fastlist
+RECIPE_FAST_LIST = os.environ.get('RECIPE_FAST_LIST', '1') == '1'
+
+# recipes fetched per server side cursor round trip by the export endpoint
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get('RECIPE_EXPORT_CHUNK_SIZE',
+                                              2000))
+
+# q= autocomplete of tag and ingredient names, see recipe.autocomplete
+RECIPE_AUTOCOMPLETE = {
+    'LIMIT': int(os.environ.get('RECIPE_AUTOCOMPLETE_LIMIT', 10)),
+    'MAX_LIMIT': 50,
+    'CACHE_TIMEOUT': int(os.environ.get('RECIPE_AUTOCOMPLETE_TIMEOUT', 30)),
+}
+
+# opt-in sampled latency and query profiling, see core.profiling
+# DIR spills the records to per process JSONL files, so that reports
+# cover every worker
+REQUEST_PROFILING = {
+    'ENABLED': os.environ.get('REQUEST_PROFILING', '0') == '1',
+    'SAMPLE_RATE': float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE',
+                                        0.01)),
+    'BUFFER_SIZE': int(os.environ.get('REQUEST_PROFILING_BUFFER', 1000)),
+    'DIR': os.environ.get('REQUEST_PROFILING_DIR'),
+}
+
+# prometheus style metrics served on /metrics, see core.metrics
+# MULTIPROCESS_DIR aggregates the workers of a multi process server
+# through per process files, it should be emptied when the server starts
+METRICS = {
+    'ENABLED': os.environ.get('METRICS', '1') == '1',
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROCESS_DIR'),
+    'FLUSH_INTERVAL': float(os.environ.get('METRICS_FLUSH_INTERVAL', 5)),
+}
+
+# background processing of uploaded recipe images, see recipe.images
+# WORKERS = 0 processes images inline in the request, images still
+# processing after DEADLINE seconds are reaped by reap_image_processing
+RECIPE_IMAGE_PROCESSING = {
+    'WORKERS': int(os.environ.get('RECIPE_IMAGE_WORKERS', 2)),
+    'DEADLINE': int(os.environ.get('RECIPE_IMAGE_DEADLINE', 600)),
+    'THUMBNAIL_SIZES': (100, 300, 600),
+    'JPEG_QUALITY': 85,
+}
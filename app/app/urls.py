@@ -18,9 +18,14 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core.metrics import metrics_view
+from core.views import ProfilingReportView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
     path('app/recipe/', include('recipe.urls')),
+    path('api/profiling/', ProfilingReportView.as_view(), name='profiling'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 urlpatterns = urlpatterns+static(settings.MEDIA_URL, document_root = settings.MEDIA_ROOT)
@@ -0,0 +1,15 @@
+"""Performance benchmarks for the recipe api.
+
+Run them from the app directory against the configured database, e.g.
+
+    python -m benchmarks.indexes --recipes 100000
+
+Every benchmark works on a throwaway test database, the real one is
+never touched.
+"""
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+django.setup()
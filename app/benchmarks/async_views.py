@@ -0,0 +1,132 @@
+"""Requests/sec of the recipe list and detail endpoints served by the
+WSGI handler from a thread pool, and by the ASGI handler from a single
+event loop, against both the DRF views and the native async views.
+
+    python -m benchmarks.async_views --recipes 2000 --concurrency 1 10 50
+
+wsgi runs one thread per concurrent client, like a threaded WSGI
+server. asgi_drf sends the same requests through the ASGI handler,
+which hops to a thread for every sync view. asgi_native hits the
+recipe.async_views endpoints, only the queries leave the event loop.
+The response cache is disabled so every request reaches the database.
+"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from benchmarks import seed, utils
+from core.models import Recipe
+
+NO_RESPONSE_CACHE = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'bench-null': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    },
+    'RECIPE_RESPONSE_CACHE': {'ALIAS': 'bench-null', 'TIMEOUT': 0,
+                              'ALLOW_LOCAL': False},
+}
+
+
+def _urls(prefix, recipe_id, page_size):
+    return [
+        (reverse(f'recipe:{prefix}recipe-list'), {'page_size': page_size}),
+        (reverse(f'recipe:{prefix}recipe-detail', args=[recipe_id]), {}),
+        (reverse(f'recipe:{prefix}tag-list'), {'page_size': page_size}),
+    ]
+
+
+def run_wsgi(token, urls, concurrency, requests):
+    """each thread is a client doing requests in a loop"""
+    local = threading.local()
+
+    def client_loop(n):
+        if not hasattr(local, 'client'):
+            local.client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+        for i in range(n):
+            url, params = urls[i % len(urls)]
+            res = local.client.get(url, params)
+            assert res.status_code == 200, res.status_code
+        connections.close_all()
+
+    per_client = requests // concurrency
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client_loop, [per_client] * concurrency))
+    return per_client * concurrency, time.perf_counter() - start
+
+
+def run_asgi(token, urls, concurrency, requests):
+    """concurrent client coroutines on one event loop"""
+    headers = {'AUTHORIZATION': f'Token {token}'}
+
+    async def client_loop(n):
+        client = AsyncClient()
+        for i in range(n):
+            url, params = urls[i % len(urls)]
+            res = await client.get(url, params, **headers)
+            assert res.status_code == 200, res.status_code
+
+    async def main(per_client):
+        await asyncio.gather(*(client_loop(per_client)
+                               for _ in range(concurrency)))
+
+    per_client = requests // concurrency
+    start = time.perf_counter()
+    asyncio.run(main(per_client))
+    return per_client * concurrency, time.perf_counter() - start
+
+
+MODES = {
+    'wsgi': (run_wsgi, ''),
+    'asgi_drf': (run_asgi, ''),
+    'asgi_native': (run_asgi, 'async-'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    seed.add_arguments(parser)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 10, 50])
+    parser.add_argument('--requests', type=int, default=600,
+                        help='requests per mode and concurrency level')
+    parser.add_argument('--output', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with utils.bench_database(), override_settings(**NO_RESPONSE_CACHE):
+        user = seed.seed_from_args(args)[0]
+        token = Token.objects.create(user=user).key
+        recipe_id = Recipe.objects.filter(user=user).values_list(
+            'id', flat=True).first()
+        # the seeded data is committed, threads see it on their own
+        # connections
+        connections.close_all()
+        for name, (run, prefix) in MODES.items():
+            urls = _urls(prefix, recipe_id, args.page_size)
+            results[name] = {}
+            for concurrency in args.concurrency:
+                done, seconds = run(token, urls, concurrency, args.requests)
+                results[name][concurrency] = {
+                    'requests': done,
+                    'seconds': round(seconds, 3),
+                    'requests_per_sec': int(done / seconds),
+                }
+
+    utils.write_results({'recipes': args.recipes,
+                         'page_size': args.page_size,
+                         'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Compare two benchmarks.load result files and flag regressions.
+
+    python -m benchmarks.compare base.json head.json --threshold 10
+    python -m benchmarks.compare base.json head.json --threshold p99_ms=25
+
+A scenario regresses when its throughput dropped, or a latency
+percentile grew, by more than the threshold percentage of the baseline,
+when it has errors the baseline didn't, or when the head results lack
+it, e.g. because it crashed. Exits with status 1 when any
+scenario regressed, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+# metric -> True when higher is better
+METRICS = {
+    'rps': True,
+    'p50_ms': False,
+    'p90_ms': False,
+    'p99_ms': False,
+}
+DEFAULT_THRESHOLD = 10.0
+
+
+def parse_thresholds(values):
+    """['15', 'p99_ms=25'] -> {metric: percent} with 15 as the default"""
+    thresholds = dict.fromkeys(METRICS, DEFAULT_THRESHOLD)
+    for value in values or ():
+        metric, _, percent = value.rpartition('=')
+        if metric and metric not in METRICS:
+            raise argparse.ArgumentTypeError(f'unknown metric {metric}')
+        try:
+            percent = float(percent)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f'invalid threshold {value!r}, expected a percentage')
+        for name in [metric] if metric else METRICS:
+            thresholds[name] = percent
+    return thresholds
+
+
+def change(base, head):
+    """relative change in percent, None when it can't be computed"""
+    if base is None or head is None or base == 0:
+        return None
+    return round((head - base) / base * 100, 1)
+
+
+def compare(base, head, thresholds):
+    """per scenario rows of (metric, base, head, change, regressed)"""
+    report = {}
+    for name, result in head['scenarios'].items():
+        baseline = base['scenarios'].get(name)
+        if baseline is None:
+            continue
+        rows = []
+        for metric, higher_is_better in METRICS.items():
+            delta = change(baseline.get(metric), result.get(metric))
+            worse = delta is not None and \
+                (-delta if higher_is_better else delta) > thresholds[metric]
+            rows.append((metric, baseline.get(metric), result.get(metric),
+                         delta, worse))
+        rows.append(('errors', baseline['errors'], result['errors'], None,
+                     result['errors'] > baseline['errors']))
+        report[name] = rows
+    for name in sorted(base['scenarios'].keys() - head['scenarios'].keys()):
+        report[name] = [('scenario', 'ran', 'missing', None, True)]
+    return report
+
+
+def format_report(report):
+    lines = [f'{"scenario":<14}{"metric":<9}{"base":>11}{"head":>11}'
+             f'{"change":>9}']
+    for name, rows in report.items():
+        for metric, base, head, delta, worse in rows:
+            delta = '' if delta is None else f'{delta:+.1f}%'
+            flag = '  REGRESSION' if worse else ''
+            lines.append(f'{name:<14}{metric:<9}{base!s:>11}{head!s:>11}'
+                         f'{delta:>9}{flag}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('base', help='results of the baseline commit')
+    parser.add_argument('head', help='results to check')
+    parser.add_argument('--threshold', nargs='*', default=[],
+                        help='allowed change in percent, for every metric '
+                             'or as metric=percent, default '
+                             f'{DEFAULT_THRESHOLD:g}')
+    args = parser.parse_args()
+
+    try:
+        thresholds = parse_thresholds(args.threshold)
+    except argparse.ArgumentTypeError as exc:
+        parser.error(str(exc))
+    with open(args.base) as fh:
+        base = json.load(fh)
+    with open(args.head) as fh:
+        head = json.load(fh)
+
+    report = compare(base, head, thresholds)
+    print(f"base {base['environment']['commit']}, "
+          f"head {head['environment']['commit']}")
+    print(format_report(report))
+    regressed = sorted(name for name, rows in report.items()
+                       if any(row[-1] for row in rows))
+    if regressed:
+        print(f'regressed: {", ".join(regressed)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
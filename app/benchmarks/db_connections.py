@@ -0,0 +1,93 @@
+"""Requests/sec of threaded WSGI clients with a new PostgreSQL connection
+per request, persistent connections and the shared connection pool.
+
+    python -m benchmarks.db_connections --threads 4 16 --pool-size 8
+
+Needs the configured database to be PostgreSQL (DB_HOST etc). Every
+mode runs in its own process, configured through the DB_CONN_MAX_AGE
+and DB_POOL_SIZE environment variables read by app.settings.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from django.db import connection, connections
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from benchmarks import seed, utils
+from benchmarks.async_views import NO_RESPONSE_CACHE, _urls, run_wsgi
+from core.db.pool import pool_stats
+from core.models import Recipe
+
+
+def modes(pool_size):
+    return {
+        'per_request': {'DB_CONN_MAX_AGE': '0', 'DB_POOL_SIZE': '0'},
+        'persistent': {'DB_CONN_MAX_AGE': '600', 'DB_POOL_SIZE': '0'},
+        'pool': {'DB_POOL_SIZE': str(pool_size)},
+    }
+
+
+def run_mode(args):
+    """run every thread count in this process, print json results"""
+    results = {}
+    with utils.bench_database(), override_settings(**NO_RESPONSE_CACHE):
+        user = seed.seed_from_args(args)[0]
+        token = Token.objects.create(user=user).key
+        recipe_id = Recipe.objects.filter(user=user).values_list(
+            'id', flat=True).first()
+        urls = _urls('', recipe_id, args.page_size)
+        connections.close_all()
+        for threads in args.threads:
+            done, seconds = run_wsgi(token, urls, threads, args.requests)
+            results[threads] = {
+                'requests': done,
+                'seconds': round(seconds, 3),
+                'requests_per_sec': int(done / seconds),
+                'pools': pool_stats(),
+            }
+    sys.stdout.write(json.dumps(results) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    seed.add_arguments(parser)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--requests', type=int, default=1000,
+                        help='requests per mode and thread count')
+    parser.add_argument('--pool-size', type=int, default=8)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='write the results to this file')
+    args = parser.parse_args()
+
+    if connection.vendor != 'postgresql':
+        parser.error('the configured database must be PostgreSQL')
+    if args.mode:
+        return run_mode(args)
+
+    results = {}
+    argv = sys.argv[1:]
+    if args.output:
+        # the parent writes the combined results
+        at = next(i for i, arg in enumerate(argv)
+                  if arg.startswith('--output'))
+        del argv[at:at + (1 if '=' in argv[at] else 2)]
+    for name, env in modes(args.pool_size).items():
+        out = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.db_connections',
+             *argv, '--mode', name],
+            env={**os.environ, **env}, check=True,
+            capture_output=True, text=True).stdout
+        results[name] = json.loads(out.splitlines()[-1])
+
+    utils.write_results({'recipes': args.recipes,
+                         'pool_size': args.pool_size,
+                         'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
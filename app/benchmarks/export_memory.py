@@ -0,0 +1,56 @@
+"""Peak python memory of the streaming recipe export for growing
+catalogues, it should stay flat.
+
+    python -m benchmarks.export_memory --sizes 1000 100000 1000000
+"""
+import argparse
+import time
+import tracemalloc
+
+from django.test import Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from benchmarks import seed, utils
+
+
+def measure(client, export_type):
+    tracemalloc.start()
+    start = time.perf_counter()
+    res = client.get(reverse('recipe:recipe-export'), {'type': export_type})
+    size = lines = 0
+    for part in res.streaming_content:
+        size += len(part)
+        lines += 1
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'lines': lines,
+        'bytes': size,
+        'seconds': round(elapsed, 3),
+        'peak_memory_kb': peak // 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000])
+    parser.add_argument('--type', default='ndjson', choices=['ndjson', 'csv'])
+    parser.add_argument('--output', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    with utils.bench_database():
+        for size in args.sizes:
+            user = seed.seed(recipes=size)[0]
+            token = Token.objects.create(user=user)
+            client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+            results.append({'recipes': size, **measure(client, args.type)})
+
+    utils.write_results({'type': args.type, 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Rows/sec of the recipe list endpoint with the values() based fast
+path and with RecipeSerializer, walking every page of a catalogue.
+
+    python -m benchmarks.fast_list --recipes 10000 --page-size 1000
+"""
+import argparse
+import time
+
+from django.test import Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from benchmarks import seed, utils
+from recipe.cache import bump_user_version
+
+
+def walk(client, user, page_size):
+    """fetch every page, bypassing the response cache"""
+    rows = size = 0
+    url = reverse('recipe:recipe-list')
+    params = {'page_size': page_size}
+    start = time.perf_counter()
+    while url:
+        bump_user_version(user.id)
+        res = client.get(url, params)
+        data = res.json()
+        rows += len(data['results'])
+        size += len(res.content)
+        url, params = data['next'], None
+    return rows, size, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    seed.add_arguments(parser)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with utils.bench_database():
+        user = seed.seed_from_args(args)[0]
+        token = Token.objects.create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        for name, fast in (('serializer', False), ('fast_list', True)):
+            with override_settings(RECIPE_FAST_LIST=fast):
+                best = min((walk(client, user, args.page_size)
+                            for _ in range(args.repeat)),
+                           key=lambda run: run[2])
+            rows, size, seconds = best
+            results[name] = {
+                'rows': rows,
+                'bytes': size,
+                'seconds': round(seconds, 3),
+                'rows_per_sec': int(rows / seconds),
+            }
+
+    utils.write_results({'recipes': args.recipes,
+                         'page_size': args.page_size,
+                         'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Query plans for the per-user filtering paths with and without the
+composite indexes of core migration 0006.
+
+    python -m benchmarks.indexes --recipes 200000 --output plans.json
+
+The database stays at the latest migration, only the indexes 0006
+adds are dropped for the "before" plans and created again. On
+PostgreSQL the plans come from EXPLAIN ANALYZE, other backends only
+report their estimated plan.
+"""
+import argparse
+import importlib
+
+from django.apps import apps
+from django.db import connection, migrations
+
+from benchmarks import seed, utils
+from core.models import Tag, Ingredient, Recipe
+from recipe import serializers
+from recipe.fastlist import RELATIONS
+from recipe.filters import filter_assigned, filter_recipes_by
+
+INDEX_MIGRATION = 'core.migrations.0006_user_lookup_indexes'
+
+
+def set_indexes(present):
+    """drop or create the indexes of INDEX_MIGRATION"""
+    operations = importlib.import_module(INDEX_MIGRATION).Migration.operations
+    with connection.schema_editor() as schema_editor:
+        for operation in operations:
+            if isinstance(operation, migrations.AddIndex):
+                model = apps.get_model('core', operation.model_name)
+                if present:
+                    schema_editor.add_index(model, operation.index)
+                else:
+                    schema_editor.remove_index(model, operation.index)
+            elif isinstance(operation, migrations.RunSQL):
+                schema_editor.execute(operation.sql if present
+                                      else operation.reverse_sql)
+
+
+def queries(user):
+    """the querysets recipe/views.py builds for a user, reading the
+    columns of the list responses"""
+    tag_ids = list(Tag.objects.filter(user=user)
+                   .values_list('id', flat=True)[:3])
+    ingredient_ids = list(Ingredient.objects.filter(user=user)
+                          .values_list('id', flat=True)[:3])
+    attr_fields = serializers.TagSerializer.Meta.fields
+    recipe_fields = [name for name in serializers.RecipeSerializer.Meta.fields
+                     if name not in RELATIONS]
+    tags = Tag.objects.filter(user=user)
+    recipes = Recipe.objects.filter(user=user)
+
+    def attr_list(queryset):
+        return queryset.order_by('-name').values(*attr_fields)[:100]
+
+    def recipe_list(queryset):
+        return queryset.order_by('-id').values(*recipe_fields)[:100]
+
+    return {
+        'tag_list': attr_list(tags),
+        'ingredient_list': attr_list(Ingredient.objects.filter(user=user)),
+        'tag_assigned_only': attr_list(filter_assigned(tags)),
+        'recipe_list': recipe_list(recipes),
+        'recipe_by_tags': recipe_list(
+            filter_recipes_by(recipes, Tag, tag_ids)),
+        'recipe_by_ingredients': recipe_list(
+            filter_recipes_by(recipes, Ingredient, ingredient_ids)),
+    }
+
+
+def explain(querysets):
+    analyze = connection.vendor == 'postgresql'
+    if analyze:
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return {
+        name: (qs.explain(analyze=True, buffers=True) if analyze
+               else qs.explain()).splitlines()
+        for name, qs in querysets.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    seed.add_arguments(parser)
+    parser.add_argument('--output', help='write the plans to this file')
+    args = parser.parse_args()
+
+    with utils.bench_database():
+        user = seed.seed_from_args(args)[0]
+
+        set_indexes(False)
+        before = explain(queries(user))
+        set_indexes(True)
+        after = explain(queries(user))
+
+    utils.write_results({
+        'vendor': connection.vendor,
+        'recipes_per_user': args.recipes,
+        'before': before,
+        'after': after,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Throughput of rendering and parsing a recipe list response with
+DRF's JSONRenderer/JSONParser and the orjson backed core renderer and
+parser, in bytes/sec.
+
+    python -m benchmarks.json_render --recipes 10000 --repeat 5
+"""
+import argparse
+import io
+import time
+from decimal import Decimal
+from unittest import mock
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks import utils
+from core import parsers, renderers
+
+
+def recipe_payload(recipes):
+    """a list response like RecipeSerializer produces"""
+    return {
+        'next': None,
+        'previous': None,
+        'results': [{
+            'id': i,
+            'title': f'recipe {i} with a reasonably long title',
+            'time_minute': i % 120,
+            'price': str(Decimal(i % 5000) / 100),
+            'link': f'https://example.com/recipes/{i}',
+            'ingredients': list(range(i, i + 8)),
+            'tags': list(range(i, i + 3)),
+        } for i in range(recipes)],
+    }
+
+
+def measure(func, repeat):
+    """best of repeat runs, returns (seconds, bytes)"""
+    best, size = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def run(payload, repeat):
+    content = JSONRenderer().render(payload)
+
+    def render(renderer):
+        return lambda: len(renderer.render(payload))
+
+    def parse(parser):
+        def func():
+            parser.parse(io.BytesIO(content))
+            return len(content)
+        return func
+
+    cases = {
+        'drf_render': render(JSONRenderer()),
+        'fast_render': render(renderers.FastJSONRenderer()),
+        'drf_parse': parse(JSONParser()),
+        'fast_parse': parse(parsers.FastJSONParser()),
+    }
+    results = {}
+    for name, func in cases.items():
+        seconds, size = measure(func, repeat)
+        results[name] = {
+            'bytes': size,
+            'seconds': round(seconds, 4),
+            'bytes_per_sec': int(size / seconds),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results to this file')
+    args = parser.parse_args()
+
+    payload = recipe_payload(args.recipes)
+    results = {'recipes': args.recipes,
+               'orjson': renderers.orjson is not None,
+               'results': run(payload, args.repeat)}
+    if renderers.orjson is not None:
+        with mock.patch.object(renderers, 'orjson', None), \
+                mock.patch.object(parsers, 'orjson', None):
+            fallback = run(payload, args.repeat)
+        results['results']['stdlib_fallback_render'] = fallback['fast_render']
+    utils.write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""Latency and throughput of scripted api scenarios.
+
+    python -m benchmarks.load --recipes 2000 --requests 500 --output a.json
+    python -m benchmarks.load --server http://127.0.0.1:8000 --output b.json
+    python -m benchmarks.compare a.json b.json --threshold 10
+
+In process the requests go through the WSGI handler (django.test.Client)
+on a freshly seeded throwaway database. With --server they are sent over
+HTTP keep-alive connections to a running server, whose database must be
+seeded first with ``python -m benchmarks.seed``, and --email selects the
+seeded user to log in as.
+
+Every scenario runs --requests requests from --concurrency client
+threads after --warmup unmeasured ones. The results carry the commit
+and the environment next to the per scenario latency percentiles, so
+that runs can be compared across commits with benchmarks.compare.
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+import django
+from PIL import Image
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+
+from benchmarks import seed, utils
+from benchmarks.async_views import NO_RESPONSE_CACHE
+from recipe.cache import cache_enabled
+
+JSON = 'application/json'
+
+
+class InProcessTransport:
+    """requests through the WSGI handler, one client per thread"""
+    target = 'in-process'
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def request(self, method, path, body=b'', content_type=JSON,
+                headers=None):
+        if not hasattr(self._local, 'client'):
+            self._local.client = Client(raise_request_exception=False)
+        extra = {f'HTTP_{name.upper().replace("-", "_")}': value
+                 for name, value in (headers or {}).items()}
+        res = self._local.client.generic(method, path, body, content_type,
+                                         **extra)
+        return res.status_code, res.getvalue()
+
+    def close(self):
+        connections.close_all()
+
+
+class HttpTransport:
+    """requests to a running server, one connection per thread"""
+
+    def __init__(self, base_url):
+        self.target = base_url
+        url = urlsplit(base_url)
+        self._connection_class = (http.client.HTTPSConnection
+                                  if url.scheme == 'https'
+                                  else http.client.HTTPConnection)
+        self._netloc = url.netloc
+        self._prefix = url.path.rstrip('/')
+        self._local = threading.local()
+
+    def request(self, method, path, body=b'', content_type=JSON,
+                headers=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connection_class(self._netloc)
+        headers = {'Content-Type': content_type, **(headers or {})}
+        try:
+            conn.request(method, self._prefix + path, body or None, headers)
+            res = conn.getresponse()
+            return res.status, res.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+
+    def close(self):
+        pass
+
+
+def _json(transport, method, path, data=None, headers=None):
+    body = json.dumps(data).encode() if data is not None else b''
+    status, content = transport.request(method, path, body, JSON, headers)
+    if status >= 400:
+        raise SystemExit(f'{method} {path}: {status} {content[:200]!r}')
+    return json.loads(content)
+
+
+def _ids(transport, path, headers, limit):
+    data = _json(transport, 'GET', f'{path}?page_size={limit}',
+                 headers=headers)
+    return [item['id'] for item in data['results']]
+
+
+def _jpeg():
+    image = io.BytesIO()
+    Image.new('RGB', (640, 480), (200, 120, 40)).save(image, format='JPEG')
+    return image.getvalue()
+
+
+class Context:
+    """the user, token and ids the scenarios pick from"""
+
+    def __init__(self, transport, email, password, sample=200):
+        self.credentials = {'email': email, 'password': password}
+        token = _json(transport, 'POST', reverse('users:token'),
+                      self.credentials)['token']
+        self.headers = {'Authorization': f'Token {token}'}
+        self.recipe_ids = _ids(transport, reverse('recipe:recipe-list'),
+                               self.headers, sample)
+        self.tag_ids = _ids(transport, reverse('recipe:tag-list'),
+                            self.headers, sample)
+        self.ingredient_ids = _ids(
+            transport, reverse('recipe:ingredient-list'), self.headers,
+            sample)
+        if not (self.recipe_ids and self.tag_ids and self.ingredient_ids):
+            raise SystemExit(f'{email} has no recipes, seed the database')
+        self.image = encode_multipart(BOUNDARY, {
+            'image': _NamedBytes(_jpeg(), 'bench.jpg')})
+
+    def pick(self, ids, i, count=1):
+        return [ids[(i * 7 + n) % len(ids)] for n in range(count)]
+
+
+class _NamedBytes(io.BytesIO):
+    """in-memory file encode_multipart takes for an upload"""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+# scenario(ctx, i) -> (method, path, body, content type, expected status)
+
+def scenario_list(ctx, i):
+    return 'GET', f"{reverse('recipe:recipe-list')}?page_size=50", b'', \
+        JSON, 200
+
+
+def scenario_filter(ctx, i):
+    query = urlencode({
+        'tags': ','.join(map(str, ctx.pick(ctx.tag_ids, i, 2))),
+        'ingredients': ','.join(map(str, ctx.pick(ctx.ingredient_ids, i))),
+        'page_size': 50,
+    })
+    return 'GET', f"{reverse('recipe:recipe-list')}?{query}", b'', JSON, \
+        200
+
+
+def scenario_detail(ctx, i):
+    pk, = ctx.pick(ctx.recipe_ids, i)
+    return 'GET', reverse('recipe:recipe-detail', args=[pk]), b'', JSON, \
+        200
+
+
+def scenario_create(ctx, i):
+    body = json.dumps({
+        'title': f'load test recipe {i}',
+        'time_minute': 10 + i % 60,
+        'price': '5.00',
+        'tags': ctx.pick(ctx.tag_ids, i, 2),
+        'ingredients': ctx.pick(ctx.ingredient_ids, i, 5),
+    }).encode()
+    return 'POST', reverse('recipe:recipe-list'), body, JSON, 201
+
+
+def scenario_upload_image(ctx, i):
+    pk, = ctx.pick(ctx.recipe_ids, i)
+    return 'POST', reverse('recipe:recipe-upload-image', args=[pk]), \
+        ctx.image, MULTIPART_CONTENT, 202
+
+
+def scenario_token(ctx, i):
+    return 'POST', reverse('users:token'), \
+        json.dumps(ctx.credentials).encode(), JSON, 200
+
+
+SCENARIOS = {
+    'list': scenario_list,
+    'filter': scenario_filter,
+    'detail': scenario_detail,
+    'create': scenario_create,
+    'upload_image': scenario_upload_image,
+    'token': scenario_token,
+}
+
+
+def _percentile(values, percent):
+    index = min(len(values) - 1, int(round(percent / 100 * len(values))))
+    return values[index]
+
+
+def summarize(latencies, errors, seconds):
+    latencies = sorted(latencies)
+    ms = [round(latency * 1000, 3) for latency in latencies]
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'rps': round(len(latencies) / seconds, 1) if seconds else 0,
+        'mean_ms': round(sum(ms) / len(ms), 3) if ms else None,
+        'p50_ms': _percentile(ms, 50) if ms else None,
+        'p90_ms': _percentile(ms, 90) if ms else None,
+        'p99_ms': _percentile(ms, 99) if ms else None,
+        'max_ms': ms[-1] if ms else None,
+    }
+
+
+def run(transport, ctx, scenario, requests, concurrency, warmup=0):
+    """send requests from concurrency threads, failed ones count as errors"""
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+    counter = iter(range(warmup + requests))
+
+    def client_loop():
+        own, failed = [], []
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            method, path, body, content_type, expected = scenario(ctx, i)
+            headers = None if scenario is scenario_token else ctx.headers
+            start = time.perf_counter()
+            try:
+                status, content = transport.request(
+                    method, path, body, content_type, headers)
+            except (OSError, http.client.HTTPException) as exc:
+                status, content = None, str(exc)
+            elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            if status == expected:
+                own.append(elapsed)
+            else:
+                failed.append(f'{method} {path}: {status} {content[:200]!r}')
+        with lock:
+            latencies.extend(own)
+            errors.extend(failed)
+        transport.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client_loop)
+                       for _ in range(concurrency)]:
+            future.result()
+    result = summarize(latencies, len(errors), time.perf_counter() - start)
+    if errors:
+        result['first_error'] = errors[0]
+    return result
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(transport, args):
+    return {
+        'commit': _commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'target': transport.target,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor if transport.target == 'in-process'
+        else None,
+        'cpu_count': os.cpu_count(),
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        # a local memory cache without ALLOW_LOCAL is never used
+        'response_cache': None if args.server
+        else not args.no_response_cache and cache_enabled(),
+        'dataset': None if args.server else {
+            name: getattr(args, name) for name in (
+                'users', 'recipes', 'tags', 'ingredients',
+                'tags_per_recipe', 'ingredients_per_recipe', 'seed')},
+    }
+
+
+def run_all(transport, args):
+    ctx = Context(transport, args.email, args.password)
+    return {
+        'environment': environment(transport, args),
+        'scenarios': {
+            name: run(transport, ctx, SCENARIOS[name], args.requests,
+                      args.concurrency, args.warmup)
+            for name in args.scenarios
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    seed.add_arguments(parser)
+    parser.add_argument('--server',
+                        help='base url of a running server, e.g. '
+                             'http://127.0.0.1:8000, instead of in process')
+    parser.add_argument('--email', default='bench0@bench.local',
+                        help='seeded user to log in as with --server')
+    parser.add_argument('--password', default=seed.BENCH_PASSWORD)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200,
+                        help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--no-response-cache', action='store_true',
+                        help='in process, send every list request to the '
+                             'database')
+    parser.add_argument('--output', help='write the results to this file')
+    args = parser.parse_args()
+
+    if args.server:
+        results = run_all(HttpTransport(args.server), args)
+    else:
+        overrides = NO_RESPONSE_CACHE if args.no_response_cache else {}
+        with utils.bench_database(), tempfile.TemporaryDirectory() as media, \
+                override_settings(MEDIA_ROOT=media, **overrides):
+            args.email = seed.seed_from_args(args)[0].email
+            results = run_all(InProcessTransport(), args)
+
+    utils.write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Logins/sec per core of the configured password hashers.
+
+    python -m benchmarks.password_hashing --logins 200
+
+For each hasher (Django's default PBKDF2, the tuned scrypt and, when
+argon2-cffi is installed, the tuned Argon2) this measures password
+checks on one thread, checks through the bounded hashing pool from as
+many threads as there are cores, and logins through the token endpoint.
+"""
+import argparse
+import importlib.util
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from benchmarks import utils
+from users.hashers import verify_password
+
+PASSWORD = 'correct horse battery staple'
+
+HASHERS = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+}
+if importlib.util.find_spec('argon2'):
+    HASHERS['argon2'] = 'users.hashers.Argon2PasswordHasher'
+
+
+def rate(count, seconds):
+    return round(count / seconds, 1)
+
+
+def single_thread(encoded, logins):
+    start = time.perf_counter()
+    for _ in range(logins):
+        assert check_password(PASSWORD, encoded)
+    return rate(logins, time.perf_counter() - start)
+
+
+def pooled(user, logins, cores):
+    def check(_):
+        assert verify_password(user, PASSWORD)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=cores) as pool:
+        list(pool.map(check, range(logins)))
+    return rate(logins, time.perf_counter() - start)
+
+
+def token_endpoint(email, logins):
+    client = Client()
+    url = reverse('users:token')
+    start = time.perf_counter()
+    for _ in range(logins):
+        res = client.post(url, {'email': email, 'password': PASSWORD})
+        assert res.status_code == 200, res.content
+    return rate(logins, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=100,
+                        help='password checks per measurement')
+    parser.add_argument('--output', help='write the results to this file')
+    args = parser.parse_args()
+
+    cores = os.cpu_count()
+    results = {}
+    with utils.bench_database():
+        for name, hasher in HASHERS.items():
+            with override_settings(PASSWORD_HASHERS=[hasher]):
+                email = f'{name}@bench.local'
+                user = get_user_model().objects.create_user(
+                    email=email, password=PASSWORD)
+                pool = pooled(user, args.logins, cores)
+                results[name] = {
+                    'checks_per_sec_1_thread': single_thread(
+                        make_password(PASSWORD), args.logins),
+                    'checks_per_sec_pool': pool,
+                    'checks_per_sec_per_core': round(pool / cores, 1),
+                    'logins_per_sec_endpoint': token_endpoint(
+                        email, args.logins),
+                }
+
+    utils.write_results({'cores': cores, 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
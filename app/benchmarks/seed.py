@@ -0,0 +1,126 @@
+"""Generate a synthetic recipe catalogue.
+
+Used by the benchmarks, or on its own to fill the configured database:
+
+    python -m benchmarks.seed --users 2 --recipes 50000
+"""
+import argparse
+import random
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.counts import update_recipe_counts
+from recipe.search import update_search_vectors
+
+BENCH_PASSWORD = 'benchpass'
+
+
+def _bulk(model, objs, batch_size):
+    return model.objects.bulk_create(objs, batch_size=batch_size)
+
+
+@transaction.atomic
+def seed(users=1, recipes=1000, tags=50, ingredients=200,
+         tags_per_recipe=3, ingredients_per_recipe=8,
+         batch_size=5000, seed=0):
+    """create users x recipes x tags x ingredients and return the users
+
+    bulk_create skips the signals, so the recipe counts and the search
+    data are brought up to date afterwards like the api would.
+    """
+    rnd = random.Random(seed)
+    password = make_password(BENCH_PASSWORD)
+    user_model = get_user_model()
+    start = user_model.objects.count()
+    created = _bulk(user_model, [
+        user_model(email=f'bench{start + i}@bench.local',
+                   name=f'bench {start + i}', password=password)
+        for i in range(users)
+    ], batch_size)
+
+    tag_through = Recipe.tags.through
+    ingredient_through = Recipe.ingredients.through
+    for user in created:
+        tag_ids = [t.id for t in _bulk(Tag, [
+            Tag(user=user, name=f'tag {i}') for i in range(tags)
+        ], batch_size)]
+        ingredient_ids = [i.id for i in _bulk(Ingredient, [
+            Ingredient(user=user, name=f'ingredient {i}')
+            for i in range(ingredients)
+        ], batch_size)]
+
+        recipe_ids = []
+        tag_counts, ingredient_counts = Counter(), Counter()
+        for offset in range(0, recipes, batch_size):
+            count = min(batch_size, recipes - offset)
+            batch = _bulk(Recipe, [
+                Recipe(user=user,
+                       title=f'recipe {offset + i}',
+                       time_minute=rnd.randint(5, 180),
+                       price=Decimal(rnd.randint(100, 99999)) / 100,
+                       link='')
+                for i in range(count)
+            ], batch_size)
+            recipe_ids.extend(recipe.id for recipe in batch)
+            tag_links = _bulk(tag_through, [
+                tag_through(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe in batch
+                for tag_id in rnd.sample(
+                    tag_ids, min(tags_per_recipe, len(tag_ids)))
+            ], batch_size)
+            ingredient_links = _bulk(ingredient_through, [
+                ingredient_through(recipe_id=recipe.id,
+                                   ingredient_id=ingredient_id)
+                for recipe in batch
+                for ingredient_id in rnd.sample(
+                    ingredient_ids,
+                    min(ingredients_per_recipe, len(ingredient_ids)))
+            ], batch_size)
+            tag_counts.update(link.tag_id for link in tag_links)
+            ingredient_counts.update(
+                link.ingredient_id for link in ingredient_links)
+        update_recipe_counts(Tag, tag_counts)
+        update_recipe_counts(Ingredient, ingredient_counts)
+        for offset in range(0, len(recipe_ids), batch_size):
+            update_search_vectors(user.id,
+                                  recipe_ids[offset:offset + batch_size])
+    return created
+
+
+def add_arguments(parser):
+    """dataset size options shared by every benchmark"""
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--recipes', type=int, default=1000,
+                        help='recipes per user')
+    parser.add_argument('--tags', type=int, default=50,
+                        help='tags per user')
+    parser.add_argument('--ingredients', type=int, default=200,
+                        help='ingredients per user')
+    parser.add_argument('--tags-per-recipe', type=int, default=3)
+    parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def seed_from_args(args):
+    return seed(users=args.users, recipes=args.recipes, tags=args.tags,
+                ingredients=args.ingredients,
+                tags_per_recipe=args.tags_per_recipe,
+                ingredients_per_recipe=args.ingredients_per_recipe,
+                seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_arguments(parser)
+    args = parser.parse_args()
+    users = seed_from_args(args)
+    print(f'seeded {len(users)} users with {args.recipes} recipes each')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Throughput, latency and memory of runserver against the pre-fork
+production server of app.server.
+
+    python -m benchmarks.server --recipes 2000 --concurrency 1 8 32
+
+Both servers run as subprocesses on one seeded throwaway database,
+which must be PostgreSQL so that they can reach it (DB_HOST etc). The
+load is the benchmarks.load scenarios sent from --concurrency client
+threads over keep-alive connections. Memory is the summed PSS (RSS
+where the kernel doesn't report it) of a server's processes, after the
+load, so the pages workers share copy on write are only counted once.
+
+Measured with the same benchmarks.load scenarios on one core, 2000
+seeded recipes in a SQLite file and the default cache in Redis,
+requests per second (p50 ms):
+
+                  list c=1     detail c=1   list c=4     detail c=4
+    runserver     18.4 (47.7)  13.8 (59.8)  63.8 (52.4)  42.6 (76.2)
+    prefork, 3    194.8 (4.2)  78.2 (10.3)  190.8 (18.9) 76.2 (45.8)
+
+runserver used 76.9 MB in one process, the pre-fork server 124.4 MB
+PSS over the master and its 3 workers.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.db import connection
+
+from benchmarks import load, seed, utils
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def commands(port, workers):
+    bind = f'127.0.0.1:{port}'
+    return {
+        'runserver': ([sys.executable, 'manage.py', 'runserver',
+                       '--noreload', bind], {}),
+        'prefork': ([sys.executable, '-m', 'app.server'],
+                    {'SERVER_BIND': bind,
+                     **({'SERVER_WORKERS': str(workers)} if workers else {})}),
+    }
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'server exited with {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'server not listening on {port} after {timeout}s')
+
+
+def _children(pid):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as fh:
+                    # the command may contain spaces, ppid follows it
+                    ppid = int(fh.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == pid:
+                pids.append(int(entry))
+    return pids
+
+
+def _memory_kb(pid):
+    for path, field in ((f'/proc/{pid}/smaps_rollup', 'Pss:'),
+                        (f'/proc/{pid}/status', 'VmRSS:')):
+        try:
+            with open(path) as fh:
+                for line in fh:
+                    if line.startswith(field):
+                        return int(line.split()[1])
+        except OSError:
+            continue
+    return 0
+
+
+def memory_mb(pid):
+    """memory of a server process and its workers"""
+    pids = [pid, *_children(pid)]
+    return round(sum(_memory_kb(p) for p in pids) / 1024, 1), len(pids)
+
+
+def bench_server(name, command, env, port, args):
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, process)
+        transport = load.HttpTransport(f'http://127.0.0.1:{port}')
+        ctx = load.Context(transport, args.email, seed.BENCH_PASSWORD)
+        results = {}
+        for concurrency in args.concurrency:
+            results[concurrency] = {
+                scenario: load.run(transport, ctx, load.SCENARIOS[scenario],
+                                   args.requests, concurrency, args.warmup)
+                for scenario in args.scenarios
+            }
+        memory, processes = memory_mb(process.pid)
+        return {'processes': processes, 'memory_mb': memory,
+                'results': results}
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    seed.add_arguments(parser)
+    parser.add_argument('--servers', nargs='+',
+                        choices=('runserver', 'prefork'),
+                        default=['runserver', 'prefork'])
+    parser.add_argument('--workers', type=int,
+                        help='prefork workers, sized from the cores by '
+                             'default')
+    parser.add_argument('--scenarios', nargs='+', choices=load.SCENARIOS,
+                        default=['list', 'filter', 'detail'])
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=500,
+                        help='requests per scenario and concurrency')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--output', help='write the results to this file')
+    args = parser.parse_args()
+
+    if connection.vendor != 'postgresql':
+        parser.error('the configured database must be PostgreSQL')
+
+    results = {}
+    with utils.bench_database() as conn:
+        args.email = seed.seed_from_args(args)[0].email
+        env = {**os.environ, 'DB_NAME': conn.settings_dict['NAME']}
+        conn.close()
+        for name in args.servers:
+            port = _free_port()
+            command, extra = commands(port, args.workers)[name]
+            results[name] = bench_server(name, command, {**env, **extra},
+                                         port, args)
+
+    utils.write_results({'cores': os.cpu_count(),
+                         'recipes': args.recipes,
+                         'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import importlib
+import json
+import os
+import pkgutil
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase
+
+import benchmarks
+
+SEED = ['--recipes', '20', '--tags', '5', '--ingredients', '10']
+
+# name -> arguments making one quick run
+RUNS = {
+    'async_views': [*SEED, '--concurrency', '1', '2', '--requests', '6'],
+    'export_memory': ['--sizes', '20'],
+    'fast_list': [*SEED, '--page-size', '10', '--repeat', '1'],
+    'indexes': SEED,
+    'json_render': ['--recipes', '20', '--repeat', '1'],
+    'load': [*SEED, '--requests', '4', '--warmup', '1'],
+    'password_hashing': ['--logins', '2'],
+}
+POSTGRES_RUNS = {
+    'db_connections': [*SEED, '--threads', '1', '2', '--requests', '6',
+                       '--pool-size', '2'],
+    'server': [*SEED, '--workers', '1', '--concurrency', '1',
+               '--requests', '4', '--warmup', '1'],
+}
+
+
+class BenchmarkSmokeTests(SimpleTestCase):
+    """test every benchmark imports and completes a tiny run"""
+
+    def run_benchmark(self, name, *args):
+        # bench_database() creates its own test database, it must not
+        # clobber the one of this test run
+        env = {**os.environ, 'DB_NAME': 'benchmarks_smoke'}
+        process = subprocess.run(
+            [sys.executable, '-m', f'benchmarks.{name}', *args],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            timeout=600)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        return process.stdout
+
+    def test_modules_import(self):
+        for module in pkgutil.iter_modules(benchmarks.__path__):
+            with self.subTest(module.name):
+                importlib.import_module(f'benchmarks.{module.name}')
+
+    def test_benchmarks_run(self):
+        runs = dict(RUNS)
+        if connection.vendor == 'postgresql':
+            runs.update(POSTGRES_RUNS)
+        for name, args in runs.items():
+            with self.subTest(name):
+                self.run_benchmark(name, *args)
+
+    def test_load_without_response_cache_compared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            self.run_benchmark('load', *RUNS['load'], '--no-response-cache',
+                               '--output', output)
+            with open(output) as fh:
+                results = json.load(fh)
+
+            report = self.run_benchmark('compare', output, output)
+
+        self.assertFalse(results['environment']['response_cache'])
+        for name, result in results['scenarios'].items():
+            self.assertEqual(result['errors'], 0, name)
+        self.assertIn('list', report)
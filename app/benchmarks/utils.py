@@ -0,0 +1,35 @@
+import contextlib
+import json
+import sys
+
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+
+@contextlib.contextmanager
+def bench_database(keepdb=False):
+    """create a migrated test database and drop it afterwards
+
+    The test environment is set up too, so django.test.Client requests
+    to 'testserver' pass ALLOWED_HOSTS.
+    """
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(
+            old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def write_results(results, output=None):
+    """write benchmark results as json to a file or stdout"""
+    text = json.dumps(results, indent=2, default=str)
+    if output:
+        with open(output, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
@@ -0,0 +1,78 @@
+"""PostgreSQL backend taking its connections from a ConnectionPool
+
+Closing the django connection, e.g. at the end of a request when
+CONN_MAX_AGE is 0, hands it back to the pool of the alias instead of
+closing the socket. The pool is configured with the ``POOL`` dict of
+the database settings, see app.settings.
+"""
+import psycopg2
+import psycopg2.extras
+from psycopg2 import extensions
+from django.db.backends.postgresql import base
+
+from core.db.pool import ConnectionPool, get_pool
+
+
+def _reset(conn):
+    """roll back leftovers of the last user, False when broken"""
+    status = conn.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    return True
+
+
+def _check(conn):
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def _connect(conn_params):
+    connection = base.Database.connect(**conn_params)
+    # see base.DatabaseWrapper.get_new_connection
+    psycopg2.extras.register_default_jsonb(
+        conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pool = None
+
+    def _get_pool(self, conn_params):
+        """pool of this alias and connection parameters
+
+        The parameters are part of the key as the test runner switches
+        the database name of an alias.
+        """
+        options = self.settings_dict.get('POOL', {})
+        key = (self.alias, repr(sorted(conn_params.items())))
+        return get_pool(key, lambda: ConnectionPool(
+            lambda: _connect(conn_params),
+            max_size=options.get('MAX_SIZE', 10),
+            timeout=options.get('TIMEOUT', 5.0),
+            max_lifetime=options.get('MAX_LIFETIME', 1800),
+            check_after=options.get('CHECK_AFTER', 30),
+            reset=_reset,
+            check=_check,
+            name=f"{self.alias}:{conn_params.get('database')}",
+        ))
+
+    def get_new_connection(self, conn_params):
+        self.pool = self._get_pool(conn_params)
+        connection = self.pool.acquire()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level',
+                                           connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
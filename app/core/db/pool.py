@@ -0,0 +1,225 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(OperationalError):
+    """no connection was released within the pool timeout"""
+
+
+class ConnectionPool:
+    """bounded pool of raw DB-API connections shared by threads
+
+    ``connect()`` opens a new connection. ``reset(conn)`` is called on
+    release and ``check(conn)`` before handing out a connection idle for
+    more than ``check_after`` seconds, either returning False discards
+    the connection. Connections older than ``max_lifetime`` seconds are
+    closed instead of reused, so the server side never grows stale.
+    """
+
+    def __init__(self, connect, max_size=10, timeout=5.0, max_lifetime=1800,
+                 check_after=30, reset=None, check=None, name='pool'):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.reset = reset
+        self.check = check
+        self.name = name
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._cond = threading.Condition()
+        self.created = 0
+        self.closed = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def _expired(self, conn, now):
+        return now - self._created_at[id(conn)] > self.max_lifetime
+
+    def _discard(self, conn):
+        """close a connection and free its slot, called with the lock"""
+        self._created_at.pop(id(conn), None)
+        self._size -= 1
+        self.closed += 1
+        self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            logger.debug('%s: error closing connection', self.name,
+                         exc_info=True)
+
+    def _take_idle(self, now):
+        """a usable idle connection or None, called with the lock"""
+        while self._idle:
+            conn, released_at = self._idle.pop()
+            if self._expired(conn, now):
+                self._discard(conn)
+                continue
+            if (self.check and now - released_at > self.check_after and
+                    not self.check(conn)):
+                self._discard(conn)
+                continue
+            return conn
+        return None
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            waited = False
+            while True:
+                now = time.monotonic()
+                conn = self._take_idle(now)
+                if conn is not None:
+                    break
+                if self._size < self.max_size:
+                    # reserve the slot, connect outside the lock
+                    self._size += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f'{self.name}: no connection available within '
+                        f'{self.timeout}s ({self.max_size} in use)')
+                waited = True
+                self._cond.wait(remaining)
+            if waited:
+                self.waits += 1
+                self.wait_seconds += time.monotonic() - start
+        if conn is not None:
+            return conn
+
+        try:
+            conn = self.connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self.created += 1
+        return conn
+
+    def release(self, conn):
+        """hand a connection back, discarding it when unusable"""
+        usable = not getattr(conn, 'closed', False)
+        if usable and self.reset:
+            try:
+                usable = self.reset(conn)
+            except Exception:
+                usable = False
+        with self._cond:
+            if id(conn) not in self._created_at:
+                return
+            now = time.monotonic()
+            if not usable or self._expired(conn, now):
+                self._discard(conn)
+            else:
+                self._idle.append((conn, now))
+                self._cond.notify()
+
+    def close(self):
+        """close the idle connections, e.g. after forking"""
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'created': self.created,
+                'closed': self.closed,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 6),
+                'timeouts': self.timeouts,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    """the pool registered under key, created by factory() on first use"""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = factory()
+        return pool
+
+
+def pool_stats():
+    """{pool name: stats} of the pools created in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
+
+
+def close_pools():
+    """close the idle connections of every pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def _forget_pools():
+    """a forked child starts without pools
+
+    The connections are the parent's sockets, they are dropped rather
+    than closed so the parent can keep using them.
+    """
+    global _pools, _pools_lock
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pools)
+
+
+metrics.gauge('db_pool_connections',
+              'Pooled connections by pool and state (idle, in_use).')
+metrics.gauge('db_pool_max_size', 'Maximum connections of a pool.')
+metrics.counter('db_pool_waits_total',
+                'Acquires that waited for a connection.')
+metrics.counter('db_pool_wait_seconds_total',
+                'Time spent waiting for a connection.')
+metrics.counter('db_pool_timeouts_total',
+                'Acquires that gave up waiting for a connection.')
+metrics.counter('db_pool_connections_created_total',
+                'Connections opened by a pool.')
+
+
+def _collect():
+    for name, stats in pool_stats().items():
+        for state in ('idle', 'in_use'):
+            yield 'db_pool_connections', {'pool': name, 'state': state}, \
+                stats[state]
+        yield 'db_pool_max_size', {'pool': name}, stats['max_size']
+        yield 'db_pool_waits_total', {'pool': name}, stats['waits']
+        yield 'db_pool_wait_seconds_total', {'pool': name}, \
+            stats['wait_seconds']
+        yield 'db_pool_timeouts_total', {'pool': name}, stats['timeouts']
+        yield 'db_pool_connections_created_total', {'pool': name}, \
+            stats['created']
+
+
+metrics.register_collector(_collect)
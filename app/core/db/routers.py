@@ -0,0 +1,168 @@
+"""route reads to the replicas of DATABASE_REPLICAS
+
+Reads go to the primary while a request is pinned to it: requests with
+unsafe methods, requests pinned by their view with pin_primary(), and
+every request of a user for DATABASE_PRIMARY_STICKY_SECONDS after one
+of their writes, so users read their own writes despite the
+replication lag. Otherwise every read of a request goes to the one
+replica the middleware picked for it, so the request sees a single
+snapshot whatever the lag of each replica.
+
+The writes are remembered per user id in the default cache, which must
+be shared by the server processes (REDIS_URL). Session users are known
+before the view runs, token users once authenticated, see
+users.authentication.
+"""
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_primary = contextvars.ContextVar('use_primary', default=False)
+# the replica of the current request, outside requests one per query
+_replica = contextvars.ContextVar('replica', default=None)
+
+
+def pin_primary():
+    """send the remaining queries of the request to the primary"""
+    _use_primary.set(True)
+
+
+def reads_from_primary():
+    return _use_primary.get()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or _use_primary.get() or
+                connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return _replica.get() or random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def _sticky_key(user_id):
+    return f'db:primary:user:{user_id}'
+
+
+def stick_to_primary(user_id):
+    """pin the reads of a user for a while after they wrote"""
+    if settings.DATABASE_REPLICAS:
+        pin_primary()
+        cache.set(_sticky_key(user_id), 1,
+                  settings.DATABASE_PRIMARY_STICKY_SECONDS)
+
+
+async def astick_to_primary(user_id):
+    if settings.DATABASE_REPLICAS:
+        pin_primary()
+        await cache.aset(_sticky_key(user_id), 1,
+                         settings.DATABASE_PRIMARY_STICKY_SECONDS)
+
+
+def pin_if_sticky(user_id):
+    """pin the request if its user wrote recently"""
+    if (settings.DATABASE_REPLICAS and not _use_primary.get() and
+            cache.get(_sticky_key(user_id))):
+        pin_primary()
+
+
+async def apin_if_sticky(user_id):
+    if (settings.DATABASE_REPLICAS and not _use_primary.get() and
+            await cache.aget(_sticky_key(user_id))):
+        pin_primary()
+
+
+def _pick_replica():
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+def _has_session(request):
+    return (hasattr(request, 'session') and
+            settings.SESSION_COOKIE_NAME in request.COOKIES)
+
+
+def _session_user_id(request):
+    return request.session.get(SESSION_KEY)
+
+
+def _wrote(request, response):
+    return (request.method not in SAFE_METHODS and
+            response.status_code < 400)
+
+
+def _user_id(request):
+    # DRF sets the user it authenticated on the django request too
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+@sync_and_async_middleware
+def ReplicaRoutingMiddleware(get_response):
+    """pin requests to the primary, see the module docstring"""
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            # always set, so pin_primary() never outlives the request
+            token = _use_primary.set(bool(
+                settings.DATABASE_REPLICAS and
+                request.method not in SAFE_METHODS))
+            replica_token = _replica.set(_pick_replica())
+            try:
+                if settings.DATABASE_REPLICAS and _has_session(request):
+                    user_id = await sync_to_async(_session_user_id)(request)
+                    if user_id is not None:
+                        await apin_if_sticky(user_id)
+                response = await get_response(request)
+            finally:
+                _use_primary.reset(token)
+                _replica.reset(replica_token)
+            if settings.DATABASE_REPLICAS and _wrote(request, response):
+                user_id = await sync_to_async(_user_id)(request)
+                if user_id is not None:
+                    await cache.aset(
+                        _sticky_key(user_id), 1,
+                        settings.DATABASE_PRIMARY_STICKY_SECONDS)
+            return response
+    else:
+        def middleware(request):
+            # always set, so pin_primary() never outlives the request
+            token = _use_primary.set(bool(
+                settings.DATABASE_REPLICAS and
+                request.method not in SAFE_METHODS))
+            replica_token = _replica.set(_pick_replica())
+            try:
+                if settings.DATABASE_REPLICAS and _has_session(request):
+                    user_id = _session_user_id(request)
+                    if user_id is not None:
+                        pin_if_sticky(user_id)
+                response = get_response(request)
+            finally:
+                _use_primary.reset(token)
+                _replica.reset(replica_token)
+            if settings.DATABASE_REPLICAS and _wrote(request, response):
+                user_id = _user_id(request)
+                if user_id is not None:
+                    cache.set(_sticky_key(user_id), 1,
+                              settings.DATABASE_PRIMARY_STICKY_SECONDS)
+            return response
+
+    return middleware
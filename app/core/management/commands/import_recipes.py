@@ -0,0 +1,234 @@
+import csv
+import io
+import json
+import os
+import time
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import ImportCheckpoint, Tag, Ingredient, Recipe
+from recipe.cache import bump_user_version
+from recipe.counts import update_recipe_counts
+from recipe.search import update_search_vectors
+
+RECIPE_COLUMNS = ('user_id', 'title', 'time_minute', 'price', 'link')
+# COPY skips the model defaults, every NOT NULL column must be listed
+COPY_COLUMNS = ('id',) + RECIPE_COLUMNS + ('image_status',)
+
+
+def read_jsonl(fh, skip):
+    lines = (line for line in fh if line.strip())
+    for number, line in enumerate(islice(lines, skip, None), skip + 1):
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            raise CommandError(f'record {number} is invalid: {exc!r}')
+
+
+def read_csv(fh, skip):
+    for row in islice(csv.DictReader(fh), skip, None):
+        for relation in ('tags', 'ingredients'):
+            value = row.get(relation) or ''
+            row[relation] = [n for n in value.split('|') if n]
+        yield row
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+class Importer:
+    """write batches of recipe records, deduping tag and ingredient
+    names per user through in-memory name -> id maps"""
+
+    def __init__(self, default_user=None, use_copy=False, checkpoint=None):
+        self.default_user = default_user
+        self.checkpoint = checkpoint
+        self.use_copy = use_copy
+        self.users = {}
+        self.names = {Tag: {}, Ingredient: {}}
+
+    def _user_id(self, email):
+        if not email:
+            if self.default_user is None:
+                raise CommandError('record has no user and --user is unset')
+            return self.default_user.pk
+        if email not in self.users:
+            user = get_user_model().objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'unknown user "{email}"')
+            self.users[email] = user.pk
+        return self.users[email]
+
+    def _name_map(self, model, user_id):
+        names = self.names[model]
+        if user_id not in names:
+            names[user_id] = dict(
+                model.objects.filter(user_id=user_id)
+                .order_by('-id').values_list('name', 'id'))
+        return names[user_id]
+
+    def _resolve(self, model, records, relation):
+        """ids for the names of a batch, creating missing ones"""
+        missing = {}
+        for record in records:
+            known = self._name_map(model, record['user_id'])
+            for name in record[relation]:
+                if name not in known:
+                    missing[(record['user_id'], name)] = None
+        created = model.objects.bulk_create(
+            [model(user_id=user_id, name=name) for user_id, name in missing])
+        for obj in created:
+            self.names[model][obj.user_id][obj.name] = obj.pk
+        for record in records:
+            known = self.names[model][record['user_id']]
+            record[relation] = {known[name] for name in record[relation]}
+
+    def _clean(self, raw, number):
+        try:
+            return {
+                'user_id': self._user_id(raw.get('user')),
+                'title': str(raw['title'])[:255],
+                'time_minute': int(raw['time_minute']),
+                'price': Decimal(str(raw['price'])),
+                'link': str(raw.get('link') or '')[:255],
+                'tags': [str(n) for n in raw.get('tags') or []],
+                'ingredients': [str(n) for n in raw.get('ingredients') or []],
+            }
+        except (KeyError, TypeError, ValueError, InvalidOperation) as exc:
+            raise CommandError(f'record {number} is invalid: {exc!r}')
+
+    def _copy(self, table, columns, rows):
+        """load rows with COPY ... FROM STDIN"""
+        data = io.StringIO()
+        writer = csv.writer(data)
+        writer.writerows(rows)
+        data.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH CSV',
+                data)
+
+    def _insert_recipes(self, records):
+        if not self.use_copy:
+            recipes = Recipe.objects.bulk_create([
+                Recipe(**{column: r[column] for column in RECIPE_COLUMNS})
+                for r in records
+            ])
+            return [recipe.pk for recipe in recipes]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence('core_recipe', 'id')) "
+                "FROM generate_series(1, %s)", [len(records)])
+            ids = [row[0] for row in cursor.fetchall()]
+        self._copy(Recipe._meta.db_table, COPY_COLUMNS,
+                   self._copy_rows(ids, records))
+        return ids
+
+    def _copy_rows(self, ids, records):
+        return [[pk] + [r[column] for column in RECIPE_COLUMNS] + ['']
+                for pk, r in zip(ids, records)]
+
+    def _insert_links(self, relation, ids, records):
+        field = Recipe._meta.get_field(relation)
+        through = field.remote_field.through
+        target = f'{field.m2m_reverse_field_name()}_id'
+        pairs = [(pk, related) for pk, record in zip(ids, records)
+                 for related in record[relation]]
+        if self.use_copy:
+            self._copy(through._meta.db_table, ('recipe_id', target), pairs)
+        else:
+            through.objects.bulk_create(
+                [through(recipe_id=pk, **{target: related})
+                 for pk, related in pairs])
+        update_recipe_counts(field.related_model,
+                             Counter(related for _, related in pairs))
+
+    def write(self, raw_records, first_number):
+        records = [self._clean(raw, number)
+                   for number, raw in enumerate(raw_records, first_number)]
+        with transaction.atomic():
+            self._resolve(Tag, records, 'tags')
+            self._resolve(Ingredient, records, 'ingredients')
+            ids = self._insert_recipes(records)
+            self._insert_links('tags', ids, records)
+            self._insert_links('ingredients', ids, records)
+            # committed with the batch, so a batch is never imported twice
+            if self.checkpoint is not None:
+                self.checkpoint.records = first_number - 1 + len(records)
+                self.checkpoint.save(update_fields=['records'])
+            # scheduled with the batch, a resumed import skips its recipes
+            for user_id in {r['user_id'] for r in records}:
+                bump_user_version(user_id)
+                update_search_vectors(user_id, [
+                    pk for pk, r in zip(ids, records)
+                    if r['user_id'] == user_id])
+
+
+class Command(BaseCommand):
+    """django command to bulk import recipes from a jsonl or csv file"""
+
+    help = ('Import recipes from a JSONL or CSV file in batches. Progress '
+            'is checkpointed in the database with every batch, rerunning '
+            'the command resumes after the last committed batch.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', help='email of the owner of records '
+                                           'without a "user" field')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--restart', action='store_true',
+                            help='ignore an existing checkpoint')
+        parser.add_argument('--copy', action='store_true',
+                            help='load rows with PostgreSQL COPY')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.')
+        if fmt not in READERS:
+            raise CommandError(f'unknown format "{fmt}", use --format')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy needs a PostgreSQL database')
+
+        default_user = None
+        if options['user']:
+            default_user = get_user_model().objects.filter(
+                email=options['user']).first()
+            if default_user is None:
+                raise CommandError(f'unknown user "{options["user"]}"')
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(path=path)
+        if options['restart']:
+            checkpoint.records = 0
+        done = checkpoint.records
+        if done:
+            self.stdout.write(f'resuming after record {done}')
+        importer = Importer(default_user, options['copy'], checkpoint)
+        imported = 0
+        start = time.monotonic()
+
+        with open(path, newline='') as fh:
+            records = READERS[fmt](fh, done)
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                importer.write(batch, done + 1)
+                done += len(batch)
+                imported += len(batch)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{done} records imported')
+
+        elapsed = time.monotonic() - start
+        checkpoint.delete()
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'imported {imported} recipes in {elapsed:.1f}s '
+            f'({rate:.0f} rows/sec)'))
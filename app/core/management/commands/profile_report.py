@@ -0,0 +1,47 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import clear_records, load_records, report
+
+
+class Command(BaseCommand):
+    """django command to print the sampled per endpoint profile"""
+
+    help = ('Summarize the requests sampled by ProfilingMiddleware. '
+            'Reads the REQUEST_PROFILING DIR spill files of every worker.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true',
+                            help='print the report as json')
+        parser.add_argument('--top', type=int, default=5,
+                            help='duplicate queries listed per endpoint')
+        parser.add_argument('--clear', action='store_true',
+                            help='delete the records after reporting')
+
+    def handle(self, *args, **options):
+        # without spill files the records only live in the server processes
+        if not settings.REQUEST_PROFILING['DIR']:
+            raise CommandError(
+                'REQUEST_PROFILING_DIR is not set, the sampled requests '
+                'are only in the server processes, see /api/profiling/')
+        records = load_records()
+        endpoints = report(records, top=options['top'])
+        if options['json']:
+            self.stdout.write(json.dumps(endpoints, indent=2))
+        else:
+            self.stdout.write(f'{len(records)} sampled requests')
+            for summary in endpoints:
+                self.stdout.write(
+                    f"{summary['endpoint']}: {summary['count']} requests, "
+                    f"p50 {summary['wall_ms_p50']}ms, "
+                    f"p95 {summary['wall_ms_p95']}ms, "
+                    f"db {summary['db_ms_avg']}ms, "
+                    f"{summary['queries_avg']} queries "
+                    f"(max {summary['queries_max']})")
+                for duplicate in summary['duplicates']:
+                    self.stdout.write(
+                        f"  {duplicate['count']}x {duplicate['fingerprint']}")
+        if options['clear']:
+            clear_records()
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Recipe
+from recipe.cache import bump_user_version
+from recipe.images import process_recipe_image
+
+
+class Command(BaseCommand):
+    """django command to handle recipe images stuck in processing"""
+
+    help = ('Find recipe images still processing after the deadline, e.g. '
+            'because the server restarted before its worker ran, and '
+            'process them again or mark them failed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--deadline', type=int,
+            default=settings.RECIPE_IMAGE_PROCESSING['DEADLINE'],
+            help='seconds an image may be processing, RECIPE_IMAGE_DEADLINE '
+                 'by default')
+        parser.add_argument('--fail', action='store_true',
+                            help='mark the images failed instead of '
+                                 'processing them again')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        started = now - timedelta(seconds=options['deadline'])
+        # uploads from before the start was recorded have none
+        stuck = Recipe.objects.filter(
+            Q(image_processing_started__lt=started) |
+            Q(image_processing_started__isnull=True),
+            image_status=Recipe.IMAGE_PROCESSING,
+        ).order_by('id').values_list('id', 'user_id', 'image')
+
+        reaped = 0
+        for recipe_id, user_id, image in stuck.iterator():
+            # claim the row, a concurrent run or a late worker wins it
+            claimed = Recipe.objects.filter(
+                pk=recipe_id, image=image,
+                image_status=Recipe.IMAGE_PROCESSING,
+            ).update(image_processing_started=now,
+                     **({'image_status': Recipe.IMAGE_FAILED}
+                        if options['fail'] else {}))
+            if not claimed:
+                continue
+            reaped += 1
+            if options['fail']:
+                bump_user_version(user_id)
+            else:
+                process_recipe_image(recipe_id)
+
+        verb = 'failed' if options['fail'] else 'processed again'
+        self.stdout.write(self.style.SUCCESS(f'{reaped} stuck images {verb}'))
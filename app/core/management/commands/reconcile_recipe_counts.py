@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from core.models import Tag, Ingredient
+from recipe.cache import bump_user_version
+from recipe.counts import actual_recipe_count
+
+
+class Command(BaseCommand):
+    """django command to fix drifted tag and ingredient recipe counts"""
+
+    help = ('Recount recipe_count of every tag and ingredient in batches '
+            'and fix the rows that drifted, e.g. after raw SQL writes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only report the drifted rows')
+
+    def _reconcile_batch(self, model, start, end, dry_run):
+        with transaction.atomic():
+            drifted = list(
+                model.objects.filter(pk__gte=start, pk__lte=end)
+                .annotate(actual=actual_recipe_count(model))
+                .exclude(recipe_count=F('actual'))
+                .select_for_update(of=('self',))
+                .only('id', 'user_id', 'recipe_count'))
+            if drifted and not dry_run:
+                for obj in drifted:
+                    obj.recipe_count = obj.actual
+                model.objects.bulk_update(drifted, ['recipe_count'])
+        return drifted
+
+    def handle(self, *args, **options):
+        for model in (Tag, Ingredient):
+            ids = model.objects.order_by('pk').values_list('pk', flat=True)
+            checked = fixed = 0
+            users = set()
+            batch = list(ids[:options['batch_size']])
+            while batch:
+                drifted = self._reconcile_batch(
+                    model, batch[0], batch[-1], options['dry_run'])
+                checked += len(batch)
+                fixed += len(drifted)
+                users.update(obj.user_id for obj in drifted)
+                batch = list(ids.filter(pk__gt=batch[-1])
+                             [:options['batch_size']])
+
+            if not options['dry_run']:
+                for user_id in users:
+                    bump_user_version(user_id)
+            verb = 'drifted' if options['dry_run'] else 'fixed'
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: checked {checked}, '
+                f'{verb} {fixed}'))
@@ -0,0 +1,395 @@
+"""prometheus style metrics of the api process, see settings.METRICS
+
+Counters and histograms are recorded into per-thread stores, so the
+request path takes no lock, and summed when scraped. The stores of
+exited threads, e.g. the per request threads of ASGI's sync code, are
+folded into one process total whenever a store is created or scraped.
+Collectors add values read at scrape time, e.g. connection pool and
+cache stats.
+
+With ``MULTIPROCESS_DIR`` set every process also writes its totals to
+a metrics-<pid>.json file there, every ``FLUSH_INTERVAL`` seconds and
+when scraped, and a scrape sums the files of all processes so that any
+worker answers for the whole server. Gauges are labelled with their
+pid. The counters of exited workers, and of a former process whose pid
+was reused, are folded into metrics-archive.json so that counters never
+go backwards, their gauges are dropped.
+"""
+import fcntl
+import glob
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+ARCHIVE = 'metrics-archive.json'
+# processes folded into the archive, remembered in case their file
+# outlives the archive write
+ARCHIVED_PROCESSES = 100
+
+# name -> (type, help, buckets)
+_metrics = {}
+_collectors = []
+
+_local = threading.local()
+# (thread, store) of the live threads
+_stores = []
+# totals of the exited threads
+_retired = defaultdict(float)
+_stores_lock = threading.Lock()
+_flusher = None
+# tells apart the processes that got the same pid
+_process = uuid.uuid4().hex
+_claimed = False
+
+
+def counter(name, help):
+    _metrics[name] = (COUNTER, help, None)
+
+
+def gauge(name, help):
+    _metrics[name] = (GAUGE, help, None)
+
+
+def histogram(name, help, buckets=DEFAULT_BUCKETS):
+    _metrics[name] = (HISTOGRAM, help, tuple(buckets))
+
+
+def register_collector(collect):
+    """collect() yields (name, labels, value) of registered metrics"""
+    _collectors.append(collect)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _sweep():
+    """fold the stores of exited threads into _retired, under the lock"""
+    live = []
+    for thread, store in _stores:
+        if thread.is_alive():
+            live.append((thread, store))
+            continue
+        for key, value in store.items():
+            _retired[key] += value
+    _stores[:] = live
+
+
+def _store():
+    try:
+        return _local.store
+    except AttributeError:
+        store = _local.store = defaultdict(float)
+        with _stores_lock:
+            _sweep()
+            _stores.append((threading.current_thread(), store))
+        _start_flusher()
+        return store
+
+
+def inc(name, value=1, **labels):
+    """add to a counter, only touching the calling thread's store"""
+    _store()[_key(name, labels)] += value
+
+
+def observe(name, value, **labels):
+    """record a histogram sample"""
+    buckets = _metrics[name][2]
+    store = _store()
+    le = next((str(bound) for bound in buckets if value <= bound), '+Inf')
+    store[_key(f'{name}_bucket', {**labels, 'le': le})] += 1
+    store[_key(f'{name}_sum', labels)] += value
+    store[_key(f'{name}_count', labels)] += 1
+
+
+def snapshot():
+    """(counter samples, gauge samples) of this process"""
+    with _stores_lock:
+        _sweep()
+        stores = [store for _, store in _stores]
+        samples = defaultdict(float, _retired)
+    for store in stores:
+        # dict() copies in one step, owners may be writing meanwhile
+        for key, value in dict(store).items():
+            samples[key] += value
+    gauges = {}
+    for collect in _collectors:
+        for name, labels, value in collect():
+            if _metrics[name][0] == GAUGE:
+                gauges[_key(name, labels)] = value
+            else:
+                samples[_key(name, labels)] += value
+    return samples, gauges
+
+
+def _path(directory, pid):
+    return os.path.join(directory, f'metrics-{pid}.json')
+
+
+@contextmanager
+def _locked(directory):
+    """serialize the processes folding files into the archive"""
+    with open(os.path.join(directory, 'metrics.lock'), 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _read(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    with open(f'{path}.tmp', 'w') as fh:
+        json.dump(data, fh)
+    os.replace(f'{path}.tmp', path)
+
+
+def _add_samples(samples, data):
+    for name, labels, value in data['samples']:
+        samples[(name, tuple(map(tuple, labels)))] += value
+
+
+def _archive(directory, path, data):
+    """fold the counters of a gone process into the archive file"""
+    archive_path = os.path.join(directory, ARCHIVE)
+    archive = _read(archive_path) or {'samples': [], 'processes': []}
+    process = data.get('process')
+    if process is None or process not in archive['processes']:
+        samples = defaultdict(float)
+        _add_samples(samples, archive)
+        _add_samples(samples, data)
+        processes = [*archive['processes'], *filter(None, [process])]
+        _write(archive_path, {
+            'samples': [[*key, value] for key, value in samples.items()],
+            'processes': processes[-ARCHIVED_PROCESSES:],
+        })
+    os.remove(path)
+
+
+def flush():
+    """write this process' totals to the multiprocess directory"""
+    global _claimed
+    directory = settings.METRICS['MULTIPROCESS_DIR']
+    samples, gauges = snapshot()
+    path = _path(directory, os.getpid())
+    if not _claimed:
+        with _locked(directory):
+            data = _read(path)
+            if data is not None and data.get('process') != _process:
+                _archive(directory, path, data)
+        _claimed = True
+    _write(path, {
+        'process': _process,
+        'samples': [[*key, value] for key, value in samples.items()],
+        'gauges': [[*key, value] for key, value in gauges.items()],
+    })
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _start_flusher():
+    global _flusher
+    if not settings.METRICS['MULTIPROCESS_DIR'] or _flusher is not None:
+        return
+    with _stores_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_flush_loop, name='metrics-flush', daemon=True,
+                args=(settings.METRICS['FLUSH_INTERVAL'],))
+            _flusher.start()
+
+
+def _after_fork():
+    """children start empty, the parent's totals stay the parent's"""
+    global _local, _stores, _retired, _stores_lock, _flusher, _process, \
+        _claimed
+    _local = threading.local()
+    _stores = []
+    _retired = defaultdict(float)
+    _stores_lock = threading.Lock()
+    _flusher = None
+    _process = uuid.uuid4().hex
+    _claimed = False
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _collect_all():
+    directory = settings.METRICS['MULTIPROCESS_DIR']
+    if not directory:
+        return snapshot()
+    flush()
+    samples = defaultdict(float)
+    gauges = {}
+    with _locked(directory):
+        archive = _read(os.path.join(directory, ARCHIVE))
+        archived = set(archive['processes']) if archive else set()
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+            if not pid.isdigit():
+                continue
+            data = _read(path)
+            if data is None or data.get('process') in archived:
+                continue
+            if not _alive(int(pid)):
+                _archive(directory, path, data)
+                continue
+            _add_samples(samples, data)
+            for name, labels, value in data['gauges']:
+                labels = tuple(sorted([*map(tuple, labels), ('pid', pid)]))
+                gauges[(name, labels)] = value
+        archive = _read(os.path.join(directory, ARCHIVE))
+    if archive:
+        _add_samples(samples, archive)
+    return samples, gauges
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n') \
+                .replace('"', r'\"')
+
+
+def _line(name, labels, value):
+    if labels:
+        pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+        name = f'{name}{{{pairs}}}'
+    return f'{name} {_number(value)}'
+
+
+def _number(value):
+    """every digit of the value, integral ones without a fraction"""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+def _bucket_order(labels, buckets):
+    le = dict(labels)['le']
+    return buckets.index(float(le)) if le != '+Inf' else len(buckets)
+
+
+def render():
+    """the metrics in the prometheus text exposition format"""
+    samples, gauges = _collect_all()
+    by_name = defaultdict(list)
+    for (name, labels), value in {**samples, **gauges}.items():
+        by_name[name].append((labels, value))
+
+    lines = []
+    for name, (kind, help, buckets) in sorted(_metrics.items()):
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind != HISTOGRAM:
+            for labels, value in sorted(by_name.get(name, ())):
+                lines.append(_line(name, labels, value))
+            continue
+        # buckets are stored per bound and exposed cumulative
+        series = defaultdict(list)
+        for labels, value in by_name.get(f'{name}_bucket', ()):
+            rest = tuple(item for item in labels if item[0] != 'le')
+            series[rest].append((_bucket_order(labels, buckets), value))
+        for labels in sorted(series):
+            counts = dict(series[labels])
+            total = 0
+            for index, bound in enumerate([*map(str, buckets), '+Inf']):
+                total += counts.get(index, 0)
+                lines.append(_line(f'{name}_bucket',
+                                   (*labels, ('le', bound)), total))
+        for suffix in ('_sum', '_count'):
+            for labels, value in sorted(by_name.get(name + suffix, ())):
+                lines.append(_line(name + suffix, labels, value))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    return HttpResponse(render(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
+
+
+counter('http_requests_total', 'Requests by route name, method and status.')
+histogram('http_request_duration_seconds',
+          'Request latency by route name.')
+
+
+class MetricsMiddleware:
+    """count requests and observe their latency per route name"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _record(self, request, response, seconds):
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        inc('http_requests_total', route=route, method=request.method,
+            status=response.status_code)
+        observe('http_request_duration_seconds', seconds, route=route)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.8 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('processing', 'processing'), ('ready', 'ready'), ('failed', 'failed')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# trigram indexes serving the istartswith and similarity lookups of
+# recipe.autocomplete. They only exist on PostgreSQL so they are kept
+# out of the model state, like the m2m indexes of 0006.
+TRIGRAM_INDEXES = (
+    ('core_tag_name_trgm_idx', 'core_tag'),
+    ('core_ingredient_name_trgm_idx', 'core_ingredient'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name, table in TRIGRAM_INDEXES:
+            schema_editor.execute(
+                f'CREATE INDEX {name} ON {table} '
+                f'USING gin (UPPER(name) gin_trgm_ops);')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name, _ in TRIGRAM_INDEXES:
+            schema_editor.execute(f'DROP INDEX {name};')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.1.8 on 2026-10-18 17:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_recipe_counts(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    for relation in ('tags', 'ingredients'):
+        field = Recipe._meta.get_field(relation)
+        through = field.remote_field.through
+        column = f'{field.m2m_reverse_field_name()}_id'
+        counts = through.objects.filter(**{column: OuterRef('pk')}) \
+                                .order_by().values(column) \
+                                .annotate(count=Count('*')).values('count')
+        field.related_model.objects.update(
+            recipe_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'name'], name='core_ingredient_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'name'], name='core_tag_assigned_idx'),
+        ),
+        migrations.RunPython(backfill_recipe_counts,
+                             migrations.RunPython.noop),
+    ]
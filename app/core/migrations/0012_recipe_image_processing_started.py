@@ -0,0 +1,18 @@
+# Generated by Django 4.1.8 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_processing_started',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
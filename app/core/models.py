@@ -1,4 +1,6 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
 
@@ -49,6 +51,17 @@ class Tag(models.Model):
                             settings.AUTH_USER_MODEL
                             , on_delete= models.CASCADE
                             )
+    # recipes using it, kept up to date by recipe.signals
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'], include=['id'],
+                         name='core_tag_user_name_idx'),
+            models.Index(fields=['user', 'name'],
+                         condition=models.Q(recipe_count__gt=0),
+                         name='core_tag_assigned_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -61,12 +74,32 @@ class Ingredient(models.Model):
                             settings.AUTH_USER_MODEL
                             , on_delete= models.CASCADE
                             )
-    
+    # recipes using it, kept up to date by recipe.signals
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'], include=['id'],
+                         name='core_ingredient_user_name_idx'),
+            models.Index(fields=['user', 'name'],
+                         condition=models.Q(recipe_count__gt=0),
+                         name='core_ingredient_assigned_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
 class Recipe(models.Model):
     """recipe object"""
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_PROCESSING, 'processing'),
+        (IMAGE_READY, 'ready'),
+        (IMAGE_FAILED, 'failed'),
+    )
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
@@ -76,6 +109,30 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image_status = models.CharField(max_length=10, blank=True,
+                                    choices=IMAGE_STATUS_CHOICES)
+    # when processing of the image started, see reap_image_processing
+    image_processing_started = models.DateTimeField(null=True,
+                                                    editable=False)
+    # weighted title, tag and ingredient names, see recipe.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='core_recipe_user_id_idx'),
+            GinIndex(fields=['search_vector'],
+                     name='core_recipe_search_gin_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class ImportCheckpoint(models.Model):
+    """records of a file already imported by import_recipes, saved in
+    the transaction of each batch"""
+    path = models.CharField(max_length=1024, unique=True)
+    records = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.path}: {self.records}'
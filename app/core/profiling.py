@@ -0,0 +1,244 @@
+"""sampled per-view latency and query profiling
+
+ProfilingMiddleware profiles a REQUEST_PROFILING['SAMPLE_RATE'] share
+of the requests: wall time, time spent in the database, query count and
+the fingerprints of queries run more than once (n+1 patterns). Records
+go to an in-process ring buffer, and with ``DIR`` set are also appended
+to a per-pid JSONL file so that the profile_report command and the
+/api/profiling/ endpoint see every worker process. A spill file is
+rotated to profile-<pid>.1.jsonl once it holds ``BUFFER_SIZE`` records,
+so a process keeps at most twice that on disk.
+
+The current profile lives in a contextvar, read by a query wrapper
+installed on every connection, so queries made from the async ORM
+thread are accounted to the request too. Unsampled requests only pay
+for a random() call and a contextvar lookup per query.
+"""
+import contextvars
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from glob import glob
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_current = contextvars.ContextVar('profile', default=None)
+
+_records = None
+_records_lock = threading.Lock()
+# (path, records written) of this process' spill file
+_spilled = (None, 0)
+
+# runs of placeholders, e.g. of IN (...) and multi row VALUES lists
+_PLACEHOLDER_LISTS = re.compile(r'%s(?:\s*,\s*%s)+')
+_VALUES_LISTS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """the sql of a query with its variable length lists collapsed"""
+    sql = _PLACEHOLDER_LISTS.sub('...', sql)
+    sql = _VALUES_LISTS.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class Profile:
+    __slots__ = ('queries', 'db_seconds', 'fingerprints')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.fingerprints = Counter()
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_seconds += time.perf_counter() - start
+        profile.queries += 1
+        profile.fingerprints[fingerprint(sql)] += 1
+
+
+def _install(connection, **kwargs):
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def _install_all():
+    """wrap the connections of this thread opened before the middleware"""
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+
+
+def _buffer():
+    global _records
+    with _records_lock:
+        if _records is None:
+            _records = deque(
+                maxlen=settings.REQUEST_PROFILING['BUFFER_SIZE'])
+        return _records
+
+
+def _spill_path(directory, suffix=''):
+    return os.path.join(directory, f'profile-{os.getpid()}{suffix}.jsonl')
+
+
+def _spill(directory, entry):
+    """append to the spill file, rotating it at BUFFER_SIZE records"""
+    global _spilled
+    path = _spill_path(directory)
+    with _records_lock:
+        spilled_path, count = _spilled
+        # a forked child has a new pid, so a new file
+        if spilled_path != path:
+            count = 0
+        if count >= settings.REQUEST_PROFILING['BUFFER_SIZE']:
+            os.replace(path, _spill_path(directory, '.1'))
+            count = 0
+        with open(path, 'a') as fh:
+            fh.write(json.dumps(entry) + '\n')
+        _spilled = (path, count + 1)
+
+
+def record(request, response, wall_seconds, profile):
+    match = request.resolver_match
+    entry = {
+        'time': round(time.time(), 3),
+        'method': request.method,
+        'view': match.view_name if match else None,
+        'path': request.path,
+        'status': response.status_code,
+        'wall_ms': round(wall_seconds * 1000, 3),
+        'db_ms': round(profile.db_seconds * 1000, 3),
+        'queries': profile.queries,
+        'duplicates': {sql: count for sql, count
+                       in profile.fingerprints.most_common() if count > 1},
+    }
+    _buffer().append(entry)
+    directory = settings.REQUEST_PROFILING['DIR']
+    if directory:
+        _spill(directory, entry)
+    return entry
+
+
+def load_records():
+    """records of every process when spilling, else of this one"""
+    directory = settings.REQUEST_PROFILING['DIR']
+    if not directory:
+        with _records_lock:
+            return list(_records or ())
+    records = []
+    for path in sorted(glob(os.path.join(directory, 'profile-*.jsonl'))):
+        with open(path) as fh:
+            records.extend(json.loads(line) for line in fh if line.strip())
+    return records
+
+
+def clear_records():
+    global _spilled
+    with _records_lock:
+        _spilled = (None, 0)
+        if _records is not None:
+            _records.clear()
+    directory = settings.REQUEST_PROFILING['DIR']
+    if directory:
+        for path in glob(os.path.join(directory, 'profile-*.jsonl')):
+            os.remove(path)
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = int(round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def report(records, top=5):
+    """per endpoint summaries of profile records, slowest p95 first"""
+    endpoints = {}
+    for entry in records:
+        key = f"{entry['method']} {entry['view'] or entry['path']}"
+        endpoints.setdefault(key, []).append(entry)
+
+    summaries = []
+    for key, entries in endpoints.items():
+        wall = [e['wall_ms'] for e in entries]
+        duplicates = Counter()
+        for entry in entries:
+            duplicates.update(entry['duplicates'])
+        summaries.append({
+            'endpoint': key,
+            'count': len(entries),
+            'wall_ms_p50': _percentile(wall, 50),
+            'wall_ms_p95': _percentile(wall, 95),
+            'wall_ms_max': max(wall),
+            'db_ms_avg': round(sum(e['db_ms'] for e in entries) /
+                               len(entries), 3),
+            'queries_avg': round(sum(e['queries'] for e in entries) /
+                                 len(entries), 2),
+            'queries_max': max(e['queries'] for e in entries),
+            'duplicates': [{'fingerprint': sql, 'count': count}
+                           for sql, count in duplicates.most_common(top)],
+        })
+    return sorted(summaries, key=lambda s: -s['wall_ms_p95'])
+
+
+class ProfilingMiddleware:
+    """sample requests into the profile ring buffer, see module docstring"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = settings.REQUEST_PROFILING
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = options['SAMPLE_RATE']
+        connection_created.connect(_install)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        _install_all()
+        profile = Profile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        record(request, response, time.perf_counter() - start, profile)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        # the connections live in the thread the async ORM runs queries in
+        await sync_to_async(_install_all)()
+        profile = Profile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        record(request, response, time.perf_counter() - start, profile)
+        return response
@@ -0,0 +1,84 @@
+import json
+from decimal import Decimal
+
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+class DecimalJSONEncoder(JSONEncoder):
+    """drf encoder writing decimals as strings instead of floats"""
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+_fallback_encoder = DecimalJSONEncoder()
+
+
+def _default(obj):
+    """types orjson doesn't know, e.g. Decimal or lazy translations"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return _fallback_encoder.default(obj)
+
+
+def _stdlib_dumps(data):
+    return json.dumps(data, cls=DecimalJSONEncoder, ensure_ascii=False,
+                      separators=(',', ':')).encode()
+
+
+def dumps(data):
+    """compact utf-8 json bytes, with orjson when it is installed
+
+    The bytes match JSONRenderer's for what the api renders: strings,
+    integers, decimals, lists and dicts. Data orjson refuses, e.g.
+    integers beyond 64 bits or dicts with non string keys, is encoded
+    by the stdlib instead. Floats aren't guaranteed to match, orjson
+    writes NaN and infinities as null.
+    """
+    if orjson is None:
+        content = _stdlib_dumps(data)
+    else:
+        try:
+            content = orjson.dumps(data, default=_default)
+        except orjson.JSONEncodeError:
+            content = _stdlib_dumps(data)
+    # like JSONRenderer, keep the output safe to embed in javascript
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028') \
+                         .replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+def json_response(data, status=200):
+    """plain django json response, for views outside of drf"""
+    return HttpResponse(dumps(data), status=status,
+                        content_type='application/json')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer rendering compact responses with orjson
+
+    Falls back to the stdlib encoder when orjson is not installed and
+    for indented output, e.g. an ``Accept: application/json; indent=4``
+    request. Decimals are always rendered as strings.
+    """
+
+    encoder_class = DecimalJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return dumps(data)
@@ -1,7 +1,19 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
+from django.utils import timezone
+
+from core.management.commands.import_recipes import COPY_COLUMNS, \
+    Importer
+from core.models import ImportCheckpoint, Tag, Ingredient, Recipe
 
 class CommandTests(TestCase):
     def test_wait_for_db_ready(self):
@@ -18,4 +30,241 @@ class CommandTests(TestCase):
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
\ No newline at end of file
+            self.assertEqual(gi.call_count, 6)
+
+class ImportRecipesTests(TestCase):
+    """test the import_recipes command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def _write(self, name, lines):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w') as fh:
+            fh.write('\n'.join(lines) + '\n')
+        return path
+
+    def _jsonl(self, count, start=0, **extra):
+        return self._write('recipes.jsonl', [json.dumps(dict({
+            'title': f'food{i}', 'time_minute': 10, 'price': '5.50',
+            'tags': ['vegan', f'tag{i % 2}'], 'ingredients': ['salt'],
+        }, **extra)) for i in range(start, start + count)])
+
+    def test_import_jsonl(self):
+        """test recipes are imported with deduplicated tags"""
+        Tag.objects.create(user=self.user, name='vegan')
+        path = self._jsonl(5)
+
+        call_command('import_recipes', path, user='test@test.com',
+                     batch_size=2, stdout=StringIO())
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(
+            sorted(Tag.objects.values_list('name', flat=True)),
+            ['tag0', 'tag1', 'vegan'])
+        self.assertEqual(Ingredient.objects.count(), 1)
+        recipe = Recipe.objects.get(title='food3')
+        self.assertEqual(sorted(recipe.tags.values_list('name', flat=True)),
+                         ['tag1', 'vegan'])
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_import_csv(self):
+        """test importing a csv file"""
+        path = self._write('recipes.csv', [
+            'title,time_minute,price,link,tags,ingredients',
+            'food1,10,5.50,,vegan|quick,salt',
+        ])
+
+        call_command('import_recipes', path, user='test@test.com',
+                     stdout=StringIO())
+
+        recipe = Recipe.objects.get(title='food1')
+        self.assertEqual(sorted(recipe.tags.values_list('name', flat=True)),
+                         ['quick', 'vegan'])
+
+    def test_import_resumes_from_checkpoint(self):
+        """test an interrupted import resumes after the last batch"""
+        path = self._write('recipes.jsonl', [
+            json.dumps({'title': 'food1', 'time_minute': 5, 'price': 1}),
+            json.dumps({'title': 'food2', 'time_minute': 5, 'price': 1}),
+            json.dumps({'title': 'food3', 'time_minute': 'bad', 'price': 1}),
+        ])
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, user='test@test.com',
+                         batch_size=2, stdout=StringIO())
+
+        self.assertEqual(Recipe.objects.count(), 2)
+        self._write('recipes.jsonl', [
+            json.dumps({'title': 'food1', 'time_minute': 5, 'price': 1}),
+            json.dumps({'title': 'food2', 'time_minute': 5, 'price': 1}),
+            json.dumps({'title': 'food3', 'time_minute': 5, 'price': 1}),
+        ])
+        call_command('import_recipes', path, user='test@test.com',
+                     batch_size=2, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['food1', 'food2', 'food3'])
+
+    def test_import_resumes_after_records_not_lines(self):
+        """test blank lines don't shift where an import resumes"""
+        path = self._write('recipes.jsonl', [
+            '',
+            json.dumps({'title': 'food1', 'time_minute': 5, 'price': 1}),
+            '',
+            json.dumps({'title': 'food2', 'time_minute': 5, 'price': 1}),
+        ])
+        ImportCheckpoint.objects.create(path=path, records=1)
+
+        call_command('import_recipes', path, user='test@test.com',
+                     stdout=StringIO())
+
+        self.assertEqual(list(Recipe.objects.values_list('title', flat=True)),
+                         ['food2'])
+
+    def test_checkpoint_saved_with_batch(self):
+        """test a batch is rolled back when its checkpoint isn't saved"""
+        path = self._jsonl(3)
+
+        with patch.object(ImportCheckpoint, 'save',
+                          side_effect=OperationalError), \
+                self.assertRaises(OperationalError):
+            call_command('import_recipes', path, user='test@test.com',
+                         stdout=StringIO())
+
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_invalid_json_names_record(self):
+        """test a broken line fails with its record number"""
+        path = self._write('recipes.jsonl', [
+            json.dumps({'title': 'food1', 'time_minute': 5, 'price': 1}),
+            '',
+            '{"title": ',
+        ])
+
+        with self.assertRaisesMessage(CommandError, 'record 2 is invalid'):
+            call_command('import_recipes', path, user='test@test.com',
+                         stdout=StringIO())
+
+    def test_search_vectors_scheduled_with_batch(self):
+        """test a batch whose search data can't be scheduled is rolled
+        back, so a resumed import doesn't skip it"""
+        path = self._jsonl(3)
+
+        with patch('core.management.commands.import_recipes.'
+                   'update_search_vectors', side_effect=OperationalError), \
+                self.assertRaises(OperationalError):
+            call_command('import_recipes', path, user='test@test.com',
+                         stdout=StringIO())
+
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(ImportCheckpoint.objects.get().records, 0)
+
+    def test_copy_columns_cover_required_fields(self):
+        """test COPY writes every NOT NULL column of the recipe table"""
+        required = {field.column for field in Recipe._meta.concrete_fields
+                    if not field.null}
+        record = {'user_id': self.user.pk, 'title': 'food', 'time_minute': 5,
+                  'price': 1, 'link': ''}
+
+        rows = Importer()._copy_rows([7], [record])
+
+        self.assertLessEqual(required, set(COPY_COLUMNS))
+        self.assertEqual(dict(zip(COPY_COLUMNS, rows[0])), {
+            'id': 7, 'image_status': '', **record})
+
+    def test_import_unknown_user(self):
+        """test records of unknown users are rejected"""
+        path = self._jsonl(1, user='nobody@test.com')
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, stdout=StringIO())
+
+        self.assertFalse(Recipe.objects.exists())
+
+
+class ReconcileRecipeCountsTests(TestCase):
+    """test the reconcile_recipe_counts command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='food', time_minute=10, price='5.00')
+
+    def test_reconcile_fixes_drift(self):
+        """test drifted counts are recomputed in batches"""
+        tags = [Tag.objects.create(user=self.user, name=f'tag{i}')
+                for i in range(5)]
+        self.recipe.tags.add(*tags[:3])
+        Tag.objects.update(recipe_count=7)
+        out = StringIO()
+
+        call_command('reconcile_recipe_counts', batch_size=2, stdout=out)
+
+        self.assertEqual(
+            list(Tag.objects.order_by('pk')
+                 .values_list('recipe_count', flat=True)),
+            [1, 1, 1, 0, 0])
+        self.assertIn('tags: checked 5, fixed 5', out.getvalue())
+
+    def test_reconcile_dry_run(self):
+        """test a dry run only reports the drift"""
+        ingredient = Ingredient.objects.create(user=self.user, name='salt')
+        self.recipe.ingredients.add(ingredient)
+        Ingredient.objects.update(recipe_count=0)
+        out = StringIO()
+
+        call_command('reconcile_recipe_counts', dry_run=True, stdout=out)
+
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.recipe_count, 0)
+        self.assertIn('ingredients: checked 1, drifted 1', out.getvalue())
+
+
+class ReapImageProcessingTests(TestCase):
+    """test the reap_image_processing command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+
+    def _recipe(self, started):
+        return Recipe.objects.create(
+            user=self.user, title='food', time_minute=10, price='5.00',
+            image='uploads/recipe/missing.jpg',
+            image_status=Recipe.IMAGE_PROCESSING,
+            image_processing_started=started)
+
+    def assertStatus(self, recipe, image_status):
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, image_status)
+
+    def test_stuck_images_processed_again(self):
+        stuck = self._recipe(timezone.now() - timedelta(hours=1))
+        recent = self._recipe(timezone.now())
+        out = StringIO()
+
+        with patch('core.management.commands.reap_image_processing.'
+                   'process_recipe_image') as process:
+            call_command('reap_image_processing', deadline=60, stdout=out)
+
+        process.assert_called_once_with(stuck.id)
+        self.assertStatus(recent, Recipe.IMAGE_PROCESSING)
+        self.assertIn('1 stuck images processed again', out.getvalue())
+
+    def test_stuck_images_failed(self):
+        """test stuck images can be marked failed, including ones from
+        before the processing start was recorded"""
+        stuck = [self._recipe(timezone.now() - timedelta(hours=1)),
+                 self._recipe(None)]
+
+        call_command('reap_image_processing', deadline=60, fail=True,
+                     stdout=StringIO())
+
+        for recipe in stuck:
+            self.assertStatus(recipe, Recipe.IMAGE_FAILED)
@@ -0,0 +1,150 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from core.db.backends.postgresql_pool.base import _reset
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def close(self):
+        self.closed = 1
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """test the bounded connection pool"""
+
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            conn = FakeConnection()
+            self.opened.append(conn)
+            return conn
+
+        kwargs.setdefault('reset', _reset)
+        return ConnectionPool(connect, **kwargs)
+
+    def test_released_connections_reused(self):
+        pool = self.make_pool(max_size=2)
+
+        conn = pool.acquire()
+        pool.release(conn)
+
+        self.assertIs(pool.acquire(), conn)
+        self.assertEqual(len(self.opened), 1)
+        stats = pool.stats()
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['created'], 1)
+
+    def test_timeout_when_exhausted(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        conn = pool.acquire()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+        waiter.start()
+        time.sleep(0.05)
+
+        pool.release(conn)
+        waiter.join()
+
+        self.assertEqual(got, [conn])
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_seconds'], 0)
+
+    def test_open_transaction_rolled_back(self):
+        pool = self.make_pool()
+        conn = pool.acquire()
+        conn.status = extensions.TRANSACTION_STATUS_INERROR
+
+        pool.release(conn)
+
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertIs(pool.acquire(), conn)
+
+    def test_broken_connections_discarded(self):
+        pool = self.make_pool(max_size=1)
+        conn = pool.acquire()
+        conn.status = extensions.TRANSACTION_STATUS_UNKNOWN
+
+        pool.release(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertEqual(pool.stats()['closed'], 1)
+
+    def test_failed_check_discards_idle_connection(self):
+        pool = self.make_pool(check=lambda conn: False, check_after=0)
+        conn = pool.acquire()
+        pool.release(conn)
+        time.sleep(0.01)
+
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertTrue(conn.closed)
+
+    def test_expired_connections_recycled(self):
+        pool = self.make_pool(max_lifetime=0)
+        conn = pool.acquire()
+        time.sleep(0.01)
+
+        pool.release(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_failed_connect_frees_slot(self):
+        pool = ConnectionPool(lambda: 1 / 0, max_size=1, timeout=0.05)
+
+        for _ in range(2):
+            with self.assertRaises(ZeroDivisionError):
+                pool.acquire()
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_threads_never_exceed_max_size(self):
+        pool = self.make_pool(max_size=3, timeout=5)
+        in_use = []
+        peak = []
+        lock = threading.Lock()
+
+        def work():
+            for _ in range(20):
+                conn = pool.acquire()
+                with lock:
+                    in_use.append(conn)
+                    peak.append(len(in_use))
+                time.sleep(0.001)
+                with lock:
+                    in_use.remove(conn)
+                pool.release(conn)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(max(peak), 3)
+        self.assertLessEqual(len(self.opened), 3)
@@ -0,0 +1,238 @@
+import contextvars
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.db import transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, \
+    override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from core.db.routers import (ReplicaRouter, ReplicaRoutingMiddleware,
+                             pin_primary, reads_from_primary,
+                             stick_to_primary)
+from users.authentication import CachedTokenAuthentication, token_cache
+from core.models import Recipe
+
+REPLICAS = ['replica1', 'replica2']
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRouterTests(SimpleTestCase):
+    """test reads are routed to the replicas unless pinned"""
+    # not wrapped in a transaction, which pins reads to the primary
+    databases = {'default'}
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_go_to_replicas(self):
+        self.assertIn(self.router.db_for_read(Recipe), REPLICAS)
+
+    def test_pinned_reads_go_to_primary(self):
+        context = contextvars.copy_context()
+        context.run(pin_primary)
+
+        self.assertEqual(context.run(self.router.db_for_read, Recipe),
+                         'default')
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+    def test_reads_in_transaction_go_to_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_migrations_skip_replicas(self):
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'core'))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS,
+                   DATABASE_PRIMARY_STICKY_SECONDS=60)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    """test requests are pinned to the primary when they need it"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.pinned = []
+        self.routed = []
+        self.status = 200
+
+        def view(request):
+            self.pinned.append(reads_from_primary())
+            router = ReplicaRouter()
+            self.routed.append(
+                {router.db_for_read(Recipe) for _ in range(20)})
+            if request.GET.get('pin'):
+                pin_primary()
+            return HttpResponse(status=self.status)
+
+        self.middleware = ReplicaRoutingMiddleware(view)
+
+    def request(self, method, user_id=1, **params):
+        request = getattr(self.factory, method)('/', params)
+        # what the session and authentication middlewares provide
+        if user_id:
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = 'session'
+            request.session = {SESSION_KEY: str(user_id)}
+            request.user = get_user_model()(pk=user_id)
+        else:
+            request.user = AnonymousUser()
+        return self.middleware(request)
+
+    def test_safe_requests_read_replicas(self):
+        self.request('get')
+
+        self.assertEqual(self.pinned, [False])
+
+    def test_one_replica_per_request(self):
+        """test the reads of a request see one replica's snapshot"""
+        for _ in range(10):
+            self.request('get')
+
+        self.assertTrue(all(len(routed) == 1 for routed in self.routed))
+        self.assertLessEqual(set().union(*self.routed), set(REPLICAS))
+
+    def test_writes_pin_primary(self):
+        self.request('post')
+
+        self.assertEqual(self.pinned, [True])
+
+    def test_anonymous_writes_pin_primary(self):
+        self.request('post', user_id=None)
+
+        self.assertEqual(self.pinned, [True])
+
+    def test_reads_after_write_stick_to_primary(self):
+        """test read-your-writes only for the writing user"""
+        self.request('post')
+        self.request('get')
+        self.request('get', user_id=2)
+
+        self.assertEqual(self.pinned, [True, True, False])
+
+    def test_failed_writes_not_sticky(self):
+        self.status = 400
+        self.request('post')
+        self.request('get')
+
+        self.assertEqual(self.pinned, [True, False])
+
+    @override_settings(DATABASE_PRIMARY_STICKY_SECONDS=0)
+    def test_sticky_window_expires(self):
+        self.request('post')
+        self.request('get')
+
+        self.assertEqual(self.pinned, [True, False])
+
+    def test_pin_does_not_leak_between_requests(self):
+        self.request('get', pin=1)
+        self.request('get')
+
+        self.assertEqual(self.pinned, [False, False])
+        self.assertFalse(reads_from_primary())
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_nothing_pinned(self):
+        self.request('post')
+
+        self.assertEqual(self.pinned, [False])
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS,
+                   DATABASE_PRIMARY_STICKY_SECONDS=60)
+class TokenRoutingTests(TestCase):
+    """test token users read their writes and new tokens"""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.token = Token.objects.create(user=self.user)
+
+    def authenticate(self):
+        auth = CachedTokenAuthentication()
+        context = contextvars.copy_context()
+        context.run(auth.authenticate_credentials, self.token.key)
+        return context.run(reads_from_primary)
+
+    def test_token_creation_sticks_to_primary(self):
+        """test the first requests with a new token read the primary"""
+        self.client.post(reverse('users:token'), {
+            'email': 'test@test.com', 'password': 'testpass'})
+
+        self.assertTrue(self.authenticate())
+
+    def test_token_users_stick_to_primary_after_write(self):
+        self.assertFalse(self.authenticate())
+
+        context = contextvars.copy_context()
+        context.run(stick_to_primary, self.user.pk)
+        token_cache.clear()
+
+        self.assertTrue(self.authenticate())
+
+    def test_missing_token_looked_up_on_primary(self):
+        """test a token not yet on the replica is read from the primary"""
+        lookup = patch('rest_framework.authentication.TokenAuthentication.'
+                       'authenticate_credentials',
+                       side_effect=[AuthenticationFailed('Invalid token.'),
+                                    (self.user, self.token)])
+        with lookup as authenticate:
+            self.assertTrue(self.authenticate())
+
+        self.assertEqual(authenticate.call_count, 2)
+
+
+class RecipeViewRoutingTests(TestCase):
+    """test the recipe views pin what must read the primary"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='curry', time_minute=5, price='5.00')
+
+    def test_upload_image_pins_primary(self):
+        url = reverse('recipe:recipe-upload-image', args=[self.recipe.id])
+        with patch('recipe.views.pin_primary') as pin:
+            self.client.get(url)
+
+        pin.assert_called_once_with()
+
+    def test_export_database_chosen_before_streaming(self):
+        """test the streamed export body doesn't route its queries after
+        the middleware reset the request's routing"""
+        Recipe.objects.create(
+            user=self.user, title='soup', time_minute=5, price='5.00')
+        route = patch.object(ReplicaRouter, 'db_for_read',
+                             return_value='default')
+        with route as db_for_read:
+            res = self.client.get(reverse('recipe:recipe-export'))
+            db_for_read.reset_mock()
+
+            body = b''.join(res.streaming_content)
+
+        db_for_read.assert_not_called()
+        self.assertIn(b'soup', body)
+
+    def test_list_reads_replicas(self):
+        with patch('recipe.views.pin_primary') as pin:
+            self.client.get(reverse('recipe:recipe-list'))
+
+        pin.assert_not_called()
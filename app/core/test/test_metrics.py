@@ -0,0 +1,277 @@
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from unittest import mock
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import (AsyncClient, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recipe
+from recipe.images import delete_thumbnails
+
+METRICS_URL = reverse('metrics')
+
+
+def metrics_settings(**options):
+    return override_settings(METRICS={**settings.METRICS, **options})
+
+
+def value(text, sample):
+    """the value of a sample line, 0 when it isn't exposed yet"""
+    match = re.search(rf'^{re.escape(sample)} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """test recording and rendering of metrics"""
+
+    def setUp(self):
+        metrics.counter('test_events_total', 'Events.')
+        metrics.gauge('test_workers', 'Workers.')
+        metrics.histogram('test_duration_seconds', 'Durations.',
+                          buckets=(0.1, 1.0))
+
+    def test_counters_of_threads_summed(self):
+        before = value(metrics.render(), 'test_events_total{kind="a"}')
+
+        def work():
+            for _ in range(100):
+                metrics.inc('test_events_total', kind='a')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        after = value(metrics.render(), 'test_events_total{kind="a"}')
+        self.assertEqual(after - before, 400)
+
+    def test_stores_of_exited_threads_folded(self):
+        """test a thread per request doesn't grow the stores"""
+        before = value(metrics.render(), 'test_events_total{kind="b"}')
+
+        for _ in range(50):
+            thread = threading.Thread(
+                target=metrics.inc, args=('test_events_total',),
+                kwargs={'kind': 'b'})
+            thread.start()
+            thread.join()
+
+        after = value(metrics.render(), 'test_events_total{kind="b"}')
+        self.assertEqual(after - before, 50)
+        self.assertLessEqual(len(metrics._stores),
+                             threading.active_count())
+
+    def test_histogram_buckets_cumulative(self):
+        for seconds in (0.05, 0.5, 0.5, 3):
+            metrics.observe('test_duration_seconds', seconds, route='h')
+
+        text = metrics.render()
+
+        self.assertIn('# TYPE test_duration_seconds histogram', text)
+        self.assertEqual(value(text, 'test_duration_seconds_bucket'
+                                     '{route="h",le="0.1"}'), 1)
+        self.assertEqual(value(text, 'test_duration_seconds_bucket'
+                                     '{route="h",le="1.0"}'), 3)
+        self.assertEqual(value(text, 'test_duration_seconds_bucket'
+                                     '{route="h",le="+Inf"}'), 4)
+        self.assertEqual(value(text, 'test_duration_seconds_count'
+                                     '{route="h"}'), 4)
+        self.assertEqual(value(text, 'test_duration_seconds_sum'
+                                     '{route="h"}'), 4.05)
+
+    def test_label_values_escaped(self):
+        metrics.inc('test_events_total', kind='say "hi"\n')
+
+        self.assertIn(r'test_events_total{kind="say \"hi\"\n"} 1',
+                      metrics.render())
+
+    def test_multiprocess_files_aggregated(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                metrics_settings(MULTIPROCESS_DIR=directory):
+            metrics.inc('test_events_total', kind='mp')
+            own = value(metrics.render(), 'test_events_total{kind="mp"}')
+            # the file another worker process left behind
+            with open(os.path.join(directory, 'metrics-1.json'), 'w') as fh:
+                fh.write('{"samples": [["test_events_total", '
+                         '[["kind", "mp"]], 2]], "gauges": '
+                         '[["test_workers", [["kind", "x"]], 10]]}')
+
+            text = metrics.render()
+
+            self.assertEqual(value(text, 'test_events_total{kind="mp"}'),
+                             own + 2)
+            self.assertIn('test_workers{kind="x",pid="1"} 10', text)
+            self.assertTrue(os.path.exists(
+                os.path.join(directory, f'metrics-{os.getpid()}.json')))
+
+    def test_values_keep_every_digit(self):
+        metrics.inc('test_events_total', 123456789, kind='int')
+        metrics.inc('test_events_total', 1234567.25, kind='float')
+
+        text = metrics.render()
+
+        self.assertRegex(text, r'test_events_total\{kind="int"\} \d{9}\n')
+        self.assertRegex(text,
+                         r'test_events_total\{kind="float"\} \d+\.25\n')
+
+    def _worker_file(self, directory, pid, process, count):
+        with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as fh:
+            json.dump({'process': process, 'samples': [
+                ['test_events_total', [['kind', 'gone']], count]],
+                'gauges': [['test_workers', [['kind', 'gone']], 1]]}, fh)
+
+    def _exited_pid(self):
+        process = subprocess.Popen(['true'])
+        process.wait()
+        return process.pid
+
+    def test_exited_workers_archived(self):
+        """test exited workers' counters are kept in one file"""
+        with tempfile.TemporaryDirectory() as directory, \
+                metrics_settings(MULTIPROCESS_DIR=directory):
+            for count in (2, 3):
+                self._worker_file(directory, self._exited_pid(),
+                                  f'exited{count}', count)
+
+            metrics.render()
+            text = metrics.render()
+
+            self.assertEqual(value(text, 'test_events_total{kind="gone"}'),
+                             5)
+            self.assertNotIn('test_workers{kind="gone"', text)
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                sorted([metrics.ARCHIVE, 'metrics.lock',
+                        f'metrics-{os.getpid()}.json']))
+
+    def test_reused_pid_archived(self):
+        """test a new process with the pid of an exited one keeps its
+        counters"""
+        with tempfile.TemporaryDirectory() as directory, \
+                metrics_settings(MULTIPROCESS_DIR=directory), \
+                mock.patch.object(metrics, '_claimed', False):
+            self._worker_file(directory, os.getpid(), 'exited', 2)
+
+            text = metrics.render()
+
+            self.assertEqual(value(text, 'test_events_total{kind="gone"}'),
+                             2)
+            self.assertNotIn('test_workers{kind="gone"', text)
+
+    def test_pool_stats_collected(self):
+        stats = {'max_size': 4, 'size': 3, 'idle': 1, 'in_use': 2,
+                 'created': 3, 'closed': 0, 'waits': 5,
+                 'wait_seconds': 0.25, 'timeouts': 1}
+        with mock.patch('core.db.pool.pool_stats',
+                        return_value={'default:app': stats}):
+            text = metrics.render()
+
+        self.assertIn('db_pool_connections{pool="default:app",'
+                      'state="in_use"} 2', text)
+        self.assertIn('db_pool_waits_total{pool="default:app"} 5', text)
+        self.assertIn('db_pool_wait_seconds_total{pool="default:app"} 0.25',
+                      text)
+
+
+class MetricsMiddlewareTests(TestCase):
+    """test requests are counted per route name"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def requests(self, route, status=200, method='GET'):
+        return value(metrics.render(),
+                     f'http_requests_total{{method="{method}",'
+                     f'route="{route}",status="{status}"}}')
+
+    def test_disabled(self):
+        with metrics_settings(ENABLED=False), \
+                self.assertRaises(MiddlewareNotUsed):
+            metrics.MetricsMiddleware(lambda request: HttpResponse())
+
+    def test_requests_counted_per_route(self):
+        before = self.requests('recipe:recipe-list')
+
+        self.client.get(reverse('recipe:recipe-list'))
+        self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertEqual(self.requests('recipe:recipe-list') - before, 2)
+        self.assertIn('http_request_duration_seconds_count'
+                      '{route="recipe:recipe-list"}', metrics.render())
+
+    def test_unmatched_requests(self):
+        middleware = metrics.MetricsMiddleware(
+            lambda request: HttpResponse(status=404))
+        before = self.requests('unmatched', 404)
+
+        middleware(RequestFactory().get('/nowhere'))
+
+        self.assertEqual(self.requests('unmatched', 404) - before, 1)
+
+    async def test_async_requests_counted(self):
+        token = await Token.objects.acreate(user=self.user)
+        before = self.requests('recipe:async-tag-list')
+
+        await AsyncClient().get(reverse('recipe:async-tag-list'),
+                                AUTHORIZATION=f'Token {token.key}')
+
+        self.assertEqual(self.requests('recipe:async-tag-list') - before, 1)
+
+    @override_settings(RECIPE_RESPONSE_CACHE={
+        **settings.RECIPE_RESPONSE_CACHE, 'ALLOW_LOCAL': True})
+    def test_response_cache_hits_counted(self):
+        sample = ('recipe_response_cache_requests_total'
+                  '{endpoint="recipe:recipe-list",result="%s"}')
+        before = [value(metrics.render(), sample % result)
+                  for result in ('hit', 'miss')]
+
+        self.client.get(reverse('recipe:recipe-list'))
+        self.client.get(reverse('recipe:recipe-list'))
+
+        after = [value(metrics.render(), sample % result)
+                 for result in ('hit', 'miss')]
+        self.assertEqual([a - b for a, b in zip(after, before)], [1, 1])
+
+    def test_image_upload_bytes_counted(self):
+        recipe = Recipe.objects.create(user=self.user, title='sample',
+                                       time_minute=10, price=5)
+        before = value(metrics.render(), 'recipe_image_upload_bytes_total')
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            size = ntf.tell()
+            ntf.seek(0)
+            self.client.post(
+                reverse('recipe:recipe-upload-image', args=[recipe.id]),
+                {'image': ntf}, format='multipart')
+
+        recipe.refresh_from_db()
+        delete_thumbnails(recipe.image.storage, recipe.image.name)
+        recipe.image.delete()
+        after = value(metrics.render(), 'recipe_image_upload_bytes_total')
+        self.assertEqual(after - before, size)
+
+    def test_endpoint_format(self):
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'],
+                         'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn(b'# TYPE http_requests_total counter', res.content)
@@ -0,0 +1,180 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, \
+    override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import profiling
+from core.models import Tag
+
+PROFILING_URL = reverse('profiling')
+
+
+def profiling_settings(**options):
+    return override_settings(REQUEST_PROFILING={
+        **settings.REQUEST_PROFILING, 'ENABLED': True, 'SAMPLE_RATE': 1,
+        **options})
+
+
+class FingerprintTests(TestCase):
+
+    def test_lists_collapsed(self):
+        self.assertEqual(
+            profiling.fingerprint(
+                'SELECT *  FROM t\n WHERE id IN (%s, %s, %s)'),
+            'SELECT * FROM t WHERE id IN (...)')
+        self.assertEqual(
+            profiling.fingerprint(
+                'INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO t (a, b) VALUES (...)')
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """test sampled requests are recorded with their queries"""
+
+    def setUp(self):
+        profiling.clear_records()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        profiling.clear_records()
+
+    def view(self, request):
+        for _ in range(3):
+            Tag.objects.filter(user=self.user).exists()
+        return HttpResponse()
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(self.view)
+
+    @profiling_settings()
+    def test_duplicate_queries_recorded(self):
+        profiling.ProfilingMiddleware(self.view)(self.factory.get('/'))
+
+        entry, = profiling.load_records()
+        self.assertEqual(entry['queries'], 3)
+        self.assertEqual(list(entry['duplicates'].values()), [3])
+        self.assertGreater(entry['wall_ms'], 0)
+
+    @profiling_settings(SAMPLE_RATE=0)
+    def test_unsampled_requests_not_recorded(self):
+        profiling.ProfilingMiddleware(self.view)(self.factory.get('/'))
+
+        self.assertEqual(profiling.load_records(), [])
+
+    @profiling_settings()
+    def test_queries_outside_requests_not_recorded(self):
+        middleware = profiling.ProfilingMiddleware(self.view)
+        middleware(self.factory.get('/'))
+        Tag.objects.count()
+
+        self.assertEqual(profiling.load_records()[0]['queries'], 3)
+
+    def test_spill_files_shared(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                profiling_settings(DIR=directory):
+            profiling.ProfilingMiddleware(self.view)(self.factory.get('/'))
+            # another process only sees the files
+            profiling._records.clear()
+
+            self.assertEqual(len(profiling.load_records()), 1)
+            profiling.clear_records()
+            self.assertEqual(profiling.load_records(), [])
+
+    def test_spill_files_rotated(self):
+        """test a process keeps at most two buffers of records on disk"""
+        with tempfile.TemporaryDirectory() as directory, \
+                profiling_settings(DIR=directory, BUFFER_SIZE=2):
+            middleware = profiling.ProfilingMiddleware(self.view)
+            for path in ('/1', '/2', '/3', '/4', '/5'):
+                middleware(self.factory.get(path))
+
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertEqual([r['path'] for r in profiling.load_records()],
+                             ['/3', '/4', '/5'])
+            profiling.clear_records()
+
+    @profiling_settings()
+    def test_view_names_reported(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.get(reverse('recipe:tag-list'))
+        client.get(reverse('recipe:tag-list'))
+
+        summary, = profiling.report(profiling.load_records())
+        self.assertEqual(summary['endpoint'], 'GET recipe:tag-list')
+        self.assertEqual(summary['count'], 2)
+        self.assertGreater(summary['queries_max'], 0)
+
+    @profiling_settings()
+    async def test_async_view_queries_recorded(self):
+        token = await Token.objects.acreate(user=self.user)
+
+        await AsyncClient().get(reverse('recipe:async-tag-list'),
+                                AUTHORIZATION=f'Token {token.key}')
+
+        entry, = profiling.load_records()
+        self.assertEqual(entry['view'], 'recipe:async-tag-list')
+        self.assertGreater(entry['queries'], 0)
+
+
+@profiling_settings()
+class ProfilingReportTests(TestCase):
+    """test the report endpoint and command"""
+
+    def setUp(self):
+        profiling.clear_records()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.admin = get_user_model().objects.create_superuser(
+            'admin@test.com', 'testpass')
+
+    def tearDown(self):
+        profiling.clear_records()
+
+    def test_endpoint_admin_only(self):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(PROFILING_URL)
+
+        self.assertEqual(res.status_code, 403)
+
+    def test_endpoint_report(self):
+        self.client.force_authenticate(self.admin)
+        self.client.get(reverse('users:me'))
+
+        res = self.client.get(PROFILING_URL)
+
+        self.assertEqual(res.status_code, 200)
+        endpoints = [e['endpoint'] for e in res.data['endpoints']]
+        self.assertIn('GET users:me', endpoints)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                profiling_settings(DIR=directory):
+            self.client.force_authenticate(self.user)
+            self.client.get(reverse('users:me'))
+            out = StringIO()
+
+            call_command('profile_report', '--clear', stdout=out)
+
+            self.assertIn('GET users:me: 1 requests', out.getvalue())
+            self.assertEqual(profiling.load_records(), [])
+
+    def test_command_needs_spill_files(self):
+        """test the command refuses to report its own empty buffer"""
+        with self.assertRaisesMessage(CommandError, 'REQUEST_PROFILING_DIR'):
+            call_command('profile_report', stdout=StringIO())
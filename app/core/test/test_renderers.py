@@ -0,0 +1,62 @@
+import io
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+PAYLOAD = {
+    'id': 1,
+    'title': 'caf\u00e9 \u2028',
+    'price': Decimal('5.10'),
+    'tags': [1, 2],
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """test the json renderer and parser"""
+
+    def test_decimal_as_string(self):
+        """test decimals keep their digits instead of becoming floats"""
+        content = FastJSONRenderer().render(PAYLOAD)
+
+        self.assertEqual(json.loads(content)['price'], '5.10')
+
+    def test_same_document_as_drf(self):
+        """test the output matches JSONRenderer byte for byte"""
+        data = dict(PAYLOAD, price='5.10')
+
+        self.assertEqual(FastJSONRenderer().render(data),
+                         JSONRenderer().render(data))
+
+    def test_data_orjson_refuses(self):
+        """test data orjson can't encode falls back to the stdlib"""
+        for data in ({'id': 2 ** 64}, {1: 'one'}):
+            self.assertEqual(FastJSONRenderer().render(data),
+                             JSONRenderer().render(data))
+
+    def test_stdlib_fallback(self):
+        """test rendering and parsing work without orjson"""
+        with patch('core.renderers.orjson', None), \
+             patch('core.parsers.orjson', None):
+            content = FastJSONRenderer().render(PAYLOAD)
+            data = FastJSONParser().parse(io.BytesIO(content))
+
+        self.assertEqual(data, dict(PAYLOAD, price='5.10'))
+
+    def test_indent(self):
+        """test an indent in the accepted media type is honoured"""
+        content = FastJSONRenderer().render(
+            {'id': 1}, 'application/json; indent=2')
+
+        self.assertEqual(content, b'{\n  "id": 1\n}')
+
+    def test_parse_error(self):
+        """test invalid bodies raise a parse error"""
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"id": '))
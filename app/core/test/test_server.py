@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from app import server
+
+
+class ServerOptionsTests(SimpleTestCase):
+    """test the production server settings"""
+
+    def test_workers_sized_from_cores(self):
+        options = server.options({}, cores=4)
+
+        self.assertEqual(options['workers'], 9)
+        self.assertEqual(options['worker_class'], 'sync')
+        self.assertTrue(options['preload_app'])
+        self.assertEqual(options['max_requests'], 2000)
+        self.assertEqual(options['max_requests_jitter'], 200)
+
+    def test_threaded_workers(self):
+        options = server.options({'SERVER_THREADS': '4',
+                                  'SERVER_WORKERS': '2'}, cores=4)
+
+        self.assertEqual(options['worker_class'], 'gthread')
+        self.assertEqual((options['workers'], options['threads']), (2, 4))
+
+    def test_asgi_workers(self):
+        options = server.options({'SERVER_ASGI': '1',
+                                  'SERVER_THREADS': '4'}, cores=4)
+
+        self.assertEqual(options['worker_class'], server.ASGI_WORKER)
+        self.assertEqual((options['workers'], options['threads']), (4, 1))
+
+    def test_metrics_dir_created_for_several_workers(self):
+        environ = {}
+
+        self.assertIsNone(server.prepare_metrics_dir(environ, 1))
+        directory = server.prepare_metrics_dir(environ, 3)
+
+        self.assertEqual(environ['METRICS_MULTIPROCESS_DIR'], directory)
+        os.rmdir(directory)
+
+    def test_metrics_dir_emptied(self):
+        with tempfile.TemporaryDirectory() as directory:
+            stale = os.path.join(directory, 'metrics-1.json')
+            open(stale, 'w').close()
+
+            server.prepare_metrics_dir(
+                {'METRICS_MULTIPROCESS_DIR': directory}, 1)
+
+            self.assertFalse(os.path.exists(stale))
+
+    def test_hashing_threads_split_between_workers(self):
+        self.assertEqual(server.prepare_password_hashing({}, 9, cores=4), 1)
+        self.assertEqual(server.prepare_password_hashing({}, 2, cores=8), 4)
+        self.assertEqual(server.prepare_password_hashing(
+            {'PASSWORD_HASH_WORKERS': '3'}, 9, cores=4), 3)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_workers_refused_local_cache(self):
+        self.assertIsNone(server.shared_cache_error(1))
+        self.assertIn('REDIS_URL', server.shared_cache_error(2))
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://redis:6379/0'}},
+        TOKEN_AUTH_CACHE={**settings.TOKEN_AUTH_CACHE,
+                          'SHARED_CACHE': 'default'})
+    def test_workers_share_redis_cache(self):
+        self.assertIsNone(server.shared_cache_error(4))
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                    'LOCATION': 'redis://redis:6379/0'},
+        'local': {'BACKEND':
+                  'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_workers_refused_local_token_cache(self):
+        for alias in (None, 'local'):
+            with self.settings(TOKEN_AUTH_CACHE={
+                    **settings.TOKEN_AUTH_CACHE, 'SHARED_CACHE': alias}):
+                self.assertIsNone(server.shared_cache_error(1))
+                self.assertIn('TOKEN_AUTH_SHARED_CACHE',
+                              server.shared_cache_error(2))
+
+    def test_reexec_as_module(self):
+        """test USR2 starts the new master with -m app.server"""
+        arbiter = SimpleNamespace(START_CTX={'args': [
+            sys.executable, '/srv/app/app/server.py']})
+
+        with patch.object(sys, 'argv', ['/srv/app/app/server.py']):
+            server.on_starting(arbiter)
+
+        self.assertEqual(arbiter.START_CTX['args'],
+                         [sys.executable, '-m', 'app.server'])
@@ -0,0 +1,28 @@
+import os
+
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.profiling import load_records, report
+from users.authentication import CachedTokenAuthentication
+
+
+class ProfilingReportView(APIView):
+    """per endpoint latency and query report, for staff only"""
+    authentication_classes = (CachedTokenAuthentication,
+                              SessionAuthentication)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        records = load_records()
+        try:
+            top = int(request.query_params.get('top', 5))
+        except ValueError:
+            top = 5
+        return Response({
+            'pid': os.getpid(),
+            'records': len(records),
+            'endpoints': report(records, top=top),
+        })
@@ -0,0 +1,269 @@
+"""async (ASGI) read paths of the recipe api
+
+DRF views are synchronous, under ASGI each request to them holds a
+thread for its whole duration. These plain django views serve the list
+and retrieve endpoints natively: authentication, pagination and
+rendering run on the event loop and only the queries hop to the ORM's
+database thread. The output matches the DRF endpoints, including the
+response cache and its ETags, except that the cursors only page forward
+(``previous`` is always null). Query params of the DRF endpoints these
+views don't implement, e.g. ``search``, are rejected with a 400.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from rest_framework import exceptions
+
+from core import metrics
+from core.models import Tag, Ingredient, Recipe
+from core.renderers import dumps, json_response
+from recipe import serializers
+from recipe.cache import (_cache, cache_enabled, etag_matches,
+                          list_cache_key)
+from recipe.fastlist import RELATIONS, arelated_ids, render_rows
+from recipe.filters import filter_assigned, filter_recipes_by
+from recipe.pagination import BaseCursorPagination
+from users.authentication import CachedTokenAuthentication
+
+
+def _encode_cursor(position):
+    return base64.urlsafe_b64encode(dumps(position)).decode()
+
+
+def _decode_cursor(request):
+    value = request.GET.get('cursor')
+    if value is None:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(value.encode()))
+    except (binascii.Error, ValueError):
+        raise exceptions.NotFound('Invalid cursor')
+
+
+def _page_size(request):
+    """page_size query param clamped like BaseCursorPagination"""
+    paginator = BaseCursorPagination
+    try:
+        size = int(request.GET[paginator.page_size_query_param])
+    except (KeyError, ValueError):
+        return paginator.page_size
+    if size <= 0:
+        return paginator.page_size
+    return min(size, paginator.max_page_size)
+
+
+def _converters(serializer_class, names):
+    fields = serializer_class().fields
+    return {name: fields[name].to_representation for name in names}
+
+
+class AsyncAPIView(View):
+    """token authenticated async view rendering json"""
+    authentication = CachedTokenAuthentication()
+    # query params of the DRF endpoint the view doesn't implement
+    unsupported_params = ()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            credentials = await self.authentication.authenticate_async(
+                request)
+            if credentials is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = credentials
+            self.check_params(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404:
+            return self.handle_exception(exceptions.NotFound())
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    def check_params(self, request):
+        """refuse what the DRF endpoint would do but this view can't"""
+        unsupported = [name for name in self.unsupported_params
+                       if name in request.GET]
+        if unsupported:
+            raise exceptions.ValidationError({
+                name: ['Not supported by the async endpoint, use the '
+                       'DRF endpoint instead.'] for name in unsupported})
+
+    def handle_exception(self, exc):
+        response = json_response(
+            exc.detail if isinstance(exc.detail, (list, dict))
+            else {'detail': exc.detail}, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated,
+                            exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = \
+                self.authentication.authenticate_header(None)
+        return response
+
+    async def paginate(self, request, queryset, ordering, position_of):
+        """(rows, next url) of the page after the cursor
+
+        ``ordering`` is descending and ends with the unique id,
+        ``position_of`` is the cursor of a row.
+        """
+        position = _decode_cursor(request)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.after(position))
+            except (TypeError, ValueError):
+                raise exceptions.NotFound('Invalid cursor')
+        size = _page_size(request)
+        rows = [row async for row in queryset.order_by(*ordering)[:size + 1]]
+        if len(rows) <= size:
+            return rows, None
+        rows = rows[:size]
+        params = request.GET.copy()
+        params['cursor'] = _encode_cursor(position_of(rows[-1]))
+        url = request.build_absolute_uri(request.path)
+        return rows, f'{url}?{params.urlencode()}'
+
+    def after(self, position):
+        """filter of the rows following a cursor position
+
+        Views that paginate override it, by default every row follows.
+        """
+        return Q()
+
+    async def cached_list(self, request, list_data):
+        """json response of ``await list_data()`` through the response
+        cache, see recipe.cache.CachedListMixin"""
+        if not cache_enabled():
+            return json_response(await list_data())
+        key = await sync_to_async(list_cache_key)(request, request.GET)
+        digest = hashlib.md5(key.encode()).hexdigest()
+        etag = f'"{digest}"'
+
+        if etag_matches(request, etag):
+            result = 'not_modified'
+            response = HttpResponseNotModified()
+        else:
+            cache = _cache()
+            data = await cache.aget(f'recipe:list:{digest}')
+            result = 'miss' if data is None else 'hit'
+            if data is None:
+                data = await list_data()
+                await cache.aset(f'recipe:list:{digest}', data,
+                                 settings.RECIPE_RESPONSE_CACHE['TIMEOUT'])
+            response = json_response(data)
+
+        metrics.inc('recipe_response_cache_requests_total',
+                    endpoint=request.resolver_match.view_name, result=result)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class RecipeAttrListView(AsyncAPIView):
+    """async list of the user's tags or ingredients"""
+    model = None
+    serializer_class = None
+    unsupported_params = ('q',)
+
+    def after(self, position):
+        name, pk = position
+        return Q(name__lt=name) | Q(name=name, id__lt=int(pk))
+
+    async def get(self, request):
+        return await self.cached_list(request, lambda: self.list(request))
+
+    async def list(self, request):
+        queryset = self.model.objects.filter(user=request.user)
+        if request.GET.get('assigned_only'):
+            queryset = filter_assigned(queryset)
+
+        names = self.serializer_class.Meta.fields
+        rows, next_url = await self.paginate(
+            request, queryset.values(*names), ('-name', '-id'),
+            lambda row: [row['name'], row['id']])
+        data = render_rows(rows, names,
+                           _converters(self.serializer_class, names), {})
+        return {'next': next_url, 'previous': None, 'results': data}
+
+
+class TagListView(RecipeAttrListView):
+    model = Tag
+    serializer_class = serializers.TagSerializer
+
+
+class IngredientListView(RecipeAttrListView):
+    model = Ingredient
+    serializer_class = serializers.IngredientSerializer
+
+
+class RecipeListView(AsyncAPIView):
+    """async list of the user's recipes, see RecipeVeiwSet"""
+    serializer_class = serializers.RecipeSerializer
+    unsupported_params = ('fields', 'expand', 'search')
+
+    def _params_to_ints(self, qs):
+        try:
+            return [int(str_id) for str_id in qs.split(',')]
+        except ValueError:
+            raise exceptions.ValidationError(
+                {'detail': 'Expected a comma separated list of ids.'})
+
+    def after(self, position):
+        return Q(id__lt=int(position))
+
+    async def get(self, request):
+        return await self.cached_list(request, lambda: self.list(request))
+
+    async def list(self, request):
+        queryset = Recipe.objects.filter(user=request.user)
+        match_all = request.GET.get('match') == 'all'
+        for param, model in (('tags', Tag), ('ingredients', Ingredient)):
+            if request.GET.get(param):
+                queryset = filter_recipes_by(
+                    queryset, model,
+                    self._params_to_ints(request.GET[param]), match_all)
+
+        names = self.serializer_class.Meta.fields
+        columns = [name for name in names if name not in RELATIONS]
+        rows, next_url = await self.paginate(
+            request, queryset.values(*columns), ('-id',),
+            lambda row: row['id'])
+        ids = [row['id'] for row in rows]
+        related = {relation: await arelated_ids(relation, ids)
+                   for relation in RELATIONS}
+        data = render_rows(rows, names,
+                           _converters(self.serializer_class, columns),
+                           related)
+        return {'next': next_url, 'previous': None, 'results': data}
+
+
+class RecipeDetailView(AsyncAPIView):
+    """async retrieve of one of the user's recipes"""
+    serializer_class = serializers.RecipeDetailSerielizer
+
+    async def get(self, request, pk):
+        names = self.serializer_class.Meta.fields
+        columns = [name for name in names if name not in RELATIONS]
+        try:
+            row = await Recipe.objects.filter(user=request.user) \
+                                      .values(*columns).aget(pk=pk)
+        except Recipe.DoesNotExist:
+            raise Http404
+
+        related = {}
+        for relation, serializer_class in \
+                self.serializer_class.expandable.items():
+            fields = serializer_class.Meta.fields
+            queryset = Recipe._meta.get_field(relation).related_model.objects
+            rows = [item async for item in queryset.filter(recipe=pk)
+                    .order_by('id').values(*fields)]
+            related[relation] = {pk: render_rows(
+                rows, fields, _converters(serializer_class, fields), {})}
+
+        data = render_rows([row], names,
+                           _converters(self.serializer_class, columns),
+                           related)
+        return json_response(data[0])
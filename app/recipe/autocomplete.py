@@ -0,0 +1,89 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Upper
+from django.utils.cache import patch_vary_headers
+from rest_framework.response import Response
+
+from core import metrics
+from recipe.cache import _cache, cache_enabled, get_user_version
+
+metrics.counter('recipe_autocomplete_cache_requests_total',
+                'Autocomplete lookups by result (hit, miss).')
+
+
+def match_names(queryset, query, limit):
+    """best matches for what the user typed so far
+
+    Rows are {'id', 'name', 'recipe_count'} dicts, prefix matches come
+    first. On PostgreSQL names within trigram distance of the query
+    follow so typos still find something, both lookups are served by
+    the GIN trigram index on UPPER(name).
+    """
+    if connection.vendor != 'postgresql':
+        return list(queryset.filter(name__istartswith=query)
+                    .order_by('name', 'id')
+                    .values('id', 'name', 'recipe_count')[:limit])
+
+    query = query.upper()
+    return list(
+        queryset.alias(upper_name=Upper('name'))
+        .filter(Q(upper_name__startswith=query) |
+                Q(upper_name__trigram_similar=query))
+        .annotate(
+            prefix=Case(When(upper_name__startswith=query, then=Value(0)),
+                        default=Value(1), output_field=IntegerField()),
+            similarity=TrigramSimilarity(Upper('name'), query),
+        )
+        .order_by('prefix', '-similarity', 'name', 'id')
+        .values('id', 'name', 'recipe_count')[:limit])
+
+
+class AutocompleteMixin:
+    """``?q=`` on the list endpoint returns the top matching names
+
+    Names are matched in get_queryset(), so ``assigned_only`` filters
+    them as it does the list. Results are cached per user for a few
+    seconds under the user's response cache version, so repeated
+    keystrokes for hot prefixes don't reach the database and writes
+    still show up immediately.
+    """
+
+    def _autocomplete_limit(self, request):
+        options = settings.RECIPE_AUTOCOMPLETE
+        try:
+            limit = int(request.query_params.get('limit', options['LIMIT']))
+        except ValueError:
+            limit = options['LIMIT']
+        return max(1, min(limit, options['MAX_LIMIT']))
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return super().list(request, *args, **kwargs)
+
+        limit = self._autocomplete_limit(request)
+        user_id = request.user.pk
+        assigned_only = bool(request.query_params.get('assigned_only'))
+        key = (f'{self.queryset.model._meta.model_name}:{user_id}:'
+               f'{get_user_version(user_id)}:{limit}:{assigned_only:d}:'
+               f'{query.lower()}')
+        key = f'recipe:autocomplete:{hashlib.md5(key.encode()).hexdigest()}'
+
+        cache = _cache() if cache_enabled() else None
+        results = cache.get(key) if cache else None
+        metrics.inc('recipe_autocomplete_cache_requests_total',
+                    result='miss' if results is None else 'hit')
+        if results is None:
+            results = match_names(self.get_queryset(), query, limit)
+            if cache:
+                cache.set(key, results,
+                          settings.RECIPE_AUTOCOMPLETE['CACHE_TIMEOUT'])
+
+        response = Response({'next': None, 'previous': None,
+                             'results': results})
+        patch_vary_headers(response, ('Authorization',))
+        return response
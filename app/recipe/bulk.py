@@ -0,0 +1,91 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+class BulkMixin:
+    """bulk endpoint writing a whole list of objects in one request
+
+    POST creates every item, PATCH partially updates items identified by
+    their ``id``. A batch holds at most ``RECIPE_BULK_MAX_BATCH`` items
+    and is atomic: when any item is invalid nothing is written and the
+    response lists the errors of each item in request order.
+    """
+
+    def _bulk_error(self, detail):
+        return Response({'detail': detail},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    def get_bulk_queryset(self):
+        """the user's objects, whatever filters the request carries"""
+        return self.queryset.filter(user=self.request.user)
+
+    @staticmethod
+    def _bulk_pk(field, value):
+        try:
+            return field.to_internal_value(value)
+        except ValidationError:
+            return None
+
+    def _bulk_instances(self, items):
+        """user's objects for a bulk update, in request order"""
+        values = [item.get('id') if isinstance(item, dict) else None
+                  for item in items]
+        field = self.get_serializer().fields['id']
+        ids = [self._bulk_pk(field, value) for value in values]
+        found = self.get_bulk_queryset().filter(
+            pk__in=[pk for pk in ids if pk is not None]).in_bulk()
+        instances, errors = [], []
+        for pk, value in zip(ids, values):
+            if pk not in found:
+                errors.append({'id': [f'Invalid pk "{value}" - object does '
+                                      'not exist.']})
+            elif ids.count(pk) > 1:
+                errors.append({'id': [f'Duplicate pk "{pk}".']})
+            else:
+                errors.append({})
+            instances.append(found.get(pk))
+        return instances, errors
+
+    def perform_bulk_save(self, serializer, **kwargs):
+        """save a validated batch, bulk writes send no model signals"""
+        objs = serializer.save(**kwargs)
+        self.invalidate_cache()
+        return objs
+
+    @action(methods=['POST', 'PATCH'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """create or update a list of objects"""
+        items = request.data
+        if not isinstance(items, list):
+            return self._bulk_error('Expected a list of items.')
+        if len(items) > settings.RECIPE_BULK_MAX_BATCH:
+            return self._bulk_error(
+                f'Ensure a batch has no more than '
+                f'{settings.RECIPE_BULK_MAX_BATCH} items.')
+
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=items, many=True)
+            save_kwargs = {'user': request.user}
+            success = status.HTTP_201_CREATED
+        else:
+            instances, errors = self._bulk_instances(items)
+            if any(errors):
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+            serializer = self.get_serializer(
+                instances, data=items, many=True, partial=True)
+            save_kwargs = {}
+            success = status.HTTP_200_OK
+
+        if not serializer.is_valid():
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+        objs = self.perform_bulk_save(serializer, **save_kwargs)
+
+        saved = self.get_bulk_queryset().filter(
+            pk__in=[obj.pk for obj in objs]).in_bulk()
+        data = self.get_serializer(
+            [saved[obj.pk] for obj in objs], many=True).data
+        return Response(data, status=success)
@@ -0,0 +1,188 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from core import metrics
+
+
+# query params holding comma separated ids, normalized to sorted ints
+ID_LIST_PARAMS = ('tags', 'ingredients')
+# query params holding comma separated names, normalized to sorted names
+NAME_LIST_PARAMS = ('fields', 'expand')
+
+metrics.counter('recipe_response_cache_requests_total',
+                'Cached list lookups by endpoint and result (hit, miss, '
+                'not_modified).')
+
+
+def _cache():
+    return caches[settings.RECIPE_RESPONSE_CACHE['ALIAS']]
+
+
+def cache_enabled():
+    """whether the cache alias is shared by every server process
+
+    A version bumped in one process' local memory cache leaves the
+    other processes serving stale lists, so such a cache is only used
+    when ALLOW_LOCAL declares the server single process.
+    """
+    return (settings.RECIPE_RESPONSE_CACHE.get('ALLOW_LOCAL', False) or
+            not isinstance(_cache(), LocMemCache))
+
+
+def _version_key(user_id):
+    return f'recipe:version:{user_id}'
+
+
+def get_user_version(user_id):
+    """return the cache namespace version of a user"""
+    cache = _cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_id):
+    try:
+        _cache().incr(_version_key(user_id))
+    except ValueError:
+        reset_user_version(user_id)
+
+
+class _PendingBumps:
+    """users of a transaction whose versions to bump again on commit"""
+
+    def __init__(self):
+        self.user_ids = set()
+
+    def __call__(self):
+        for user_id in self.user_ids:
+            _bump(user_id)
+
+
+def _pending_bumps():
+    """the bumps scheduled in the current transaction, or None"""
+    pending = getattr(connection, '_pending_cache_bumps', None)
+    # gone once run, or when the savepoint that scheduled it rolled back
+    if pending is not None and any(
+            entry[1] is pending for entry in connection.run_on_commit):
+        return pending
+    return None
+
+
+def bump_user_version(user_id):
+    """invalidate every cached response of a user
+
+    Inside a transaction the version is bumped again once it commits,
+    lists cached in between were read from the rows before the commit.
+    """
+    if not cache_enabled():
+        return
+    _bump(user_id)
+    if not connection.in_atomic_block:
+        return
+    pending = _pending_bumps()
+    if pending is None:
+        pending = connection._pending_cache_bumps = _PendingBumps()
+        transaction.on_commit(pending)
+    pending.user_ids.add(user_id)
+
+
+def reset_user_version(user_id):
+    """start a fresh namespace, e.g. for a new user reusing an id"""
+    _cache().set(_version_key(user_id), time.time_ns(), None)
+
+
+def normalize_params(query_params):
+    """stable representation of the query params of a list request"""
+    items = []
+    for name in sorted(query_params):
+        value = query_params.get(name)
+        if name in ID_LIST_PARAMS:
+            try:
+                ids = sorted({int(v) for v in value.split(',')})
+                value = ','.join(map(str, ids))
+            except ValueError:
+                pass
+        elif name in NAME_LIST_PARAMS:
+            value = ','.join(sorted({v.strip() for v in value.split(',')}))
+        items.append(f'{name}={value}')
+    return '&'.join(items)
+
+
+def list_cache_key(request, query_params):
+    """key of a list response, bumping the user version invalidates it"""
+    user_id = request.user.pk
+    version = get_user_version(user_id)
+    return (f'recipe:list:{user_id}:{version}:{request.get_host()}:'
+            f'{request.path}?{normalize_params(query_params)}')
+
+
+def etag_matches(request, etag):
+    """whether the If-None-Match header of the request names etag"""
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    # If-None-Match compares weakly
+    return '*' in etags or etag in {
+        tag.removeprefix('W/') for tag in etags}
+
+
+class CachedListMixin:
+    """cache list responses per user, endpoint and query params
+
+    Entries are keyed by a per-user version which writes bump, so no
+    key scanning is needed to invalidate. The ETag is derived from the
+    key, clients sending it back in If-None-Match get a bodyless 304.
+    """
+
+    def _list_cache_key(self, request):
+        return list_cache_key(request, request.query_params)
+
+    def invalidate_cache(self):
+        bump_user_version(self.request.user.pk)
+
+    def list(self, request, *args, **kwargs):
+        if not cache_enabled():
+            return super().list(request, *args, **kwargs)
+        key = self._list_cache_key(request)
+        digest = hashlib.md5(key.encode()).hexdigest()
+        etag = f'"{digest}"'
+
+        if etag_matches(request, etag):
+            result = 'not_modified'
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = _cache()
+            data = cache.get(f'recipe:list:{digest}')
+            result = 'miss' if data is None else 'hit'
+            if data is None:
+                response = super().list(request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    cache.set(f'recipe:list:{digest}', response.data,
+                              settings.RECIPE_RESPONSE_CACHE['TIMEOUT'])
+            else:
+                response = Response(data)
+
+        metrics.inc('recipe_response_cache_requests_total',
+                    endpoint=request.resolver_match.view_name, result=result)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.invalidate_cache()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        self.invalidate_cache()
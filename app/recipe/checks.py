@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core import checks
+
+from recipe.cache import cache_enabled
+
+
+@checks.register(checks.Tags.caches)
+def check_response_cache(app_configs, **kwargs):
+    """warn that the response cache is off with a per process cache"""
+    if cache_enabled():
+        return []
+    return [checks.Warning(
+        'The recipe response cache is disabled, the '
+        f"'{settings.RECIPE_RESPONSE_CACHE['ALIAS']}' cache is local to "
+        'each server process.',
+        hint='Set REDIS_URL to share a cache between the processes, or '
+             'RECIPE_RESPONSE_CACHE_ALLOW_LOCAL=1 for a single process '
+             'server.',
+        id='recipe.W001',
+    )]
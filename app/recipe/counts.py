@@ -0,0 +1,38 @@
+from collections import defaultdict
+
+from django.db.models import (Case, Count, F, OuterRef, Subquery, Value,
+                              When)
+from django.db.models.functions import Coalesce, Greatest
+
+from recipe.filters import RECIPE_RELATIONS
+
+
+def actual_recipe_count(model):
+    """subquery counting the recipes linked to the outer tag/ingredient"""
+    through, column = RECIPE_RELATIONS[model]
+    counts = through.objects.filter(**{column: OuterRef('pk')}) \
+                            .order_by().values(column) \
+                            .annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+def update_recipe_counts(model, deltas):
+    """add deltas, {id: recipes linked - recipes unlinked}, to
+    recipe_count of the given tags or ingredients
+
+    The rows are updated in place with F() from the links a change
+    added or removed, never recounted, so the cost doesn't grow with
+    the popularity of a tag. Writes that bypass these updates (raw SQL,
+    racing removals of the same link) are repaired by the
+    reconcile_recipe_counts command.
+    """
+    by_delta = defaultdict(list)
+    for pk, delta in (deltas or {}).items():
+        if delta:
+            by_delta[delta].append(pk)
+    if by_delta:
+        delta = Case(*[When(pk__in=ids, then=Value(delta))
+                       for delta, ids in by_delta.items()])
+        model.objects.filter(pk__in=[pk for ids in by_delta.values()
+                                     for pk in ids]) \
+            .update(recipe_count=Greatest(F('recipe_count') + delta, 0))
@@ -0,0 +1,74 @@
+import csv
+from collections import defaultdict
+from itertools import islice
+
+from core.models import Recipe
+from core.renderers import dumps
+
+EXPORT_FIELDS = ('id', 'title', 'time_minute', 'price', 'link')
+CSV_HEADER = EXPORT_FIELDS + ('tags', 'ingredients')
+
+
+def _related_names(relation, recipe_ids, using):
+    """{recipe id: [{'id', 'name'}]} for one chunk of recipes"""
+    field = Recipe._meta.get_field(relation)
+    column = field.m2m_reverse_field_name()
+    related = defaultdict(list)
+    rows = field.remote_field.through.objects.using(using).filter(
+        recipe_id__in=recipe_ids
+    ).order_by(f'{column}_id').values_list(
+        'recipe_id', f'{column}_id', f'{column}__name')
+    for recipe_id, pk, name in rows:
+        related[recipe_id].append({'id': pk, 'name': name})
+    return related
+
+
+def iter_recipes(queryset, chunk_size):
+    """yield recipe dicts with their tags and ingredients
+
+    Rows come from a server side cursor and the m2m names are fetched
+    once per chunk, so memory stays flat whatever the catalogue size.
+    Every query goes to the database of the queryset.
+    """
+    rows = queryset.order_by('id').values(*EXPORT_FIELDS) \
+                   .iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        ids = [row['id'] for row in chunk]
+        tags = _related_names('tags', ids, queryset.db)
+        ingredients = _related_names('ingredients', ids, queryset.db)
+        for row in chunk:
+            row['price'] = str(row['price'])
+            row['tags'] = tags.get(row['id'], [])
+            row['ingredients'] = ingredients.get(row['id'], [])
+            yield row
+
+
+def ndjson_lines(recipes):
+    for recipe in recipes:
+        yield dumps(recipe) + b'\n'
+
+
+class _Echo:
+    """file-like object handing back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(recipes):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for recipe in recipes:
+        yield writer.writerow(
+            [recipe[field] for field in EXPORT_FIELDS] +
+            ['|'.join(t['name'] for t in recipe['tags']),
+             '|'.join(i['name'] for i in recipe['ingredients'])])
+
+
+EXPORT_TYPES = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson', 'ndjson'),
+    'csv': (csv_lines, 'text/csv', 'csv'),
+}
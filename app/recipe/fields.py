@@ -0,0 +1,70 @@
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
+
+
+class BatchManyRelatedField(ManyRelatedField):
+    """resolve a whole list of pks with one ``id__in`` query
+
+    Every unknown pk is reported in a single error. Resolved objects are
+    kept, so a list serializer can preload the pks of all its items.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._resolved = {}
+
+    def to_pk(self, value):
+        if isinstance(value, bool):
+            self.child_relation.fail('incorrect_type',
+                                     data_type=type(value).__name__)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            self.child_relation.fail('incorrect_type',
+                                     data_type=type(value).__name__)
+
+    def preload(self, pks):
+        """fetch the objects of pks not resolved yet"""
+        pks = set(pks) - set(self._resolved)
+        if pks:
+            self._resolved.update(
+                self.child_relation.get_queryset().in_bulk(pks))
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        pks = list(dict.fromkeys(self.to_pk(value) for value in data))
+        self.preload(pks)
+        missing = [pk for pk in pks if pk not in self._resolved]
+        if missing:
+            message = self.child_relation.error_messages['does_not_exist']
+            raise serializers.ValidationError(
+                [message.format(pk_value=pk) for pk in missing],
+                code='does_not_exist')
+        return [self._resolved[pk] for pk in pks]
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """pk related field limited to objects of the requesting user
+
+    With ``many=True`` the pks are validated in one query, see
+    BatchManyRelatedField.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None:
+            return queryset.none()
+        return queryset.filter(user=request.user)
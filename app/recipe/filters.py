@@ -0,0 +1,35 @@
+from django.db.models import Exists, OuterRef
+
+from core.models import Tag, Ingredient, Recipe
+
+
+# recipe m2m through model and the column pointing at the attribute
+RECIPE_RELATIONS = {
+    Tag: (Recipe.tags.through, 'tag_id'),
+    Ingredient: (Recipe.ingredients.through, 'ingredient_id'),
+}
+
+
+def filter_recipes_by(queryset, model, ids, match_all=False):
+    """keep recipes linked to any (or every) of the given attribute ids
+
+    Uses semi-joins instead of joining the m2m table, so a recipe
+    matching several ids is still returned once.
+    """
+    through, column = RECIPE_RELATIONS[model]
+    links = through.objects.filter(recipe_id=OuterRef('pk'))
+
+    if match_all:
+        for pk in set(ids):
+            queryset = queryset.filter(Exists(links.filter(**{column: pk})))
+        return queryset
+
+    return queryset.filter(Exists(links.filter(**{f'{column}__in': ids})))
+
+
+def filter_assigned(queryset):
+    """keep tags or ingredients used by at least one recipe
+
+    Reads the maintained recipe_count, served by a partial index.
+    """
+    return queryset.filter(recipe_count__gt=0)
@@ -0,0 +1,147 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+
+from core.db.routers import pin_primary
+from core.models import Recipe
+from recipe.cache import bump_user_version
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def thumbnail_name(name, size):
+    """storage name of a thumbnail, next to the original image"""
+    root, _ = os.path.splitext(name)
+    return f'{root}_{size}.jpg'
+
+
+def thumbnail_names(name):
+    return {size: thumbnail_name(name, size)
+            for size in settings.RECIPE_IMAGE_PROCESSING['THUMBNAIL_SIZES']}
+
+
+def delete_thumbnails(storage, name):
+    for thumb in thumbnail_names(name).values():
+        storage.delete(thumb)
+
+
+def _encode(img, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        img.save(buffer, format=fmt, optimize=True, progressive=True,
+                 quality=settings.RECIPE_IMAGE_PROCESSING['JPEG_QUALITY'])
+    else:
+        img.save(buffer, format=fmt, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def _replace(storage, name, content):
+    """write a thumbnail under exactly this storage name
+
+    Thumbnails belong to a freshly saved image, a file already under
+    the name is a leftover nothing refers to.
+    """
+    storage.delete(name)
+    storage.save(name, content)
+
+
+def _write_processed(storage, name, img, fmt):
+    """save the image next to the original and build its thumbnails,
+    returns the name of the new image"""
+    new_name = storage.save(name, _encode(img, fmt))
+    try:
+        for size, thumb_name in thumbnail_names(new_name).items():
+            thumb = img.convert('RGB')
+            thumb.thumbnail((size, size))
+            _replace(storage, thumb_name, _encode(thumb, 'JPEG'))
+    except BaseException:
+        _delete_image(storage, new_name)
+        raise
+    return new_name
+
+
+def _delete_image(storage, name):
+    storage.delete(name)
+    delete_thumbnails(storage, name)
+
+
+def process_recipe_image(recipe_id):
+    """normalize the orientation of a recipe image and build thumbnails
+
+    The processed image is saved under a new name before the original
+    is deleted, so the recipe always points to a complete file. It ends
+    up ready or failed whatever goes wrong, rows left processing by a
+    dead worker are handled by the reap_image_processing command.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    storage, name = recipe.image.storage, recipe.image.name
+
+    new_name = None
+    image_status = Recipe.IMAGE_FAILED
+    try:
+        with storage.open(name) as fh:
+            img = Image.open(fh)
+            img.load()
+        fmt = img.format
+        img = ImageOps.exif_transpose(img)
+        if fmt == 'JPEG' and img.mode != 'RGB':
+            img = img.convert('RGB')
+        new_name = _write_processed(storage, name, img, fmt)
+        image_status = Recipe.IMAGE_READY
+    except (OSError, Image.DecompressionBombError):
+        logger.exception('processing image of recipe %s failed', recipe_id)
+    finally:
+        # a newer upload may have replaced the image meanwhile
+        updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image=new_name or name, image_status=image_status)
+        if new_name:
+            _delete_image(storage, name if updated else new_name)
+        if updated:
+            bump_user_version(recipe.user_id)
+
+
+def _run_in_worker(recipe_id):
+    # the recipe was just committed, replicas may lag behind
+    pin_primary()
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('processing image of recipe %s failed', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_PROCESSING['WORKERS'],
+                thread_name_prefix='recipe-image')
+        return _executor
+
+
+def schedule_image_processing(recipe_id):
+    """process the image in the worker pool once the upload is committed
+
+    With ``WORKERS`` set to 0 the image is processed inline instead.
+    """
+    def enqueue():
+        if settings.RECIPE_IMAGE_PROCESSING['WORKERS'] > 0:
+            _get_executor().submit(_run_in_worker, recipe_id)
+        else:
+            process_recipe_image(recipe_id)
+
+    transaction.on_commit(enqueue)
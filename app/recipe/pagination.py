@@ -0,0 +1,54 @@
+from rest_framework.pagination import (CursorPagination,
+                                       LimitOffsetPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class BaseCursorPagination(CursorPagination):
+    """keyset pagination, deep pages cost the same as the first one"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class RecipeAttrCursorPagination(BaseCursorPagination):
+    """paginate tags and ingredients over the (user, name) ordering"""
+    ordering = '-name'
+
+
+class RecipeCursorPagination(BaseCursorPagination):
+    """paginate recipes over the (user, id) ordering"""
+    ordering = '-id'
+
+
+class SearchPagination(LimitOffsetPagination):
+    """paginate search results over their rank
+
+    Ranks aren't unique, so pages are offsets into the ranked results,
+    deeper ones cost more. One row past the page tells whether there is
+    a next one, the matches aren't counted.
+    """
+    default_limit = BaseCursorPagination.page_size
+    limit_query_param = BaseCursorPagination.page_size_query_param
+    max_limit = BaseCursorPagination.max_page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param,
+                                   self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(),
+                         'previous': self.get_previous_link(),
+                         'results': data})
@@ -0,0 +1,178 @@
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, When
+
+from core.models import Tag, Recipe
+
+SEARCH_CONFIG = 'english'
+
+# same relative weights PostgreSQL gives to the A, B and C labels
+TITLE_WEIGHT = 1.0
+TAG_WEIGHT = 0.4
+INGREDIENT_WEIGHT = 0.2
+
+UPDATE_VECTORS_SQL = f'''
+UPDATE core_recipe r SET search_vector =
+    setweight(to_tsvector('{SEARCH_CONFIG}', r.title), 'A') ||
+    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+        SELECT string_agg(t.name, ' ') FROM core_tag t
+        JOIN core_recipe_tags rt ON rt.tag_id = t.id
+        WHERE rt.recipe_id = r.id), '')), 'B') ||
+    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+        SELECT string_agg(i.name, ' ') FROM core_ingredient i
+        JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+        WHERE ri.recipe_id = r.id), '')), 'C')
+WHERE r.id = ANY(%s)
+'''
+
+
+def use_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+class InvertedIndex:
+    """term -> {recipe id: score} postings of one user's recipes
+
+    Pure python stand-in for the tsvector column on other databases.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(lambda: defaultdict(float))
+
+    def add(self, recipe_id, text, weight):
+        for term in tokenize(text):
+            self.postings[term][recipe_id] += weight
+
+    def search(self, query, limit=None, allowed=None):
+        """ids of recipes matching every query term, best first
+
+        Only ids in ``allowed`` are ranked when given, so that a limited
+        result isn't emptied by filters applied afterwards.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scores = None
+        for term in terms:
+            postings = self.postings.get(term, {})
+            if scores is None:
+                scores = {pk: score for pk, score in postings.items()
+                          if allowed is None or pk in allowed}
+            else:
+                scores = {pk: score + postings[pk]
+                          for pk, score in scores.items() if pk in postings}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [pk for pk, _ in ranked[:limit]]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _build_index(user_id):
+    index = InvertedIndex()
+    for pk, title in Recipe.objects.filter(user_id=user_id) \
+                                   .values_list('id', 'title'):
+        index.add(pk, title, TITLE_WEIGHT)
+    for relation, weight in (('tags', TAG_WEIGHT),
+                             ('ingredients', INGREDIENT_WEIGHT)):
+        field = Recipe._meta.get_field(relation)
+        name = f'{field.m2m_reverse_field_name()}__name'
+        for pk, text in field.remote_field.through.objects.filter(
+                recipe__user_id=user_id).values_list('recipe_id', name):
+            index.add(pk, text, weight)
+    return index
+
+
+def _user_index(user_id):
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    if index is None:
+        index = _build_index(user_id)
+        with _indexes_lock:
+            _indexes[user_id] = index
+    return index
+
+
+def invalidate_user_index(user_id):
+    """drop the python index of a user, rebuilt on the next search"""
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
+
+
+class _PendingVectors:
+    """recipes of a transaction to update in one statement on commit"""
+
+    def __init__(self):
+        self.ids = set()
+
+    def __call__(self):
+        with connection.cursor() as cursor:
+            cursor.execute(UPDATE_VECTORS_SQL, [sorted(self.ids)])
+
+
+def _pending_vectors():
+    """the batch scheduled in the current transaction, or None"""
+    pending = getattr(connection, '_pending_search_vectors', None)
+    # gone once run, or when the savepoint that scheduled it rolled back
+    if pending is not None and any(
+            entry[1] is pending for entry in connection.run_on_commit):
+        return pending
+    return None
+
+
+def update_search_vectors(user_id, recipe_ids):
+    """refresh the search data of recipes after their text changed
+
+    On PostgreSQL every recipe changed in a transaction is updated once,
+    by a single UPDATE when it commits.
+    """
+    if not use_postgres():
+        invalidate_user_index(user_id)
+    elif recipe_ids:
+        pending = _pending_vectors()
+        if pending is not None:
+            pending.ids.update(recipe_ids)
+            return
+        pending = connection._pending_search_vectors = _PendingVectors()
+        pending.ids.update(recipe_ids)
+        # runs at once outside of a transaction
+        transaction.on_commit(pending)
+
+
+def update_related_search_vectors(model, user_id, related_ids):
+    """refresh the recipes linked to renamed or deleted tags/ingredients"""
+    if not use_postgres():
+        invalidate_user_index(user_id)
+        return
+    relation = 'tags' if model is Tag else 'ingredients'
+    recipe_ids = Recipe.objects.filter(**{f'{relation}__in': related_ids}) \
+                               .values_list('id', flat=True).distinct()
+    update_search_vectors(user_id, list(recipe_ids))
+
+
+def search_recipes(queryset, user_id, query):
+    """the recipes of the queryset matching the query, best first"""
+    if use_postgres():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG,
+                                   search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-id')
+
+    allowed = set(queryset.values_list('pk', flat=True))
+    ids = _user_index(user_id).search(query, allowed=allowed)
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    ))
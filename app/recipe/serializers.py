@@ -1,27 +1,151 @@
+from collections import Counter
+
+from django.db import transaction
 from rest_framework import serializers
 from core.models import Tag, Ingredient, Recipe
+from recipe.counts import update_recipe_counts
+from recipe.fields import BatchManyRelatedField, UserPrimaryKeyRelatedField
+from recipe.images import thumbnail_names
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """write a list of objects with bulk queries
+
+    Many to many links go to their through tables with one bulk insert
+    per relation instead of a .set() per object.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self._preload_related(data)
+        return super().to_internal_value(data)
+
+    def _preload_related(self, data):
+        """resolve the related pks of every item with one query per
+        relation, the items are then validated without queries"""
+        for name, field in self.child.fields.items():
+            if field.read_only or not isinstance(field, BatchManyRelatedField):
+                continue
+            pks = []
+            for item in data:
+                values = item.get(name) if isinstance(item, dict) else None
+                if not isinstance(values, list):
+                    continue
+                for value in values:
+                    try:
+                        pks.append(field.to_pk(value))
+                    except serializers.ValidationError:
+                        pass
+            field.preload(pks)
+
+    def _split_links(self, validated_data):
+        """pop the many to many values out of each item"""
+        names = [f.name for f in self.child.Meta.model._meta.many_to_many]
+        links = [
+            {name: attrs.pop(name) for name in names if name in attrs}
+            for attrs in validated_data
+        ]
+        return names, links
+
+    def _write_links(self, objs, names, links, replace=False):
+        model = self.child.Meta.model
+        for name in names:
+            field = model._meta.get_field(name)
+            through = field.remote_field.through
+            source = f'{field.m2m_field_name()}_id'
+            target = f'{field.m2m_reverse_field_name()}_id'
+            changed = [(obj, item[name])
+                       for obj, item in zip(objs, links) if name in item]
+            if not changed:
+                continue
+            rows = [through(**{source: obj.pk, target: pk})
+                    for obj, values in changed
+                    for pk in {v.pk for v in values}]
+            deltas = Counter(getattr(row, target) for row in rows)
+            if replace:
+                old = through.objects.filter(**{
+                    f'{source}__in': [obj.pk for obj, _ in changed]
+                })
+                deltas.subtract(old.values_list(target, flat=True))
+                old.delete()
+            through.objects.bulk_create(rows)
+            # bulk writes send no m2m_changed signal
+            update_recipe_counts(field.related_model, deltas)
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        names, links = self._split_links(validated_data)
+        objs = [model(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            model.objects.bulk_create(objs)
+            self._write_links(objs, names, links)
+        return objs
+
+    def update(self, instances, validated_data):
+        model = self.child.Meta.model
+        names, links = self._split_links(validated_data)
+        fields = set()
+        for obj, attrs in zip(instances, validated_data):
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+                fields.add(attr)
+        with transaction.atomic():
+            if fields:
+                model.objects.bulk_update(instances, sorted(fields))
+            self._write_links(instances, names, links, replace=True)
+        return instances
 
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model=Tag
-        fields=('id', 'name')
+        fields=('id', 'name', 'recipe_count')
         read_only_fields = (id,)
+        list_serializer_class = BulkListSerializer
         
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'recipe_count')
         read_only_fields = (id,)
+        list_serializer_class = BulkListSerializer
+
+
+class SparseFieldsMixin:
+    """serialize only the ``fields`` of the context, nesting the
+    relations listed in its ``expand`` as full objects
+
+    Both come from the ``fields=`` and ``expand=`` query params, see
+    RecipeVeiwSet.get_serializer_context. Expanded relations are
+    always included.
+    """
+
+    expandable = {}
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get('expand') or ()
+        for name in expand:
+            self.fields[name] = self.expandable[name](many=True,
+                                                      read_only=True)
 
-class RecipeSerializer(serializers.ModelSerializer):
-    ingredients = serializers.PrimaryKeyRelatedField(
+        requested = self.context.get('fields')
+        if requested is not None:
+            for name in set(self.fields) - set(requested) - set(expand):
+                self.fields.pop(name)
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable = {
+        'ingredients': IngredientSerializer,
+        'tags': TagSerializer,
+    }
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
         queryset= Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserPrimaryKeyRelatedField(
         many=True,
         queryset= Tag.objects.all()
     )
@@ -29,6 +153,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'title', 'time_minute', 'price', 'link', 'ingredients', 'tags')
         read_only_fields = (id,)
+        list_serializer_class = BulkListSerializer
 
 
 class RecipeDetailSerielizer(RecipeSerializer):
@@ -38,8 +163,23 @@ class RecipeDetailSerielizer(RecipeSerializer):
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
+    thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_only_fields = ('id',)
+        fields = ('id', 'image', 'image_status', 'thumbnails')
+        read_only_fields = ('id', 'image_status')
+
+    def get_thumbnails(self, obj):
+        """thumbnail urls by size, once processing is done"""
+        if obj.image_status != Recipe.IMAGE_READY:
+            return {}
+        request = self.context.get('request')
+        storage = obj.image.storage
+        urls = {}
+        for size, name in thumbnail_names(obj.image.name).items():
+            url = storage.url(name)
+            urls[str(size)] = \
+                request.build_absolute_uri(url) if request else url
+        return urls
         
\ No newline at end of file
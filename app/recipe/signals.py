@@ -0,0 +1,133 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.cache import bump_user_version, reset_user_version
+from recipe.counts import update_recipe_counts
+from recipe.search import (invalidate_user_index, update_search_vectors,
+                           update_related_search_vectors)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_links(sender, instance, action, **kwargs):
+    """recipe tags or ingredients changed"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_user_version(instance.user_id)
+
+
+def _linked_recipe_ids(instance):
+    relation = 'tags' if isinstance(instance, Tag) else 'ingredients'
+    return list(Recipe.objects.filter(**{relation: instance})
+                .values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_linked_search_vectors(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    """tag and ingredient names are part of the recipe search data"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update_search_vectors(instance.user_id, [instance.pk])
+    elif action == 'pre_clear':
+        instance._search_recipe_ids = _linked_recipe_ids(instance)
+    elif action in ('post_add', 'post_remove'):
+        update_search_vectors(instance.user_id, pk_set)
+    elif action == 'post_clear':
+        update_search_vectors(instance.user_id,
+                              instance.__dict__.pop('_search_recipe_ids', []))
+
+
+def _linked_ids(recipe, model):
+    relation = 'tags' if model is Tag else 'ingredients'
+    return list(getattr(recipe, relation).values_list('pk', flat=True))
+
+
+def _linked_pks(sender, instance, reverse, model, pk_set):
+    """pks on the other side of the links of instance, within pk_set"""
+    related = type(instance) if reverse else model
+    columns = ['recipe_id', f'{related._meta.model_name}_id']
+    own, other = reversed(columns) if reverse else columns
+    links = sender.objects.filter(**{own: instance.pk})
+    if pk_set is not None:
+        links = links.filter(**{f'{other}__in': pk_set})
+    return list(links.values_list(other, flat=True))
+
+
+def _move_counts(instance, reverse, model, pks, delta):
+    if reverse:
+        update_recipe_counts(type(instance), {instance.pk: delta * len(pks)})
+    else:
+        update_recipe_counts(model, {pk: delta for pk in pks})
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_linked_recipe_counts(sender, instance, action, reverse, model,
+                                pk_set, **kwargs):
+    """count the links added or removed on the tags or ingredients"""
+    if action == 'post_add':
+        # only the links that didn't exist yet are in pk_set
+        _move_counts(instance, reverse, model, pk_set, 1)
+    elif action in ('pre_remove', 'pre_clear'):
+        # pk_set of a removal may name rows that aren't linked
+        instance.__dict__.setdefault('_unlinked_pks', {})[sender] = \
+            _linked_pks(sender, instance, reverse, model, pk_set)
+    elif action in ('post_remove', 'post_clear'):
+        _move_counts(instance, reverse, model, instance.__dict__.get(
+            '_unlinked_pks', {}).pop(sender, []), -1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def collect_counted_links(sender, instance, **kwargs):
+    """the links are gone by post_delete, remember them first"""
+    instance._counted_ids = {model: _linked_ids(instance, model)
+                             for model in (Tag, Ingredient)}
+
+
+@receiver(post_delete, sender=Recipe)
+def update_deleted_recipe_counts(sender, instance, **kwargs):
+    for model, ids in instance.__dict__.pop('_counted_ids', {}).items():
+        update_recipe_counts(model, {pk: -1 for pk in ids})
+
+
+@receiver(post_save, sender=Recipe)
+def update_saved_search_vector(sender, instance, update_fields, **kwargs):
+    if update_fields is None or 'title' in update_fields:
+        update_search_vectors(instance.user_id, [instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def update_renamed_search_vectors(sender, instance, created, **kwargs):
+    """names of recipe tags and ingredients are in cached responses too"""
+    if not created:
+        bump_user_version(instance.user_id)
+        update_related_search_vectors(sender, instance.user_id, [instance.pk])
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_linked_recipes(sender, instance, **kwargs):
+    """the links are gone by post_delete, remember the recipes first"""
+    instance._search_recipe_ids = _linked_recipe_ids(instance)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def invalidate_deleted(sender, instance, **kwargs):
+    """catch deletes that bypass the viewsets, e.g. cascades"""
+    bump_user_version(instance.user_id)
+    update_search_vectors(instance.user_id,
+                          instance.__dict__.pop('_search_recipe_ids', []))
+
+
+@receiver(post_save, sender=get_user_model())
+def reset_new_user(sender, instance, created, **kwargs):
+    if created:
+        reset_user_version(instance.pk)
+        invalidate_user_index(instance.pk)
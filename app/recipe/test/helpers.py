@@ -0,0 +1,30 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+
+# upper bound of queries a single recipe, tag or ingredient request may issue,
+# a relation .set() costs a recipe_count update per add and remove
+MAX_QUERIES_PER_REQUEST = 14
+
+
+class QueryBudgetAPIClient(APIClient):
+    """api client that fails any request issuing too many queries"""
+
+    def __init__(self, *args, max_queries=MAX_QUERIES_PER_REQUEST, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_queries = max_queries
+
+    def request(self, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = super().request(**kwargs)
+
+        if len(ctx.captured_queries) > self.max_queries:
+            queries = '\n'.join(q['sql'] for q in ctx.captured_queries)
+            raise AssertionError(
+                f'{kwargs.get("REQUEST_METHOD")} {kwargs.get("PATH_INFO")} '
+                f'issued {len(ctx.captured_queries)} queries, budget is '
+                f'{self.max_queries}:\n{queries}'
+            )
+        return response
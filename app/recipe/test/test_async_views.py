@@ -0,0 +1,197 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+from users.authentication import token_cache
+
+ASYNC_TAGS_URL = reverse('recipe:async-tag-list')
+ASYNC_INGREDIENTS_URL = reverse('recipe:async-ingredient-list')
+ASYNC_RECIPES_URL = reverse('recipe:async-recipe-list')
+
+
+def async_detail_url(recipe_id):
+    return reverse('recipe:async-recipe-detail', args=[recipe_id])
+
+
+class AsyncViewsTests(TestCase):
+    """test the async read paths against the DRF endpoints"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = AsyncClient()
+        # AsyncClient sends extra kwargs as raw request headers
+        self.auth = {'AUTHORIZATION': f'Token {self.token.key}'}
+        self.sync_client = APIClient()
+        self.sync_client.force_authenticate(self.user)
+
+        tags = [Tag.objects.create(user=self.user, name=name)
+                for name in ('vegan', 'dessert', 'dessert')]
+        ingredients = [Ingredient.objects.create(user=self.user,
+                                                 name=f'ing{i}')
+                       for i in range(3)]
+        Ingredient.objects.create(user=self.user, name='unused')
+        for i, price in enumerate(('5', '5.5', '0.10', '234.56')):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'curry {i} é', time_minute=i,
+                price=price, link='https://example.com' if i % 2 else '')
+            recipe.tags.add(*reversed(tags[:i]))
+            recipe.ingredients.add(*ingredients[i % 3:])
+
+        other = get_user_model().objects.create_user('other@test.com',
+                                                     'testpass')
+        Tag.objects.create(user=other, name='other')
+        Recipe.objects.create(user=other, title='other', time_minute=1,
+                              price='1.00')
+
+    async def test_auth_required(self):
+        """test requests without a valid token are rejected"""
+        for headers in ({}, {'AUTHORIZATION': 'Token invalid'}):
+            res = await self.client.get(ASYNC_RECIPES_URL, **headers)
+
+            self.assertEqual(res.status_code, 401)
+            self.assertEqual(res['WWW-Authenticate'], 'Token')
+            self.assertIn('detail', res.json())
+
+    async def test_inactive_user_rejected(self):
+        """test cached tokens of deactivated users are refused"""
+        res = await self.client.get(ASYNC_TAGS_URL, **self.auth)
+        self.assertEqual(res.status_code, 200)
+
+        self.user.is_active = False
+        await sync_to_async(self.user.save)()
+        token_cache.clear()
+        res = await self.client.get(ASYNC_TAGS_URL, **self.auth)
+
+        self.assertEqual(res.status_code, 401)
+
+    async def test_lists_match_sync_endpoints(self):
+        """test the async lists render the DRF responses"""
+        for async_url, name in ((ASYNC_TAGS_URL, 'tag'),
+                                (ASYNC_INGREDIENTS_URL, 'ingredient'),
+                                (ASYNC_RECIPES_URL, 'recipe')):
+            res = await self.client.get(async_url, **self.auth)
+            expected = await sync_to_async(self.sync_client.get)(
+                reverse(f'recipe:{name}-list'))
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res['Content-Type'], 'application/json')
+            self.assertEqual(res.json()['results'],
+                             expected.json()['results'])
+
+    async def test_assigned_only(self):
+        """test assigned_only filters the async ingredient list"""
+        res = await self.client.get(ASYNC_INGREDIENTS_URL,
+                                    {'assigned_only': 1}, **self.auth)
+
+        names = [item['name'] for item in res.json()['results']]
+        self.assertNotIn('unused', names)
+        self.assertEqual(len(names), 3)
+
+    async def test_recipe_filters(self):
+        """test tags= and match=all filter the async recipe list"""
+        tag_ids = [pk async for pk in Tag.objects.filter(
+            user=self.user).order_by('id').values_list('id', flat=True)]
+        ids = ','.join(str(pk) for pk in tag_ids[:2])
+
+        res = await self.client.get(
+            ASYNC_RECIPES_URL, {'tags': ids, 'match': 'all'}, **self.auth)
+        titles = [item['title'] for item in res.json()['results']]
+        self.assertEqual(titles, ['curry 3 é', 'curry 2 é'])
+
+        res = await self.client.get(ASYNC_RECIPES_URL, {'tags': 'x'},
+                                    **self.auth)
+        self.assertEqual(res.status_code, 400)
+
+    async def test_pagination(self):
+        """test the cursor walks every row exactly once"""
+        for url, key in ((ASYNC_RECIPES_URL, 'id'),
+                         (ASYNC_TAGS_URL, 'id')):
+            seen = []
+            res = await self.client.get(url, {'page_size': 1}, **self.auth)
+            while True:
+                data = res.json()
+                self.assertIsNone(data['previous'])
+                seen += [item[key] for item in data['results']]
+                if data['next'] is None:
+                    break
+                res = await self.client.get(data['next'], **self.auth)
+            self.assertEqual(len(seen), len(set(seen)))
+            self.assertEqual(len(seen),
+                             4 if url == ASYNC_RECIPES_URL else 3)
+
+    async def test_unsupported_params_rejected(self):
+        """test params of the DRF endpoints the async views lack fail"""
+        for url, params in ((ASYNC_RECIPES_URL, {'fields': 'id'}),
+                            (ASYNC_RECIPES_URL, {'expand': 'tags'}),
+                            (ASYNC_RECIPES_URL, {'search': 'curry'}),
+                            (ASYNC_TAGS_URL, {'q': 'veg'})):
+            res = await self.client.get(url, params, **self.auth)
+
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(list(res.json()), list(params))
+
+    @override_settings(RECIPE_RESPONSE_CACHE={
+        **settings.RECIPE_RESPONSE_CACHE, 'ALLOW_LOCAL': True})
+    async def test_lists_served_from_response_cache(self):
+        """test repeated lists come from the cache until the user writes"""
+        for url in (ASYNC_TAGS_URL, ASYNC_RECIPES_URL):
+            res1 = await self.client.get(url, **self.auth)
+            # bypasses the views, which would bump the cache version
+            await Recipe.objects.aupdate(title='changed')
+            await Tag.objects.aupdate(name='changed')
+            res2 = await self.client.get(url, **self.auth)
+
+            self.assertEqual(res1.content, res2.content)
+            self.assertEqual(res1['ETag'], res2['ETag'])
+
+        res = await self.client.get(ASYNC_RECIPES_URL, **self.auth,
+                                    IF_NONE_MATCH=res1['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+        await sync_to_async(self.sync_client.post)(
+            reverse('recipe:tag-list'), {'name': 'new'})
+        res = await self.client.get(ASYNC_TAGS_URL, **self.auth)
+        self.assertIn('new', [tag['name'] for tag in res.json()['results']])
+
+    async def test_invalid_cursor(self):
+        res = await self.client.get(ASYNC_TAGS_URL, {'cursor': 'nope'},
+                                    **self.auth)
+
+        self.assertEqual(res.status_code, 404)
+
+    async def test_retrieve_matches_sync_endpoint(self):
+        """test the async detail renders the DRF detail response"""
+        recipe = await Recipe.objects.filter(user=self.user) \
+                                     .order_by('-id').afirst()
+
+        res = await self.client.get(async_detail_url(recipe.id), **self.auth)
+        expected = await sync_to_async(self.sync_client.get)(
+            reverse('recipe:recipe-detail', args=[recipe.id]))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, expected.content)
+
+    async def test_retrieve_other_users_recipe(self):
+        """test recipes of other users are not found"""
+        recipe = await Recipe.objects.exclude(user=self.user).aget()
+
+        res = await self.client.get(async_detail_url(recipe.id), **self.auth)
+
+        self.assertEqual(res.status_code, 404)
+
+    async def test_method_not_allowed(self):
+        res = await self.client.post(ASYNC_TAGS_URL, {'name': 'x'},
+                                     **self.auth)
+
+        self.assertEqual(res.status_code, 405)
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.test.helpers import QueryBudgetAPIClient
+
+TAG_URL = reverse('recipe:tag-list')
+INGREDIENT_URL = reverse('recipe:ingredient-list')
+
+
+@override_settings(RECIPE_RESPONSE_CACHE={
+    **settings.RECIPE_RESPONSE_CACHE, 'ALLOW_LOCAL': True})
+class AutocompleteApiTests(TestCase):
+    """test the q= autocomplete of tags and ingredients"""
+
+    def setUp(self):
+        self.client = QueryBudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _names(self, url, **params):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in res.data['results']]
+
+    def test_prefix_match(self):
+        """test names starting with the query, case insensitive"""
+        for name in ('Salt', 'salmon', 'Sugar', 'Basalt'):
+            Ingredient.objects.create(user=self.user, name=name)
+
+        self.assertEqual(self._names(INGREDIENT_URL, q='sal'),
+                         ['Salt', 'salmon'])
+
+    def test_limit(self):
+        """test only the top matches are returned"""
+        for i in range(5):
+            Tag.objects.create(user=self.user, name=f'vegan{i}')
+
+        self.assertEqual(self._names(TAG_URL, q='veg', limit=2),
+                         ['vegan0', 'vegan1'])
+
+    def test_limited_to_user(self):
+        """test other users' names are not suggested"""
+        user2 = get_user_model().objects.create_user('user2@test.com', 'pass')
+        Tag.objects.create(user=user2, name='Vegan')
+
+        self.assertEqual(self._names(TAG_URL, q='veg'), [])
+
+    def test_assigned_only(self):
+        """test assigned_only drops names no recipe uses"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='curry', time_minute=5, price='5.00')
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'))
+        Ingredient.objects.create(user=self.user, name='Salmon')
+
+        self.assertEqual(self._names(INGREDIENT_URL, q='sal'),
+                         ['Salmon', 'Salt'])
+        self.assertEqual(
+            self._names(INGREDIENT_URL, q='sal', assigned_only=1), ['Salt'])
+
+    def test_hot_prefix_cached(self):
+        """test repeated keystrokes are served from the cache"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        self._names(TAG_URL, q='veg')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._names(TAG_URL, q='Veg'), ['Vegan'])
+
+    @override_settings(RECIPE_AUTOCOMPLETE={
+        'LIMIT': 10, 'MAX_LIMIT': 50, 'CACHE_TIMEOUT': 300})
+    def test_new_names_not_stale(self):
+        """test names created through the api are suggested at once"""
+        self._names(TAG_URL, q='veg')
+
+        self.client.post(TAG_URL, {'name': 'Vegan'})
+
+        self.assertEqual(self._names(TAG_URL, q='veg'), ['Vegan'])
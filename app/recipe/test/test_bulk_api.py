@@ -0,0 +1,187 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.test.helpers import QueryBudgetAPIClient
+
+TAG_BULK_URL = reverse('recipe:tag-bulk')
+INGREDIENT_BULK_URL = reverse('recipe:ingredient-bulk')
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def recipe_payload(**params):
+    payload = {
+        'title': 'sample recipe',
+        'time_minute': 10,
+        'price': '5.00',
+        'tags': [],
+        'ingredients': [],
+    }
+    payload.update(params)
+    return payload
+
+
+class BulkApiTests(TestCase):
+    """test the bulk create and update endpoints"""
+
+    def setUp(self):
+        self.client = QueryBudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_tags(self):
+        """test creating many tags in one request"""
+        payload = [{'name': f'tag{i}'} for i in range(50)]
+
+        res = self.client.post(TAG_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 50)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 50)
+
+    def test_bulk_create_ingredients(self):
+        """test creating many ingredients in one request"""
+        payload = [{'name': 'salt'}, {'name': 'pepper'}]
+
+        res = self.client.post(INGREDIENT_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_recipes_with_links(self):
+        """test recipes and their m2m links are written in bulk"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='salt')
+        payload = [
+            recipe_payload(title=f'food{i}', tags=[tag.id],
+                           ingredients=[ingredient.id])
+            for i in range(5)
+        ]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['title'] for r in res.data],
+                         [f'food{i}' for i in range(5)])
+        for recipe in Recipe.objects.filter(user=self.user):
+            self.assertEqual(list(recipe.tags.all()), [tag])
+            self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+
+    def test_bulk_create_atomic_with_item_errors(self):
+        """test one invalid item rejects the whole batch"""
+        payload = [recipe_payload(), recipe_payload(title='')]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_BULK_MAX_BATCH=2)
+    def test_bulk_batch_size_limited(self):
+        """test batches above the maximum size are rejected"""
+        payload = [{'name': f'tag{i}'} for i in range(3)]
+
+        res = self.client.post(TAG_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_create_queries_constant(self):
+        """test related ids of every item are validated in one query"""
+        ingredients = [Ingredient.objects.create(user=self.user,
+                                                 name=f'ing{i}')
+                       for i in range(50)]
+        payload = [recipe_payload(title=f'food{i}',
+                                  ingredients=[x.id for x in ingredients])
+                   for i in range(50)]
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        lookups = [q for q in ctx.captured_queries
+                   if q['sql'].startswith('SELECT "core_ingredient"')]
+        self.assertEqual(len(lookups), 1)
+
+    def test_bulk_update_recipes(self):
+        """test partially updating many recipes in one request"""
+        tag1 = Tag.objects.create(user=self.user, name='vegan')
+        tag2 = Tag.objects.create(user=self.user, name='dessert')
+        recipe1 = Recipe.objects.create(
+            user=self.user, title='food1', time_minute=5, price=5)
+        recipe2 = Recipe.objects.create(
+            user=self.user, title='food2', time_minute=5, price=5)
+        recipe1.tags.add(tag1)
+        payload = [
+            {'id': recipe1.id, 'tags': [tag2.id]},
+            {'id': recipe2.id, 'title': 'renamed'},
+        ]
+
+        res = self.client.patch(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertEqual(list(recipe1.tags.all()), [tag2])
+        self.assertEqual(recipe1.title, 'food1')
+        self.assertEqual(recipe2.title, 'renamed')
+
+    def test_bulk_update_ignores_list_filters(self):
+        """test list filters in the query string don't break the reply"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+        recipe = Recipe.objects.create(
+            user=self.user, title='food1', time_minute=5, price=5)
+
+        res = self.client.patch(f'{RECIPE_BULK_URL}?tags={tag.id}',
+                                [{'id': recipe.id, 'title': 'renamed'}],
+                                format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['title'], 'renamed')
+
+    def test_bulk_update_string_ids(self):
+        """test ids are parsed like any other primary key"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+
+        res = self.client.patch(TAG_BULK_URL, [
+            {'id': str(tag.id), 'name': 'vegetarian'},
+            {'id': 'nope', 'name': 'x'},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+
+    def test_bulk_update_other_users_recipe(self):
+        """test updating recipes of another user is rejected"""
+        user2 = get_user_model().objects.create_user('user2@test.com', 'pass')
+        recipe = Recipe.objects.create(
+            user=user2, title='food1', time_minute=5, price=5)
+
+        res = self.client.patch(
+            RECIPE_BULK_URL, [{'id': recipe.id, 'title': 'x'}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', res.data[0])
+
+    def test_bulk_create_invalidates_list_cache(self):
+        """test the cached list shows bulk created objects"""
+        self.client.get(RECIPE_URL)
+        self.client.post(RECIPE_BULK_URL, [recipe_payload()], format='json')
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.test.helpers import QueryBudgetAPIClient
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def sample_recipe(user, title='sample recipe'):
+    return Recipe.objects.create(
+        user=user, title=title, time_minute=10, price='5.50')
+
+
+class RecipeExportTests(TestCase):
+    """test streaming the recipe catalogue"""
+
+    def setUp(self):
+        self.client = QueryBudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _content(self, res):
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """test every recipe is exported with its relations"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='salt')
+        recipe1 = sample_recipe(self.user, 'food1')
+        recipe2 = sample_recipe(self.user, 'food2')
+        recipe1.tags.add(tag)
+        recipe2.ingredients.add(ingredient)
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self._content(res).splitlines()]
+        self.assertEqual(rows[0], {
+            'id': recipe1.id, 'title': 'food1', 'time_minute': 10,
+            'price': '5.50', 'link': '',
+            'tags': [{'id': tag.id, 'name': 'vegan'}], 'ingredients': [],
+        })
+        self.assertEqual(rows[1]['ingredients'],
+                         [{'id': ingredient.id, 'name': 'salt'}])
+
+    def test_export_csv(self):
+        """test exporting as csv"""
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='vegan'),
+                        Tag.objects.create(user=self.user, name='quick'))
+
+        res = self.client.get(EXPORT_URL, {'type': 'csv'})
+
+        rows = list(csv.reader(io.StringIO(self._content(res))))
+        self.assertEqual(rows[0][-2:], ['tags', 'ingredients'])
+        self.assertEqual(rows[1][1], 'sample recipe')
+        self.assertEqual(rows[1][-2], 'vegan|quick')
+
+    def test_export_limited_to_user(self):
+        """test only the user's recipes are exported"""
+        user2 = get_user_model().objects.create_user('user2@test.com', 'pass')
+        sample_recipe(user2)
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(self._content(res), '')
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_queries_per_chunk(self):
+        """test relations are fetched once per chunk, not per recipe"""
+        for i in range(5):
+            sample_recipe(self.user, f'food{i}').tags.add(
+                Tag.objects.create(user=self.user, name=f'tag{i}'))
+
+        with self.assertNumQueries(1 + 3 * 2):
+            res = self.client.get(EXPORT_URL)
+            lines = self._content(res).splitlines()
+
+        self.assertEqual(len(lines), 5)
+
+    def test_export_invalid_type(self):
+        """test unknown export types are rejected"""
+        res = self.client.get(EXPORT_URL, {'type': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
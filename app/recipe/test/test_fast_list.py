@@ -0,0 +1,82 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.cache import bump_user_version
+from recipe.serializers import RecipeSerializer
+from recipe.test.helpers import QueryBudgetAPIClient
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class FastListTests(TestCase):
+    """test the values() based recipe list matches the serializer"""
+
+    def setUp(self):
+        self.client = QueryBudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+        tags = [Tag.objects.create(user=self.user, name=f'tag{i}')
+                for i in range(3)]
+        ingredients = [Ingredient.objects.create(user=self.user,
+                                                 name=f'ing{i}')
+                       for i in range(3)]
+        prices = ('5', '5.5', '0.10', '234.56', '7.00')
+        for i, price in enumerate(prices):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'curry {i} "quoted" é',
+                time_minute=i, price=price,
+                link='https://example.com' if i % 2 else '')
+            # links added out of id order
+            recipe.tags.add(*reversed(tags[:i]))
+            recipe.ingredients.add(*ingredients[i % 3:])
+
+    def _get(self, fast, params):
+        bump_user_version(self.user.id)
+        with override_settings(RECIPE_FAST_LIST=fast):
+            return self.client.get(RECIPES_URL, params)
+
+    def assertSameResponse(self, params):
+        with patch.object(RecipeSerializer, 'to_representation',
+                          side_effect=AssertionError('serializer used')):
+            fast = self._get(True, params)
+        slow = self._get(False, params)
+
+        self.assertEqual(fast.status_code, slow.status_code)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_identical_json(self):
+        """test both paths render the same bytes"""
+        for params in ({}, {'page_size': 2}, {'fields': 'price,id'},
+                       {'fields': 'title,tags'},
+                       {'tags': Tag.objects.first().id},
+                       {'search': 'curry'}):
+            with self.subTest(params=params):
+                self.assertSameResponse(params)
+
+    def test_identical_next_page(self):
+        """test the cursor of the next page matches too"""
+        next_url = self._get(True, {'page_size': 2}).data['next']
+
+        self.assertSameResponse({'page_size': 2,
+                                 'cursor': next_url.split('cursor=')[1]
+                                 .split('&')[0]})
+
+    def test_expand_uses_serializer(self):
+        """test expanded relations keep the nested serializers"""
+        res = self._get(True, {'expand': 'tags'})
+
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'tag0')
+
+    def test_query_count(self):
+        """test a page costs one query plus one per relation"""
+        with self.assertNumQueries(3):
+            self._get(True, {})
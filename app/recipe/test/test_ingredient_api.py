@@ -5,6 +5,8 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from recipe.test.helpers import QueryBudgetAPIClient
+
 from core.models import Ingredient, Recipe
 
 from recipe.serializers import IngredientSerializer
@@ -24,7 +26,7 @@ class PublicIngredientApiTest(TestCase):
 class PrivateIngredientApiTest(TestCase):
     """Test Ingredient for authenticated users"""
     def setUp(self):
-        self.client = APIClient()
+        self.client = QueryBudgetAPIClient()
         self.user = get_user_model().objects.create_user(
             email='test@test.com',
             password='testpassword'
@@ -42,7 +44,7 @@ class PrivateIngredientApiTest(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredient_limited_to_user(self):
         """test each user can see his own ingredient"""
@@ -52,8 +54,8 @@ class PrivateIngredientApiTest(TestCase):
 
         res = self.client.get(INGREDIENT_URL)
 
-        self.assertEqual(len(res.data),1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
+        self.assertEqual(len(res.data['results']),1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
     def test_create_ingredient_successfuly(self):
@@ -90,11 +92,12 @@ class PrivateIngredientApiTest(TestCase):
         )
 
         recipe.ingredients.add(ingredient1)
+        ingredient1.refresh_from_db()
 
         res = self.client.get(INGREDIENT_URL, {'assigned_only':1})
         
         serializer1 = IngredientSerializer(ingredient1)
         serializer2 = IngredientSerializer(ingredient2)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
@@ -1,18 +1,25 @@
 import tempfile
 import os
+from unittest.mock import patch
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from recipe.test.helpers import QueryBudgetAPIClient
+
 from core.models import Recipe, Tag, Ingredient
 
 from recipe.serializers import RecipeSerializer, RecipeDetailSerielizer
+from recipe.images import (delete_thumbnails, process_recipe_image,
+                           thumbnail_name)
 
 RECIPE_URL = reverse('recipe:recipe-list')
 
@@ -55,7 +62,7 @@ class publicRecipeApiTest(TestCase):
 class privateRecipeApiTest(TestCase):
     """Test authenticated recipe API access """
     def setUp(self):
-        self.client = APIClient()
+        self.client = QueryBudgetAPIClient()
 
         self.user = get_user_model().objects.create_user(
             'test@test.com',
@@ -70,11 +77,11 @@ class privateRecipeApiTest(TestCase):
 
         res = self.client.get(RECIPE_URL)
 
-        recipes = Recipe.objects.all()
+        recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_limited_to_user(self):
         """Test the access of each user to recipe"""
@@ -85,14 +92,47 @@ class privateRecipeApiTest(TestCase):
         sample_recipe(user=self.user)
         sample_recipe(user=user2)
 
-        recipes = Recipe.objects.filter(user=self.user)
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
         serializer= RecipeSerializer(recipes, many=True)
         
         res= self.client.get(RECIPE_URL)
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_recipe_list_query_count_constant(self):
+        """test listing recipes does not issue a query per recipe"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        for i in range(20):
+            recipe = sample_recipe(user=self.user, title=f'food{i}')
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 20)
+
+    def test_recipe_list_cursor_pagination(self):
+        """test recipes are paginated newest first with a cursor"""
+        recipe1 = sample_recipe(user=self.user, title='food1')
+        recipe2 = sample_recipe(user=self.user, title='food2')
+        recipe3 = sample_recipe(user=self.user, title='food3')
+
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertEqual([r['id'] for r in res.data['results']],
+                         [recipe3.id, recipe2.id])
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe1.id])
+        self.assertIsNone(res.data['next'])
 
     def test_recipe_view_details(self):
         "test reviewing recipe details"
@@ -169,6 +209,48 @@ class privateRecipeApiTest(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_create_recipe_related_queries_constant(self):
+        """test the ingredient ids are validated in constant queries"""
+        ingredients = [sample_ingredient(user=self.user, name=f'ing{i}')
+                       for i in range(50)]
+
+        def count_queries(related):
+            payload = {
+                'title': 'Stew',
+                'ingredients': [ingredient.id for ingredient in related],
+                'tags': [],
+                'time_minute': 60,
+                'price': '5.00',
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPE_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(ingredients[:1]),
+                         count_queries(ingredients))
+
+    def test_create_recipe_other_users_ids_rejected(self):
+        """test every missing or foreign id is reported at once"""
+        user2 = get_user_model().objects.create_user('other@test.com', 'pw')
+        own = sample_tag(user=self.user)
+        foreign = sample_tag(user=user2)
+        payload = {
+            'title': 'Stew',
+            'tags': [own.id, foreign.id, 9999],
+            'ingredients': [],
+            'time_minute': 60,
+            'price': '5.00',
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertIn(str(foreign.id), res.data['tags'][0])
+        self.assertIn('9999', res.data['tags'][1])
+        self.assertFalse(Recipe.objects.exists())
+
     def test_partial_update_recipe(self):
         """test updating a recipe with patch """
 
@@ -232,9 +314,9 @@ class privateRecipeApiTest(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
     
     def test_filter_recipe_by_ingredient(self):
         """Test returning recipe with specific ingredient"""
@@ -256,10 +338,64 @@ class privateRecipeApiTest(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
-        
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
+
+    def test_filter_recipe_matching_several_tags_once(self):
+        """test a recipe carrying several requested tags is listed once"""
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='vegan')
+        tag2 = sample_tag(user=self.user, name='dessert')
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPE_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe.id])
+
+    def test_filter_recipe_match_all_tags(self):
+        """test match=all only returns recipes carrying every tag"""
+        recipe1 = sample_recipe(user=self.user, title='food1')
+        recipe2 = sample_recipe(user=self.user, title='food2')
+        tag1 = sample_tag(user=self.user, name='vegan')
+        tag2 = sample_tag(user=self.user, name='dessert')
+        recipe1.tags.add(tag1, tag2)
+        recipe2.tags.add(tag1)
+
+        res = self.client.get(
+            RECIPE_URL, {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'})
+
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe1.id])
+
+    def test_filter_recipe_same_results_as_join(self):
+        """test the semi-join filters keep the m2m join semantics"""
+        tags = [sample_tag(user=self.user, name=f'tag{i}') for i in range(3)]
+        ingredients = [
+            sample_ingredient(user=self.user, name=f'ing{i}')
+            for i in range(3)
+        ]
+        for i in range(8):
+            recipe = sample_recipe(user=self.user, title=f'food{i}')
+            recipe.tags.add(*[t for n, t in enumerate(tags) if i >> n & 1])
+            recipe.ingredients.add(
+                *[g for n, g in enumerate(ingredients) if i >> n & 1])
+        tag_ids = [tags[0].id, tags[1].id]
+        ingredient_ids = [ingredients[1].id, ingredients[2].id]
+
+        res = self.client.get(RECIPE_URL, {
+            'tags': ','.join(map(str, tag_ids)),
+            'ingredients': ','.join(map(str, ingredient_ids)),
+        })
+
+        expected = set(
+            Recipe.objects.filter(user=self.user, tags__id__in=tag_ids)
+            .filter(ingredients__id__in=ingredient_ids)
+            .values_list('id', flat=True)
+        )
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), expected)
+
 
 class RecipeImageUploadTest(TestCase):
     """test uploading image to recipe"""
@@ -274,6 +410,8 @@ class RecipeImageUploadTest(TestCase):
         self.recipe = sample_recipe(user=self.user)
 
     def tearDown(self):
+        if self.recipe.image:
+            delete_thumbnails(self.recipe.image.storage, self.recipe.image.name)
         self.recipe.image.delete()
 
     def test_upload_image_to_recipe(self):
@@ -287,9 +425,80 @@ class RecipeImageUploadTest(TestCase):
             res = self.client.post(url, {'image':ntf}, format= 'multipart')
         
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PROCESSING)
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    @override_settings(RECIPE_IMAGE_PROCESSING={
+        'WORKERS': 0, 'THUMBNAIL_SIZES': (4,), 'JPEG_QUALITY': 85})
+    def test_uploaded_image_processed(self):
+        """test the image is rotated upright and thumbnails are built"""
+        url = image_upload_url(self.recipe.id)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees clockwise
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            img = Image.new('RGB', (20, 10))
+            img.save(ntf, format='JPEG', exif=exif)
+            ntf.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'image': ntf}, format='multipart')
+
+        res = self.client.get(url)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
+        self.assertIn('4', res.data['thumbnails'])
+        with Image.open(self.recipe.image.path) as img:
+            self.assertEqual(img.size, (10, 20))
+        thumb = thumbnail_name(self.recipe.image.path, 4)
+        self.addCleanup(os.remove, thumb)
+        with Image.open(thumb) as img:
+            self.assertEqual(img.size, (2, 4))
+
+    def _upload(self):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+        self.recipe.refresh_from_db()
+        return self.recipe.image.path
+
+    def test_original_replaced_after_processing(self):
+        """test the processed image is saved before the original goes"""
+        original = self._upload()
+
+        process_recipe_image(self.recipe.id)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertNotEqual(self.recipe.image.path, original)
         self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertFalse(os.path.exists(original))
+
+    def test_failed_processing_keeps_original(self):
+        original = self._upload()
+
+        with patch('recipe.images._encode', side_effect=OSError):
+            process_recipe_image(self.recipe.id)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(self.recipe.image.path, original)
+        self.assertTrue(os.path.exists(original))
+
+    def test_unexpected_errors_mark_failed(self):
+        """test no error leaves the image processing"""
+        self._upload()
+
+        with patch('recipe.images.ImageOps.exif_transpose',
+                   side_effect=ValueError), \
+                self.assertRaises(ValueError):
+            process_recipe_image(self.recipe.id)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
 
     def test_upload_image_bad_request(self):
         """test upload an invalid image"""
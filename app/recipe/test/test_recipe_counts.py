@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.test.helpers import QueryBudgetAPIClient
+
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def sample_recipe(user, title='food'):
+    return Recipe.objects.create(
+        user=user, title=title, time_minute=10, price=5.00)
+
+
+class RecipeCountTests(TestCase):
+    """test recipe_count of tags and ingredients stays in sync"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='vegan')
+        self.ingredient = Ingredient.objects.create(user=self.user,
+                                                    name='salt')
+
+    def assertCount(self, obj, count):
+        obj.refresh_from_db()
+        self.assertEqual(obj.recipe_count, count)
+
+    def test_add_remove_clear(self):
+        """test forward relation changes update the counts"""
+        recipe1 = sample_recipe(self.user, 'food1')
+        recipe2 = sample_recipe(self.user, 'food2')
+
+        recipe1.tags.add(self.tag)
+        recipe2.tags.add(self.tag)
+        recipe2.tags.add(self.tag)
+        self.assertCount(self.tag, 2)
+
+        recipe1.tags.remove(self.tag)
+        self.assertCount(self.tag, 1)
+
+        recipe2.tags.clear()
+        self.assertCount(self.tag, 0)
+
+    def test_remove_unlinked(self):
+        """test removing links that don't exist changes no count"""
+        recipe1 = sample_recipe(self.user, 'food1')
+        recipe2 = sample_recipe(self.user, 'food2')
+        recipe1.tags.add(self.tag)
+
+        recipe2.tags.remove(self.tag)
+        self.tag.recipe_set.remove(recipe2)
+        self.assertCount(self.tag, 1)
+
+        self.tag.recipe_set.remove(recipe1, recipe2)
+        self.assertCount(self.tag, 0)
+
+    def test_counts_adjusted_not_recounted(self):
+        """test changes move the stored count rather than recount it"""
+        Tag.objects.filter(pk=self.tag.pk).update(recipe_count=10)
+        recipe = sample_recipe(self.user)
+
+        recipe.tags.add(self.tag)
+        self.assertCount(self.tag, 11)
+
+        recipe.tags.clear()
+        self.assertCount(self.tag, 10)
+
+    def test_reverse_relation(self):
+        """test changes made from the tag side update its count"""
+        recipes = [sample_recipe(self.user, f'food{i}') for i in range(3)]
+
+        self.tag.recipe_set.add(*recipes)
+        self.assertCount(self.tag, 3)
+
+        self.tag.recipe_set.clear()
+        self.assertCount(self.tag, 0)
+
+    def test_recipe_delete(self):
+        """test deleting a recipe decrements its relations"""
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(self.ingredient)
+
+        recipe.delete()
+
+        self.assertCount(self.tag, 0)
+        self.assertCount(self.ingredient, 0)
+
+    def test_bulk_writes(self):
+        """test the bulk endpoint keeps counts without m2m signals"""
+        client = QueryBudgetAPIClient()
+        client.force_authenticate(self.user)
+        other = Tag.objects.create(user=self.user, name='quick')
+
+        res = client.post(BULK_URL, [
+            {'title': f'food{i}', 'time_minute': 10, 'price': '5.00',
+             'tags': [self.tag.id], 'ingredients': [self.ingredient.id]}
+            for i in range(2)
+        ], format='json')
+        self.assertCount(self.tag, 2)
+        self.assertCount(self.ingredient, 2)
+
+        client.patch(BULK_URL, [{'id': res.data[0]['id'],
+                                 'tags': [other.id]}], format='json')
+        self.assertCount(self.tag, 1)
+        self.assertCount(other, 1)
@@ -0,0 +1,167 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe
+from recipe.cache import get_user_version
+
+TAG_URL = reverse('recipe:tag-list')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def sample_recipe(user, title='sample recipe'):
+    return Recipe.objects.create(
+        user=user, title=title, time_minute=10, price=5.00)
+
+
+def local_cache_allowed(allowed=True):
+    return override_settings(RECIPE_RESPONSE_CACHE={
+        **settings.RECIPE_RESPONSE_CACHE, 'ALLOW_LOCAL': allowed})
+
+
+@local_cache_allowed()
+class ResponseCacheTests(TestCase):
+    """test list responses are cached per user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """test a repeated list request does not hit the database"""
+        Tag.objects.create(user=self.user, name='vegan')
+        res1 = self.client.get(TAG_URL)
+
+        with self.assertNumQueries(0):
+            res2 = self.client.get(TAG_URL)
+
+        self.assertEqual(res2.status_code, status.HTTP_200_OK)
+        self.assertEqual(res1.data, res2.data)
+
+    def test_cache_limited_to_user(self):
+        """test users never share cached responses"""
+        Tag.objects.create(user=self.user, name='vegan')
+        self.client.get(TAG_URL)
+        user2 = get_user_model().objects.create_user('user2@test.com', 'pass')
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(TAG_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_create_invalidates(self):
+        """test creating through the api invalidates the user's lists"""
+        self.client.get(TAG_URL)
+        self.client.post(TAG_URL, {'name': 'vegan'})
+
+        res = self.client.get(TAG_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_m2m_change_invalidates(self):
+        """test adding a tag to a recipe invalidates the recipe list"""
+        recipe = sample_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='vegan')
+        self.client.get(RECIPE_URL)
+        recipe.tags.add(tag)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.data['results'][0]['tags'], [tag.id])
+
+    def test_params_normalized(self):
+        """test id lists in any order share one cache entry"""
+        self.client.get(RECIPE_URL, {'tags': '2,1'})
+
+        with self.assertNumQueries(0):
+            self.client.get(RECIPE_URL, {'tags': '1,2'})
+
+    def test_field_params_normalized(self):
+        """test field lists in any order share one cache entry"""
+        self.client.get(RECIPE_URL, {'fields': 'title,id'})
+
+        with self.assertNumQueries(0):
+            self.client.get(RECIPE_URL, {'fields': 'id,title'})
+
+    def test_etag_not_modified(self):
+        """test sending back the etag returns an empty 304"""
+        res = self.client.get(TAG_URL)
+
+        res = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(res.content)
+
+    def test_etag_compared_exactly(self):
+        """test If-None-Match lists are parsed, not searched"""
+        etag = self.client.get(TAG_URL)['ETag']
+
+        for header, expected in (
+                (f'"other", W/{etag}', status.HTTP_304_NOT_MODIFIED),
+                ('*', status.HTTP_304_NOT_MODIFIED),
+                (f'"x{etag[1:]}', status.HTTP_200_OK),
+                (f'{etag[:-1]}x"', status.HTTP_200_OK)):
+            res = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=header)
+
+            self.assertEqual(res.status_code, expected, header)
+
+    def test_version_bumped_again_on_commit(self):
+        """test lists cached before a write commits are invalidated"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            tag.name = 'vegetarian'
+            tag.save()
+            tag.save()
+            # a concurrent request still reads the committed rows
+            version = get_user_version(self.user.pk)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(get_user_version(self.user.pk), version)
+
+    def test_etag_changes_after_write(self):
+        """test the etag of a list changes once the user writes"""
+        etag = self.client.get(TAG_URL)['ETag']
+        self.client.post(TAG_URL, {'name': 'vegan'})
+
+        res = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+
+@local_cache_allowed(False)
+class LocalResponseCacheTests(TestCase):
+    """test a per process cache isn't used for responses"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_local_cache_disabled(self):
+        self.client.get(TAG_URL)
+        # another worker process creates a tag
+        Tag.objects.create(user=self.user, name='vegan')
+
+        res = self.client.get(TAG_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertNotIn('ETag', res)
+
+    def test_system_check_warns(self):
+        from recipe.checks import check_response_cache
+
+        warning, = check_response_cache(None)
+
+        self.assertEqual(warning.id, 'recipe.W001')
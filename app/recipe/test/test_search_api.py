@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from unittest.mock import patch
+
+from django.test import TestCase, TransactionTestCase
+
+from rest_framework import status
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.search import update_search_vectors
+from recipe.test.helpers import QueryBudgetAPIClient
+
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def sample_recipe(user, title):
+    return Recipe.objects.create(
+        user=user, title=title, time_minute=10, price=5.00)
+
+
+class RecipeSearchTests(TransactionTestCase):
+    """test full text search of recipes
+
+    Search vectors are written when a transaction commits, so these
+    tests commit for real.
+    """
+
+    def setUp(self):
+        self.client = QueryBudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _titles(self, search, **params):
+        res = self.client.get(RECIPES_URL, {'search': search, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in res.data['results']]
+
+    def test_search_title(self):
+        """test every term of the query has to match"""
+        sample_recipe(self.user, 'Thai green curry')
+        sample_recipe(self.user, 'Red curry')
+        sample_recipe(self.user, 'Green salad')
+
+        self.assertEqual(self._titles('green curry'), ['Thai green curry'])
+
+    def test_search_tags_and_ingredients(self):
+        """test tag and ingredient names are searchable"""
+        recipe1 = sample_recipe(self.user, 'Porridge')
+        recipe2 = sample_recipe(self.user, 'Pancakes')
+        recipe1.tags.add(Tag.objects.create(user=self.user, name='Breakfast'))
+        recipe2.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Oats'))
+
+        self.assertEqual(self._titles('breakfast'), ['Porridge'])
+        self.assertEqual(self._titles('oats'), ['Pancakes'])
+
+    def test_search_ranks_title_first(self):
+        """test title matches outrank tag and ingredient matches"""
+        tagged = sample_recipe(self.user, 'Soup')
+        tagged.tags.add(Tag.objects.create(user=self.user, name='Lentil'))
+        sample_recipe(self.user, 'Lentil stew')
+
+        self.assertEqual(self._titles('lentil'), ['Lentil stew', 'Soup'])
+
+    def test_search_paginated(self):
+        """test every match is reachable through the next links"""
+        for i in range(3):
+            sample_recipe(self.user, f'Curry {i}')
+
+        res = self.client.get(RECIPES_URL, {'search': 'curry',
+                                            'page_size': 2})
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNone(res.data['previous'])
+
+        page2 = self.client.get(res.data['next'])
+        self.assertEqual(len(page2.data['results']), 1)
+        self.assertIsNone(page2.data['next'])
+        self.assertIsNotNone(page2.data['previous'])
+        titles = [r['title'] for r in res.data['results'] +
+                  page2.data['results']]
+        self.assertEqual(sorted(titles), ['Curry 0', 'Curry 1', 'Curry 2'])
+
+    def test_search_follows_changes(self):
+        """test renames and relation changes are searchable at once"""
+        recipe = sample_recipe(self.user, 'Toast')
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        self.assertEqual(self._titles('quick'), [])
+
+        recipe.tags.add(tag)
+        self.assertEqual(self._titles('quick'), ['Toast'])
+
+        tag.name = 'Easy'
+        tag.save()
+        self.assertEqual(self._titles('quick'), [])
+        self.assertEqual(self._titles('easy'), ['Toast'])
+
+        tag.recipe_set.clear()
+        self.assertEqual(self._titles('easy'), [])
+
+    def test_search_after_bulk_create(self):
+        """test recipes written in bulk are searchable"""
+        self.client.post(BULK_URL, [
+            {'title': 'Banana bread', 'time_minute': 60, 'price': '3.00',
+             'tags': [], 'ingredients': []},
+        ], format='json')
+
+        self.assertEqual(self._titles('banana'), ['Banana bread'])
+
+    def test_search_filtered_before_limit(self):
+        """test filters don't empty a page of the best matches"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(3):
+            sample_recipe(self.user, f'Curry curry {i}')
+        tagged = sample_recipe(self.user, 'Curry')
+        tagged.tags.add(tag)
+
+        titles = self._titles('curry', tags=tag.id, page_size=2)
+
+        self.assertEqual(titles, ['Curry'])
+
+    def test_search_limited_to_user(self):
+        """test other users' recipes are not found"""
+        user2 = get_user_model().objects.create_user('user2@test.com', 'pass')
+        sample_recipe(user2, 'Pizza')
+
+        self.assertEqual(self._titles('pizza'), [])
+
+
+class SearchVectorBatchTests(TestCase):
+    """test search vectors are updated once per transaction"""
+
+    @patch('recipe.search.use_postgres', return_value=True)
+    def test_updates_batched_until_commit(self, _):
+        with self.captureOnCommitCallbacks() as callbacks:
+            update_search_vectors(1, [1, 2])
+            update_search_vectors(1, [2, 3])
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(callbacks[0].ids, {1, 2, 3})
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.test.helpers import QueryBudgetAPIClient
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SparseFieldsApiTests(TestCase):
+    """test fields= and expand= on the recipe endpoints"""
+
+    def setUp(self):
+        self.client = QueryBudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='food', time_minute=10, price=5.00)
+        self.tag = Tag.objects.create(user=self.user, name='vegan')
+        self.ingredient = Ingredient.objects.create(user=self.user,
+                                                    name='salt')
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+    def test_list_fields(self):
+        """test only the requested columns are selected and returned"""
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'],
+                         [{'id': self.recipe.id, 'title': 'food'}])
+
+    def test_list_expand(self):
+        """test expanded relations are nested, the others left out"""
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL, {'fields': 'id',
+                                                'expand': 'tags'})
+
+        self.assertEqual(res.data['results'], [{
+            'id': self.recipe.id,
+            'tags': [{'id': self.tag.id, 'name': 'vegan',
+                      'recipe_count': 1}],
+        }])
+
+    def test_list_default_unchanged(self):
+        """test every field with pk relations without params"""
+        res = self.client.get(RECIPES_URL)
+
+        recipe = res.data['results'][0]
+        self.assertEqual(recipe['tags'], [self.tag.id])
+        self.assertEqual(recipe['ingredients'], [self.ingredient.id])
+        self.assertIn('price', recipe)
+
+    def test_detail_fields(self):
+        """test the detail endpoint honours fields="""
+        with self.assertNumQueries(2):
+            res = self.client.get(detail_url(self.recipe.id),
+                                  {'fields': 'title,ingredients'})
+
+        self.assertEqual(res.data, {
+            'title': 'food',
+            'ingredients': [{'id': self.ingredient.id, 'name': 'salt',
+                             'recipe_count': 1}],
+        })
+
+    def test_unknown_fields(self):
+        """test unknown field names are rejected"""
+        res = self.client.get(RECIPES_URL, {'fields': 'id,secret'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPES_URL, {'expand': 'user'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -5,6 +5,8 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from recipe.test.helpers import QueryBudgetAPIClient
+
 from core.models import Tag, Ingredient, Recipe
 
 from recipe.serializers import TagSerializer, IngredientSerializer
@@ -34,7 +36,7 @@ class PrivateTagApiTest(TestCase):
             'testuser',
             'testpassword'
         )
-        self.client = APIClient()
+        self.client = QueryBudgetAPIClient()
         self.client.force_authenticate(self.user)
     
     def test_retrive_tag(self):
@@ -48,7 +50,7 @@ class PrivateTagApiTest(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """"test that tags returned are for the loged in user"""
@@ -62,8 +64,8 @@ class PrivateTagApiTest(TestCase):
         res = self.client.get(TAG_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data),1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']),1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
 
     def test_create_tag_successful(self):
         """Test the tag is create sucessfuly"""
@@ -93,11 +95,28 @@ class PrivateTagApiTest(TestCase):
             )
         
         recipe.tags.add(tag1)
+        tag1.refresh_from_db()
 
         res = self.client.get(TAG_URL, {'assigned_only':1})
 
         serializer1=TagSerializer(tag1)
         serializer2=TagSerializer(tag2)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
+
+    def test_retrive_tags_assigned_unique(self):
+        """test assigned tags are listed once however many recipes use them"""
+        tag = Tag.objects.create(user=self.user, name='breakfast')
+        for title in ('food1', 'food2'):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minute=15,
+                price=5.00
+            )
+            recipe.tags.add(tag)
+
+        res = self.client.get(TAG_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res.data['results']), 1)
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from recipe import views
+from recipe import async_views, views
 
 router= DefaultRouter()
 router.register('tags', views.TagViewSet, basename='tag')
@@ -9,7 +9,19 @@ router.register('ingredients', views.IngredientViewSet,basename='ingredient')
 router.register('recipes', views.RecipeVeiwSet)
 app_name = 'recipe'
 
+# native async read paths, see recipe.async_views
+async_urlpatterns = [
+    path('tags/', async_views.TagListView.as_view(),
+         name='async-tag-list'),
+    path('ingredients/', async_views.IngredientListView.as_view(),
+         name='async-ingredient-list'),
+    path('recipes/', async_views.RecipeListView.as_view(),
+         name='async-recipe-list'),
+    path('recipes/<int:pk>/', async_views.RecipeDetailView.as_view(),
+         name='async-recipe-detail'),
+]
+
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
     path('', include(router.urls))
 ]
-
@@ -1,31 +1,66 @@
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from core import metrics
+from core.db.routers import pin_primary
 from core.models import Tag , Ingredient, Recipe
+from users.authentication import CachedTokenAuthentication
 from recipe import serializers
+from recipe.autocomplete import AutocompleteMixin
+from recipe.bulk import BulkMixin
+from recipe.cache import CachedListMixin
+from recipe.export import EXPORT_TYPES, iter_recipes
+from recipe.fastlist import FastListMixin
+from recipe.filters import filter_recipes_by, filter_assigned
+from recipe.images import delete_thumbnails, schedule_image_processing
+from recipe.search import (search_recipes, update_search_vectors,
+                           update_related_search_vectors)
+from recipe.pagination import (RecipeAttrCursorPagination,
+                               RecipeCursorPagination, SearchPagination)
 
+metrics.counter('recipe_image_uploads_total', 'Accepted recipe images.')
+metrics.counter('recipe_image_upload_bytes_total',
+                'Bytes of accepted recipe images.')
 
-class BaseReciprAttrViewSet(viewsets.GenericViewSet,
+
+class BaseReciprAttrViewSet(AutocompleteMixin,
+                            CachedListMixin,
+                            BulkMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
     """base class viewsetfor user own recipe attrebute"""
     
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeAttrCursorPagination
 
     def get_queryset(self):
         """return objects related to user"""
         assigned_only = bool(self.request.query_params.get('assigned_only'))
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = filter_assigned(queryset)
         return queryset.filter(user=self.request.user).order_by('-name')
     
     def perform_create(self, serializer):
         """save object"""
         serializer.save(user=self.request.user)
+        self.invalidate_cache()
+
+    def perform_bulk_save(self, serializer, **kwargs):
+        objs = super().perform_bulk_save(serializer, **kwargs)
+        if self.request.method == 'PATCH':
+            update_related_search_vectors(
+                self.queryset.model, self.request.user.id,
+                [obj.pk for obj in objs])
+        return objs
 
 
 class TagViewSet(BaseReciprAttrViewSet):
@@ -41,12 +76,22 @@ class IngredientViewSet(BaseReciprAttrViewSet):
     serializer_class = serializers.IngredientSerializer
 
 
-class RecipeVeiwSet(viewsets.ModelViewSet):
+class RecipeVeiwSet(CachedListMixin,
+                    FastListMixin,
+                    BulkMixin,
+                    viewsets.ModelViewSet):
     """manage recipe end point"""
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeSerializer
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeCursorPagination
+
+    def initial(self, request, *args, **kwargs):
+        # image status polls must see what the image workers just wrote
+        if self.action == 'upload_image':
+            pin_primary()
+        super().initial(request, *args, **kwargs)
 
     def _params_to_ints(self, qs):
         """convert string list to int list"""
@@ -56,21 +101,101 @@ class RecipeVeiwSet(viewsets.ModelViewSet):
         """return objects related to user"""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match_all = self.request.query_params.get('match') == 'all'
         queryset = self.queryset
 
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = filter_recipes_by(queryset, Tag, tag_ids, match_all)
         
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in= ingredient_ids)
+            queryset = filter_recipes_by(
+                queryset, Ingredient, ingredient_ids, match_all)
+
+        queryset = self._prefetch_for_action(queryset)
+        queryset = queryset.filter(user=self.request.user)
+
+        search = self._search_query()
+        if search:
+            queryset = search_recipes(queryset, self.request.user.id, search)
+        return queryset
+
+    def get_bulk_queryset(self):
+        return self._prefetch_for_action(super().get_bulk_queryset())
+
+    def _search_query(self):
+        if self.action != 'list':
+            return None
+        return self.request.query_params.get('search', '').strip() or None
+
+    @property
+    def paginator(self):
+        """search results are paged by offset over their rank"""
+        if self._search_query() and not hasattr(self, '_paginator'):
+            self._paginator = SearchPagination()
+        return super().paginator
+
+    def _field_list(self, name, allowed):
+        """names of a comma separated query param, None when missing"""
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        names = {n.strip() for n in value.split(',') if n.strip()}
+        unknown = names - set(allowed)
+        if unknown:
+            raise ValidationError(
+                {name: [f'Unknown field(s): {", ".join(sorted(unknown))}.']})
+        return names
 
-        return queryset.filter(user=self.request.user)
+    def _sparse_fields(self):
+        """(fields, expand) the list or retrieve response is made of"""
+        serializer_class = self.get_serializer_class()
+        fields = self._field_list('fields', serializer_class.Meta.fields)
+        if self.action == 'retrieve':
+            # the detail serializer always nests its relations
+            expand = set(serializer_class.expandable)
+            if fields is not None:
+                expand &= fields
+        else:
+            expand = self._field_list(
+                'expand', serializer_class.expandable) or set()
+        if fields is None:
+            fields = set(serializer_class.Meta.fields)
+        return fields | expand, expand
+
+    def _prefetch_for_action(self, queryset):
+        """load only the columns and relations the response needs"""
+        if self.action in ('upload_image', 'export'):
+            return queryset
+        relations = {'tags': Tag, 'ingredients': Ingredient}
+        if self.action not in ('list', 'retrieve'):
+            return queryset.prefetch_related(*(
+                Prefetch(name, queryset=model.objects.only('id')
+                         .order_by('id'))
+                for name, model in relations.items()))
+
+        fields, expand = self._sparse_fields()
+        queryset = queryset.only(*(fields - set(relations)))
+        for name, model in relations.items():
+            if name in expand:
+                queryset = queryset.prefetch_related(Prefetch(
+                    name, queryset=model.objects.only(
+                        'id', 'name', 'recipe_count').order_by('id')))
+            elif name in fields:
+                queryset = queryset.prefetch_related(Prefetch(
+                    name, queryset=model.objects.only('id').order_by('id')))
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            context['fields'], context['expand'] = self._sparse_fields()
+        return context
 
     def get_serializer_class(self):
         """reuen aproperiat serializer clsaa"""
-        if self.action == 'retrive':
+        if self.action == 'retrieve':
             return serializers.RecipeDetailSerielizer
         elif self.action == "upload_image":
             return serializers.RecipeImageSerializer
@@ -79,17 +204,60 @@ class RecipeVeiwSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+        self.invalidate_cache()
+
+    def perform_bulk_save(self, serializer, **kwargs):
+        objs = super().perform_bulk_save(serializer, **kwargs)
+        update_search_vectors(self.request.user.id, [obj.pk for obj in objs])
+        return objs
 
-    @action(methods=['POST'], detail=True, url_path='upload_image')
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """stream the user's recipes as ndjson (default) or csv"""
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in EXPORT_TYPES:
+            return Response(
+                {'type': [f'Choose one of {", ".join(EXPORT_TYPES)}.']},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        lines, content_type, extension = EXPORT_TYPES[export_type]
+        queryset = self.get_queryset()
+        # the body streams once ReplicaRoutingMiddleware has returned, so
+        # the database of the request is chosen now
+        recipes = iter_recipes(queryset.using(queryset.db),
+                               settings.RECIPE_EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(lines(recipes),
+                                         content_type=content_type)
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{extension}"'
+        return response
+
+    @action(methods=['GET', 'POST'], detail=True, url_path='upload_image')
     def upload_image(self,request,pk=None):
-        """upload an image to recipe"""
+        """upload an image to recipe, or poll its processing status
+
+        Decoding, orientation and thumbnails are handled by the image
+        worker pool, the upload returns as soon as the file is stored.
+        """
 
         recipe= self.get_object()
+        if request.method == 'GET':
+            return Response(self.get_serializer(recipe).data)
+
+        old_image = recipe.image.name
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            serializer.save(image_status=Recipe.IMAGE_PROCESSING,
+                            image_processing_started=timezone.now())
+            metrics.inc('recipe_image_uploads_total')
+            metrics.inc('recipe_image_upload_bytes_total',
+                        request.data['image'].size)
+            if old_image:
+                delete_thumbnails(recipe.image.storage, old_image)
+            schedule_image_processing(recipe.id)
+            self.invalidate_cache()
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
         
         return Response(serializer.errors, 
                         status=status.HTTP_400_BAD_REQUEST)
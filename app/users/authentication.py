@@ -0,0 +1,286 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (TokenAuthentication,
+                                           get_authorization_header)
+from rest_framework.authtoken.models import Token
+
+from core import metrics
+from core.db.routers import (apin_if_sticky, pin_if_sticky, pin_primary,
+                             reads_from_primary)
+
+
+class TokenCache:
+    """token -> token/user lookups in a ttl bounded local lru
+
+    Entries carry the version of their user when stored and are dropped
+    once invalidate_user() moved it, on any change of the user or their
+    tokens. With an optional shared django cache (``SHARED_CACHE``
+    alias) the versions live there, so an invalidation reaches every
+    process, and local misses are looked up in it. It only keeps the
+    user id of a token, never the user with its password hash, the user
+    row is read on a shared hit.
+
+    Every invalidation also moves an epoch. A lookup is only stored when
+    the epoch read before it didn't move, so a lookup racing with an
+    invalidation never caches what it read under the new version.
+    """
+
+    def __init__(self, max_size=10000, ttl=60, shared_cache=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_cache = shared_cache
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _shared(self):
+        return caches[self.shared_cache] if self.shared_cache else None
+
+    @staticmethod
+    def _shared_key(key):
+        return f'authtoken:{key}'
+
+    @staticmethod
+    def _version_key(user_id):
+        return f'authtoken:user:{user_id}'
+
+    _epoch_key = 'authtoken:epoch'
+
+    def epoch(self):
+        """read before looking a token up, see set()"""
+        shared = self._shared()
+        if shared is None:
+            with self._lock:
+                return self._epoch
+        return shared.get(self._epoch_key)
+
+    def _version(self, user_id, create=False):
+        shared = self._shared()
+        if shared is None:
+            with self._lock:
+                return self._versions.get(user_id, 0)
+        key = self._version_key(user_id)
+        version = shared.get(key)
+        if version is None and create:
+            # entries need a version that exists, so that they never
+            # match again once the cache dropped it
+            shared.add(key, uuid.uuid4().hex, None)
+            version = shared.get(key)
+        return version
+
+    @staticmethod
+    def _copy(token):
+        """requests get their own token and user instances"""
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return token
+
+    def _valid(self, user_id, version):
+        return version is not None and version == self._version(user_id)
+
+    def get(self, key):
+        """return the cached token or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            expires, token, version = entry
+            if expires > now and self._valid(token.user_id, version):
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.hits += 1
+                return self._copy(token)
+            with self._lock:
+                self._entries.pop(key, None)
+
+        token = self._get_shared(key)
+        with self._lock:
+            if token is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        return self._copy(token)
+
+    def _get_shared(self, key):
+        shared = self._shared()
+        entry = shared.get(self._shared_key(key)) if shared else None
+        if entry is None:
+            return None
+        user_id, version = entry
+        if not self._valid(user_id, version):
+            return None
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        token = Token(key=key, user=user)
+        self._store(key, token, version)
+        return token
+
+    def set(self, key, token, epoch):
+        """cache a lookup unless an invalidation ran since epoch() was
+        read before it"""
+        # read before checking the epoch, an invalidation after the
+        # check then still moves the version away from the entry's
+        version = self._version(token.user_id, create=True)
+        if epoch != self.epoch():
+            return
+        self._store(key, token, version)
+        shared = self._shared()
+        if shared:
+            shared.set(self._shared_key(key), (token.user_id, version),
+                       self.ttl)
+
+    def _store(self, key, token, version):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, token,
+                                  version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        """drop the cached tokens of a user in every process"""
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._epoch += 1
+        shared = self._shared()
+        if shared:
+            shared.set(self._version_key(user_id), uuid.uuid4().hex, None)
+            try:
+                shared.incr(self._epoch_key)
+            except ValueError:
+                shared.add(self._epoch_key, 1, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._epoch = 0
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+            }
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_AUTH_CACHE['MAX_SIZE'],
+    ttl=settings.TOKEN_AUTH_CACHE['TTL'],
+    shared_cache=settings.TOKEN_AUTH_CACHE['SHARED_CACHE'],
+)
+
+metrics.counter('token_cache_requests_total',
+                'Token lookups by result (hit, shared_hit, miss).')
+
+
+def _collect():
+    stats = token_cache.stats()
+    for result, key in (('hit', 'hits'), ('shared_hit', 'shared_hits'),
+                        ('miss', 'misses')):
+        yield 'token_cache_requests_total', {'result': result}, stats[key]
+
+
+metrics.register_collector(_collect)
+
+
+def _retry_on_primary():
+    """pin the request when a token lookup may have hit a lagging replica"""
+    if not settings.DATABASE_REPLICAS or reads_from_primary():
+        return False
+    pin_primary()
+    return True
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that keeps token lookups in ``token_cache``"""
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None or not token.user.is_active:
+            epoch = token_cache.epoch()
+            try:
+                user, token = super().authenticate_credentials(key)
+            except exceptions.AuthenticationFailed:
+                if not _retry_on_primary():
+                    raise
+                user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token, epoch)
+        pin_if_sticky(token.user_id)
+        return (token.user, token)
+
+    async def authenticate_async(self, request):
+        """authenticate a plain django request from an async view
+
+        Mirrors authenticate(), local cache hits don't leave the event
+        loop and misses use the async ORM. Returns (user, token) or None.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain '
+                  'spaces.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain '
+                  'invalid characters.'))
+
+        # the shared cache is a blocking network call
+        cache_get, cache_epoch, cache_set = \
+            token_cache.get, token_cache.epoch, token_cache.set
+        if token_cache.shared_cache:
+            cache_get, cache_epoch, cache_set = \
+                sync_to_async(cache_get), sync_to_async(cache_epoch), \
+                sync_to_async(cache_set)
+            token = await cache_get(key)
+        else:
+            token = cache_get(key)
+        if token is None or not token.user.is_active:
+            if token_cache.shared_cache:
+                epoch = await cache_epoch()
+            else:
+                epoch = cache_epoch()
+            tokens = self.get_model().objects.select_related('user')
+            try:
+                token = await tokens.aget(key=key)
+            except self.get_model().DoesNotExist:
+                if not _retry_on_primary():
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                try:
+                    token = await tokens.using(DEFAULT_DB_ALIAS).aget(key=key)
+                except self.get_model().DoesNotExist:
+                    raise exceptions.AuthenticationFailed(
+                        _('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(
+                    _('User inactive or deleted.'))
+            if token_cache.shared_cache:
+                await cache_set(key, token, epoch)
+            else:
+                cache_set(key, token, epoch)
+        await apin_if_sticky(token.user_id)
+        return (token.user, token)
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from users.hashers import (ahash_password, averify_password, hash_password,
+                           verify_password)
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend hashing passwords in the users.hashers pool"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # hash anyway, so response times don't reveal unknown users
+            hash_password(password)
+            return None
+        if verify_password(user, password) and \
+                self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None,
+                            **kwargs):
+        """async authenticate(), the event loop never hashes"""
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await user_model._default_manager.aget(
+                **{user_model.USERNAME_FIELD: username})
+        except user_model.DoesNotExist:
+            await ahash_password(password)
+            return None
+        if await averify_password(user, password) and \
+                self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,119 @@
+"""password hashers tuned by settings.PASSWORD_HASHING
+
+The parameters are read on use, so changing them makes must_update()
+true for existing hashes and they are upgraded at the next login, like
+hashes of the other PASSWORD_HASHERS.
+
+Hashing is CPU bound and releases the GIL. Every hash of the process
+runs in one thread pool of PASSWORD_HASHING['WORKERS'] threads, so login
+bursts queue instead of oversubscribing the CPU. verify_password() and
+hash_password() block their caller until the hash is done, like
+check_password() would, only averify_password() and ahash_password()
+leave the event loop free meanwhile.
+
+The pool is per process, app.server sizes it to each worker's share of
+the cores.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.hashers import check_password, make_password
+
+
+def _option(name):
+    return settings.PASSWORD_HASHING[name]
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+
+    @property
+    def work_factor(self):
+        return _option('SCRYPT_WORK_FACTOR')
+
+    @property
+    def block_size(self):
+        return _option('SCRYPT_BLOCK_SIZE')
+
+    @property
+    def parallelism(self):
+        return _option('SCRYPT_PARALLELISM')
+
+    # upper bound only, scrypt needs 128 * n * r bytes which outgrows
+    # OpenSSL's 32MiB default once the work factor is raised
+    maxmem = 1 << 30
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+
+    @property
+    def time_cost(self):
+        return _option('ARGON2_TIME_COST')
+
+    @property
+    def memory_cost(self):
+        return _option('ARGON2_MEMORY_COST')
+
+    @property
+    def parallelism(self):
+        return _option('ARGON2_PARALLELISM')
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_option('WORKERS') or os.cpu_count(),
+                thread_name_prefix='password-hash')
+        return _executor
+
+
+def _check(user, raw_password):
+    """(valid, rehashed) of a password, run in the hashing pool"""
+    rehashed = []
+
+    def setter(raw_password):
+        user.set_password(raw_password)
+        rehashed.append(True)
+
+    valid = check_password(raw_password, user.password, setter)
+    return valid, bool(rehashed)
+
+
+def verify_password(user, raw_password):
+    """check the password of a user, saving an upgraded hash"""
+    valid, rehashed = _get_executor().submit(
+        _check, user, raw_password).result()
+    if rehashed:
+        user.save(update_fields=['password'])
+    return valid
+
+
+async def averify_password(user, raw_password):
+    """async version of verify_password()"""
+    loop = asyncio.get_running_loop()
+    valid, rehashed = await loop.run_in_executor(
+        _get_executor(), _check, user, raw_password)
+    if rehashed:
+        await sync_to_async(user.save)(update_fields=['password'])
+    return valid
+
+
+def hash_password(raw_password):
+    """make_password() in the hashing pool"""
+    return _get_executor().submit(make_password, raw_password).result()
+
+
+async def ahash_password(raw_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), make_password, raw_password)
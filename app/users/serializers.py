@@ -29,6 +29,9 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
         return user
 
+AUTHENTICATION_FAILED = 'unable to authenticate the user'
+
+
 class AuthTokenSerializer(serializers.Serializer):
     email = serializers.CharField()
     password = serializers.CharField(
@@ -45,8 +48,8 @@ class AuthTokenSerializer(serializers.Serializer):
         password=password)
 
         if not user:
-            msg = 'unable to authenticate the user'
-            raise serializers.ValidationError(msg, code='authentication')
+            raise serializers.ValidationError(AUTHENTICATION_FAILED,
+                                              code='authentication')
 
         attrs['user']= user
         return attrs
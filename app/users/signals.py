@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.authentication import token_cache
+
+
+def _invalidate(user_id):
+    """invalidate now and once committed, lookups in between may still
+    have read the old rows"""
+    token_cache.invalidate_user(user_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: token_cache.invalidate_user(user_id))
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    """drop a deleted token from the auth cache"""
+    _invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def evict_user_tokens(sender, instance, created, **kwargs):
+    """drop cached tokens of a changed user, e.g. when is_active changes"""
+    if not created:
+        _invalidate(instance.pk)
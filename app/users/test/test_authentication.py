@@ -0,0 +1,159 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.authentication import TokenCache, token_cache
+
+ME_URL = reverse('users:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """test token lookups are served from the auth cache"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """test a second request does not query the token table"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+
+    def test_deleted_token_invalidated(self):
+        """test a deleted token stops authenticating at once"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user_invalidated(self):
+        """test deactivating a user evicts their cached token"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalidated_again_on_commit(self):
+        """test lookups between a change and its commit aren't cached"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+            epoch = token_cache.epoch()
+
+        self.assertNotEqual(token_cache.epoch(), epoch)
+
+    def test_invalid_token_rejected(self):
+        """test an unknown token is not authenticated"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenCacheTests(TestCase):
+    """test the ttl bounded lru"""
+
+    def test_lru_evicts_oldest(self):
+        """test the least recently used entry is evicted first"""
+        cache = TokenCache(max_size=2, ttl=60)
+        user = get_user_model()(email='test@test.com')
+        for key in ('a', 'b'):
+            cache.set(key, Token(key=key, user=user), cache.epoch())
+        cache.get('a')
+        cache.set('c', Token(key='c', user=user), cache.epoch())
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_entries_expire(self):
+        """test entries older than the ttl are misses"""
+        cache = TokenCache(max_size=2, ttl=0)
+        user = get_user_model()(email='test@test.com')
+        cache.set('a', Token(key='a', user=user), cache.epoch())
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+class SharedTokenCacheTests(TestCase):
+    """test the shared tier, one TokenCache stands for one process"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.token = Token.objects.create(user=self.user)
+
+    def set(self, auth_cache):
+        auth_cache.set(self.token.key, self.token, auth_cache.epoch())
+
+    def test_shared_entries_keep_no_user(self):
+        """test the password hash never reaches the shared cache"""
+        self.set(TokenCache(shared_cache='default'))
+
+        user_id, _ = cache.get(f'authtoken:{self.token.key}')
+
+        self.assertEqual(user_id, self.user.pk)
+
+    def test_shared_hit_loads_user(self):
+        self.set(TokenCache(shared_cache='default'))
+        other = TokenCache(shared_cache='default')
+
+        token = other.get(self.token.key)
+
+        self.assertEqual(token.user, self.user)
+        self.assertEqual(token.user.password, self.user.password)
+        self.assertEqual(other.stats()['shared_hits'], 1)
+
+    def test_invalidation_reaches_other_processes(self):
+        """test local entries of other processes are dropped too"""
+        first = TokenCache(shared_cache='default')
+        second = TokenCache(shared_cache='default')
+        self.set(first)
+        self.assertIsNotNone(second.get(self.token.key))
+
+        first.invalidate_user(self.user.pk)
+
+        self.assertIsNone(first.get(self.token.key))
+        self.assertIsNone(second.get(self.token.key))
+
+    def test_lost_version_invalidates(self):
+        """test entries don't match again once their version is gone"""
+        shared = TokenCache(shared_cache='default')
+        self.set(shared)
+
+        cache.delete(f'authtoken:user:{self.user.pk}')
+
+        self.assertIsNone(shared.get(self.token.key))
+
+    def test_lookup_racing_invalidation_not_cached(self):
+        """test a lookup read before an invalidation isn't stored"""
+        for auth_cache in (TokenCache(), TokenCache(shared_cache='default')):
+            epoch = auth_cache.epoch()
+            auth_cache.invalidate_user(self.user.pk)
+            auth_cache.set(self.token.key, self.token, epoch)
+
+            self.assertIsNone(auth_cache.get(self.token.key))
@@ -0,0 +1,154 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.backends import PooledModelBackend
+
+TOKEN_URL = reverse('users:token')
+ASYNC_TOKEN_URL = reverse('users:async-token')
+
+SCRYPT_FIRST = [
+    'users.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+]
+
+
+def create_legacy_user(email='test@test.com', password='testpassword'):
+    """a user whose password predates the tuned hashers"""
+    user = get_user_model().objects.create_user(email=email)
+    user.password = make_password(password, hasher='pbkdf2_sha256')
+    user.save()
+    return user
+
+
+@override_settings(PASSWORD_HASHERS=SCRYPT_FIRST)
+class PasswordHashingTests(TestCase):
+    """test passwords are hashed with the tuned hasher"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {'email': 'test@test.com', 'password': 'testpassword'}
+
+    def test_new_passwords_use_preferred_hasher(self):
+        user = get_user_model().objects.create_user(**self.payload)
+
+        self.assertTrue(user.password.startswith('scrypt$16384$'))
+        self.assertTrue(user.check_password('testpassword'))
+
+    def test_legacy_hash_upgraded_on_login(self):
+        """test a pbkdf2 hash is replaced at the next login"""
+        user = create_legacy_user()
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$'))
+
+    async def test_backend_accepts_username_field(self):
+        """test aauthenticate takes the email like authenticate does"""
+        created = await sync_to_async(get_user_model().objects.create_user)(
+            **self.payload)
+
+        user = await PooledModelBackend().aauthenticate(None, **self.payload)
+
+        self.assertEqual(user, created)
+        self.assertTrue(user.check_password('testpassword'))
+
+    def test_changed_parameters_upgraded_on_login(self):
+        get_user_model().objects.create_user(**self.payload)
+        options = {**settings.PASSWORD_HASHING,
+                   'SCRYPT_WORK_FACTOR': 2 ** 12}
+
+        with override_settings(PASSWORD_HASHING=options):
+            self.client.post(TOKEN_URL, self.payload)
+
+        user = get_user_model().objects.get()
+        self.assertTrue(user.password.startswith('scrypt$4096$'))
+
+    def test_wrong_password_not_upgraded(self):
+        user = create_legacy_user()
+        legacy = user.password
+
+        res = self.client.post(TOKEN_URL, {**self.payload,
+                                           'password': 'wrong'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        user.refresh_from_db()
+        self.assertEqual(user.password, legacy)
+
+    def test_inactive_user_not_authenticated(self):
+        get_user_model().objects.create_user(is_active=False,
+                                             **self.payload)
+
+        user = PooledModelBackend().authenticate(
+            None, username='test@test.com', password='testpassword')
+
+        self.assertIsNone(user)
+
+
+@override_settings(PASSWORD_HASHERS=SCRYPT_FIRST)
+class AsyncAuthTokenViewTests(TestCase):
+    """test the async token endpoint"""
+
+    def setUp(self):
+        self.client = AsyncClient()
+        self.payload = {'email': 'test@test.com', 'password': 'testpassword'}
+
+    def post(self, payload):
+        # AsyncClient can't send form bodies under django 4.1
+        return self.client.post(ASYNC_TOKEN_URL, payload,
+                                content_type='application/json')
+
+    async def test_create_token(self):
+        await sync_to_async(get_user_model().objects.create_user)(
+            **self.payload)
+
+        res = await self.post(self.payload)
+        again = await self.post(self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', res.json())
+        self.assertEqual(again.json(), res.json())
+
+    async def test_invalid_credentials(self):
+        await sync_to_async(get_user_model().objects.create_user)(
+            **self.payload)
+
+        for payload in ({**self.payload, 'password': 'wrong'},
+                        {**self.payload, 'email': 'other@test.com'}):
+            res = await self.post(payload)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(res.json(), {
+                'non_field_errors': ['unable to authenticate the user']})
+
+    async def test_missing_fields(self):
+        res = await self.post({'email': 'test@test.com'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', res.json())
+
+    async def test_legacy_hash_upgraded_on_login(self):
+        user = await sync_to_async(create_legacy_user)()
+
+        res = await self.post(self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        await sync_to_async(user.refresh_from_db)()
+        self.assertTrue(user.password.startswith('scrypt$'))
+
+    async def test_backend_accepts_username_field(self):
+        """test aauthenticate takes the email like authenticate does"""
+        created = await sync_to_async(get_user_model().objects.create_user)(
+            **self.payload)
+
+        user = await PooledModelBackend().aauthenticate(None, **self.payload)
+
+        self.assertEqual(user, created)
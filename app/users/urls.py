@@ -5,5 +5,7 @@ app_name = 'users'
 urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.AuthTokenView.as_view(), name='token'),
+    path('async/token/', views.AsyncAuthTokenView.as_view(),
+         name='async-token'),
     path('me/', views.ManageUserView.as_view(), name='me'),
 ]
@@ -1,8 +1,21 @@
 # from django.shortcuts import render
-from rest_framework import generics, authentication, permissions
+import json
+
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import generics, permissions
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from .serializers import UserSerializer, AuthTokenSerializer
+from core.db.routers import astick_to_primary, stick_to_primary
+from core.renderers import json_response
+from .serializers import (AUTHENTICATION_FAILED, UserSerializer,
+                          AuthTokenSerializer)
+from .authentication import CachedTokenAuthentication
+from .backends import PooledModelBackend
 # from django.contrib.auth import get_user_model
 
 
@@ -15,10 +28,53 @@ class AuthTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, _ = Token.objects.get_or_create(user=user)
+        # the next requests look the token up, a new one may not have
+        # reached the replicas yet
+        stick_to_primary(user.pk)
+        return Response({'token': token.key})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAuthTokenView(View):
+    """async AuthTokenView, password hashing runs in the hashing pool
+
+    Authenticates with PooledModelBackend directly, whatever the
+    AUTHENTICATION_BACKENDS.
+    """
+
+    async def post(self, request):
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body)
+            except ValueError:
+                return json_response({'detail': 'JSON parse error'},
+                                     status=400)
+        else:
+            data = request.POST
+        try:
+            # field validation only, validate() authenticates synchronously
+            attrs = AuthTokenSerializer().to_internal_value(data)
+        except ValidationError as exc:
+            return json_response(exc.detail, status=400)
+
+        user = await PooledModelBackend().aauthenticate(
+            request, username=attrs['email'], password=attrs['password'])
+        if user is None:
+            return json_response(
+                {'non_field_errors': [AUTHENTICATION_FAILED]}, status=400)
+        token, _ = await Token.objects.aget_or_create(user=user)
+        await astick_to_primary(user.pk)
+        return json_response({'token': token.key})
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):